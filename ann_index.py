@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""
+Approximate nearest-neighbour search in pure NumPy - IVF-flat and IVF-PQ
+
+A built-in vector index for deployments without ChromaDB. Search is by
+inner product, i.e. cosine similarity for the L2-normalized vectors of
+embedding_backends.
+
+Vectors are clustered with k-means into `nlist` inverted lists. A query
+only scans the lists of its `nprobe` nearest centroids, so nprobe trades
+recall for speed. Each list is stored contiguously, in one of four
+formats:
+
+    float32  exact vectors
+    float16  half the memory, scores within ~1e-3
+    int8     a quarter of the memory; per-dimension symmetric scales
+    pq       product quantization: each residual (vector minus its
+             centroid) split into `pq_m` sub-vectors of one byte each,
+             scored with per-query lookup tables
+
+Batched search visits each probed list once per batch, for all the
+queries that probe it, so it is a few matrix products per list rather
+than a loop over queries.
+
+save() writes plain .npy files and a manifest into a fresh directory and
+swaps a symlink to it; load() memory-maps them, so a large index costs
+page cache rather than heap, and processes forked after loading share it.
+"""
+
+import os
+import json
+import uuid
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Optional, Tuple
+
+import numpy as np
+
+ANN_FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+STORAGES = ("float32", "float16", "int8", "pq")
+
+
+def swap_symlink(link: Path, target: Path) -> Optional[Path]:
+    """Atomically point `link` at sibling `target`; returns what it replaced, if anything.
+
+    A real directory left at `link` by an older layout is moved aside
+    first (the only step where `link` is briefly missing).
+    """
+    link = Path(link)
+    previous = None
+    if link.is_symlink():
+        previous = link.parent / os.readlink(link)
+    elif link.exists():
+        previous = link.with_name(f"{link.name}.old-{uuid.uuid4().hex}")
+        os.replace(link, previous)
+
+    tmp_link = link.with_name(f".{link.name}.{os.getpid()}-{uuid.uuid4().hex}")
+    os.symlink(Path(target).name, tmp_link)
+    os.replace(tmp_link, link)
+    return previous
+
+
+def _nearest(data: np.ndarray, centroids: np.ndarray, block: int = 65536) -> np.ndarray:
+    """Index of the nearest centroid (L2) for every row of data."""
+    half_norms = 0.5 * np.einsum("ij,ij->i", centroids, centroids)
+    assign = np.empty(len(data), dtype=np.int64)
+    for start in range(0, len(data), block):
+        scores = data[start:start + block] @ centroids.T - half_norms
+        assign[start:start + block] = scores.argmax(axis=1)
+    return assign
+
+
+def kmeans(data: np.ndarray, k: int, iterations: int = 20, seed: int = 0) -> np.ndarray:
+    """Lloyd's k-means; empty clusters are re-seeded from random points."""
+    data = np.ascontiguousarray(data, dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    k = min(k, len(data))
+    centroids = data[rng.choice(len(data), k, replace=False)].copy()
+
+    for _ in range(iterations):
+        assign = _nearest(data, centroids)
+        counts = np.bincount(assign, minlength=k)
+        order = np.argsort(assign, kind="stable")
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        nonempty = counts > 0
+        sums = np.add.reduceat(data[order], starts[nonempty], axis=0)
+        centroids[nonempty] = sums / counts[nonempty, None]
+
+        empty = np.flatnonzero(~nonempty)
+        if len(empty):
+            centroids[empty] = data[rng.choice(len(data), len(empty), replace=False)]
+    return centroids
+
+
+class IVFIndex:
+    def __init__(self, dim: int, nlist: Optional[int] = None, storage: str = "float16",
+                 pq_m: int = 16, seed: int = 0):
+        """nlist defaults to sqrt(n) of the first add(); pq_m must divide dim."""
+        if storage not in STORAGES:
+            raise ValueError(f"storage must be one of {STORAGES}")
+        if storage == "pq" and dim % pq_m:
+            raise ValueError(f"pq_m={pq_m} does not divide dim={dim}")
+
+        self.dim = dim
+        self.nlist = nlist
+        self.storage = storage
+        self.pq_m = pq_m if storage == "pq" else 0
+        self.seed = seed
+
+        self.centroids: Optional[np.ndarray] = None
+        self.scale: Optional[np.ndarray] = None      # int8
+        self.codebooks: Optional[np.ndarray] = None  # pq: (pq_m, ksub, dim // pq_m)
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.codes = np.zeros((0, self.pq_m or dim), dtype=self._code_dtype)
+
+    @property
+    def _code_dtype(self):
+        return {"float32": np.float32, "float16": np.float16, "int8": np.int8, "pq": np.uint8}[self.storage]
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the stored vectors (codes) and ids."""
+        return self.codes.nbytes + self.ids.nbytes
+
+    # ---- Building ----
+
+    def train(self, vectors: np.ndarray, iterations: int = 20, max_samples: Optional[int] = None):
+        """Learn centroids (and int8 scales / PQ codebooks) from a sample of vectors."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        rng = np.random.default_rng(self.seed)
+        if self.nlist is None:
+            self.nlist = max(1, int(np.sqrt(len(vectors))))
+        max_samples = max_samples or max(64 * self.nlist, 256 * 64)
+        if len(vectors) > max_samples:
+            vectors = vectors[np.sort(rng.choice(len(vectors), max_samples, replace=False))]
+
+        self.centroids = kmeans(vectors, self.nlist, iterations, self.seed)
+        self.nlist = len(self.centroids)
+        self.offsets = np.zeros(self.nlist + 1, dtype=np.int64)
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.codes = np.zeros((0, self.pq_m or self.dim), dtype=self._code_dtype)
+
+        if self.storage == "int8":
+            self.scale = np.maximum(np.abs(vectors).max(axis=0), 1e-12).astype(np.float32) / 127.0
+        elif self.storage == "pq":
+            residuals = vectors - self.centroids[_nearest(vectors, self.centroids)]
+            dsub = self.dim // self.pq_m
+            self.codebooks = np.stack([
+                kmeans(residuals[:, j * dsub:(j + 1) * dsub], 256, iterations, self.seed + j)
+                for j in range(self.pq_m)
+            ])
+
+    def _encode(self, vectors: np.ndarray, lists: np.ndarray) -> np.ndarray:
+        if self.storage == "float32":
+            return vectors.astype(np.float32)
+        if self.storage == "float16":
+            return vectors.astype(np.float16)
+        if self.storage == "int8":
+            return np.clip(np.rint(vectors / self.scale), -127, 127).astype(np.int8)
+
+        residuals = vectors - self.centroids[lists]
+        dsub = self.dim // self.pq_m
+        return np.stack([
+            _nearest(np.ascontiguousarray(residuals[:, j * dsub:(j + 1) * dsub]), self.codebooks[j])
+            for j in range(self.pq_m)
+        ], axis=1).astype(np.uint8)
+
+    def add(self, vectors: np.ndarray, ids: Optional[np.ndarray] = None):
+        """Add vectors (training on them first if needed); ids default to 0..n-1 continuing."""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        if ids is None:
+            first = int(self.ids.max()) + 1 if len(self.ids) else 0
+            ids = np.arange(first, first + len(vectors))
+        ids = np.asarray(ids, dtype=np.int64)
+        if not self.is_trained:
+            self.train(vectors)
+
+        lists = _nearest(vectors, self.centroids)
+        codes = self._encode(vectors, lists)
+
+        # Merge with the stored lists, keeping every list contiguous
+        all_lists = np.concatenate([self._list_numbers(), lists])
+        order = np.argsort(all_lists, kind="stable")
+        self.codes = np.concatenate([np.asarray(self.codes), codes])[order]
+        self.ids = np.concatenate([np.asarray(self.ids), ids])[order]
+        self.offsets = self._offsets_for(all_lists)
+
+    def remove(self, ids: np.ndarray) -> int:
+        """Drop vectors by id; returns how many were removed."""
+        keep = ~np.isin(self.ids, ids)
+        removed = len(self.ids) - int(keep.sum())
+        if removed:
+            lists = self._list_numbers()[keep]
+            self.codes = np.asarray(self.codes)[keep]
+            self.ids = np.asarray(self.ids)[keep]
+            self.offsets = self._offsets_for(lists)
+        return removed
+
+    def _list_numbers(self) -> np.ndarray:
+        """Inverted list of every stored vector."""
+        return np.repeat(np.arange(len(self.offsets) - 1), np.diff(self.offsets))
+
+    def _offsets_for(self, lists: np.ndarray) -> np.ndarray:
+        return np.concatenate(([0], np.cumsum(np.bincount(lists, minlength=self.nlist))))
+
+    # ---- Search ----
+
+    def search(self, queries: np.ndarray, k: int = 10, nprobe: int = 8, batch_size: int = 1024,
+               rerank: Optional[np.ndarray] = None, rerank_factor: int = 4) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k (scores, ids) per query, best first; missing results are (-inf, -1).
+
+        With `rerank` (the original vectors, row = id; e.g. a float16
+        memmap), rerank_factor * k candidates are rescored exactly, which
+        recovers most of the recall lost to int8 or PQ codes.
+        """
+        queries = np.ascontiguousarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        ids = np.full((len(queries), k), -1, dtype=np.int64)
+        if not len(self.ids) or k <= 0:
+            return scores, ids
+
+        nprobe = max(1, min(nprobe, self.nlist))
+        fetch = k * max(1, rerank_factor) if rerank is not None else k
+        for start in range(0, len(queries), batch_size):
+            end = start + batch_size
+            batch_scores, batch_ids = self._search_batch(queries[start:end], fetch, nprobe)
+            if rerank is not None:
+                batch_scores, batch_ids = _rescore(queries[start:end], batch_ids, rerank, k)
+            scores[start:end], ids[start:end] = batch_scores, batch_ids
+        return scores, ids
+
+    def _search_batch(self, queries: np.ndarray, k: int, nprobe: int) -> Tuple[np.ndarray, np.ndarray]:
+        num_queries = len(queries)
+        centroid_ip = queries @ self.centroids.T
+        # Probe the nearest centroids (L2, as vectors were assigned)
+        coarse = centroid_ip - 0.5 * np.einsum("ij,ij->i", self.centroids, self.centroids)
+        if nprobe < self.nlist:
+            probes = np.argpartition(-coarse, nprobe - 1, axis=1)[:, :nprobe]
+        else:
+            probes = np.broadcast_to(np.arange(self.nlist), (num_queries, self.nlist))
+
+        if self.storage == "int8":
+            queries = queries * self.scale
+        elif self.storage == "pq":
+            dsub = self.dim // self.pq_m
+            # tables[q, j, c]: inner product of query sub-vector j with codeword c
+            tables = np.einsum("qjd,jcd->qjc", queries.reshape(num_queries, self.pq_m, dsub), self.codebooks)
+
+        # Every (query, probe) pair owns k candidate slots
+        cand_scores = np.full((num_queries, nprobe * k), -np.inf, dtype=np.float32)
+        cand_ids = np.full((num_queries, nprobe * k), -1, dtype=np.int64)
+
+        flat = probes.ravel()
+        order = np.argsort(flat, kind="stable")
+        boundaries = np.flatnonzero(np.diff(flat[order])) + 1
+        for group in np.split(order, boundaries):
+            list_id = flat[group[0]]
+            start, end = self.offsets[list_id], self.offsets[list_id + 1]
+            if start == end:
+                continue
+            rows, slots = group // nprobe, group % nprobe
+
+            codes = self.codes[start:end]
+            if self.storage == "pq":
+                codes = np.asarray(codes, dtype=np.intp)
+                list_tables = tables[rows]
+                scores = centroid_ip[rows, list_id][:, None] + sum(
+                    list_tables[:, j, codes[:, j]] for j in range(self.pq_m)
+                )
+            else:
+                scores = queries[rows] @ codes.astype(np.float32).T
+
+            kk = min(k, end - start)
+            if end - start > kk:
+                top = np.argpartition(-scores, kk - 1, axis=1)[:, :kk]
+            else:
+                top = np.broadcast_to(np.arange(kk), (len(rows), kk))
+            columns = slots[:, None] * k + np.arange(kk)
+            cand_scores[rows[:, None], columns] = np.take_along_axis(scores, top, axis=1)
+            cand_ids[rows[:, None], columns] = np.asarray(self.ids[start:end])[top]
+
+        return _top_k(cand_scores, cand_ids, k)
+
+    # ---- Storage ----
+
+    def save(self, directory: Path):
+        """Write the index to a fresh sibling directory and point `directory` at it.
+
+        `directory` is a symlink that is swapped in one rename, so readers
+        find either the old index or the new one, and concurrent writers
+        never share a temp path (the last swap wins).
+        """
+        directory = Path(directory)
+        directory.parent.mkdir(parents=True, exist_ok=True)
+        target = Path(tempfile.mkdtemp(prefix=directory.name + ".", dir=directory.parent))
+
+        np.save(target / "centroids.npy", self.centroids)
+        np.save(target / "offsets.npy", self.offsets)
+        np.save(target / "ids.npy", np.asarray(self.ids))
+        np.save(target / "codes.npy", np.asarray(self.codes))
+        if self.scale is not None:
+            np.save(target / "scale.npy", self.scale)
+        if self.codebooks is not None:
+            np.save(target / "codebooks.npy", self.codebooks)
+
+        manifest = {
+            "version": ANN_FORMAT_VERSION,
+            "dim": self.dim,
+            "nlist": self.nlist,
+            "storage": self.storage,
+            "pq_m": self.pq_m,
+            "count": len(self.ids),
+            "seed": self.seed
+        }
+        with open(target / MANIFEST_FILE, "w") as f:
+            json.dump(manifest, f, indent=2)
+
+        previous = swap_symlink(directory, target)
+        if previous is not None:
+            # Processes that mapped it keep their pages; later loads see the new index
+            shutil.rmtree(previous, ignore_errors=True)
+
+    @classmethod
+    def load(cls, directory: Path, mmap: bool = True) -> Optional["IVFIndex"]:
+        """Load a saved index (codes and ids memory-mapped); None if missing or incompatible."""
+        # Resolve once: a concurrent save() may swap the link while we read
+        directory = Path(directory).resolve()
+        try:
+            with open(directory / MANIFEST_FILE, "r") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if manifest.get("version") != ANN_FORMAT_VERSION:
+            return None
+
+        mode = "r" if mmap else None
+        index = cls(manifest["dim"], manifest["nlist"], manifest["storage"], manifest["pq_m"] or 16, manifest["seed"])
+        try:
+            index.centroids = np.load(directory / "centroids.npy")
+            index.offsets = np.load(directory / "offsets.npy")
+            index.ids = np.load(directory / "ids.npy", mmap_mode=mode)
+            index.codes = np.load(directory / "codes.npy", mmap_mode=mode)
+            if index.storage == "int8":
+                index.scale = np.load(directory / "scale.npy")
+            if index.storage == "pq":
+                index.codebooks = np.load(directory / "codebooks.npy")
+        except (OSError, ValueError):
+            # Replaced and removed by a newer save() mid-load
+            return None
+        return index
+
+
+def _top_k(scores: np.ndarray, ids: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Row-wise top-k of candidate (scores, ids), sorted best first."""
+    if scores.shape[1] > k:
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        scores = np.take_along_axis(scores, top, axis=1)
+        ids = np.take_along_axis(ids, top, axis=1)
+    order = np.argsort(-scores, axis=1, kind="stable")
+    return np.take_along_axis(scores, order, axis=1), np.take_along_axis(ids, order, axis=1)
+
+
+def _rescore(queries: np.ndarray, ids: np.ndarray, vectors: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Exact top-k among candidate ids (-1 = none) against the original vectors."""
+    candidates = np.asarray(vectors[np.maximum(ids, 0).ravel()], dtype=np.float32).reshape(*ids.shape, -1)
+    scores = np.einsum("qd,qcd->qc", queries, candidates)
+    scores[ids < 0] = -np.inf
+    return _top_k(scores, ids, k)
+
+
+def exact_search(vectors: np.ndarray, queries: np.ndarray, k: int = 10,
+                 block: int = 65536) -> Tuple[np.ndarray, np.ndarray]:
+    """Brute-force top-k by inner product (row numbers as ids), blockwise over vectors."""
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+    best_ids = np.zeros((len(queries), 0), dtype=np.int64)
+    for start in range(0, len(vectors), block):
+        scores = queries @ np.asarray(vectors[start:start + block], dtype=np.float32).T
+        kk = min(k, scores.shape[1])
+        top = np.argpartition(-scores, kk - 1, axis=1)[:, :kk]
+        best_scores, best_ids = _top_k(
+            np.concatenate([best_scores, np.take_along_axis(scores, top, axis=1)], axis=1),
+            np.concatenate([best_ids, top + start], axis=1),
+            k
+        )
+    return best_scores, best_ids
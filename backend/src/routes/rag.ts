@@ -1,13 +1,35 @@
 import { Router, Request, Response, NextFunction } from 'express';
 import { z } from 'zod';
 import { logger } from '../utils/logger';
-import { RAGService } from '../services/ragService';
+import { RAGService, QueueFullError, QueryCancelledError } from '../services/ragService';
 
 export const ragRouter = Router();
 
 // Initialize RAG service
 const ragService = new RAGService();
 
+// Reply 503 with a Retry-After hint when the worker pool is saturated
+const sendQueueFull = (res: Response, error: QueueFullError): void => {
+  res.set('Retry-After', String(error.retryAfterSeconds));
+  res.status(503).json({
+    success: false,
+    error: error.message,
+    retryAfter: error.retryAfterSeconds
+  });
+};
+
+// Abort the query as soon as the client goes away. This listens on the
+// response: since Node 16 the request's 'close' fires once its body is read.
+const abortOnDisconnect = (res: Response): AbortController => {
+  const controller = new AbortController();
+  res.on('close', () => {
+    if (!res.writableFinished) {
+      controller.abort();
+    }
+  });
+  return controller;
+};
+
 // Validation schemas
 const querySchema = z.object({
   question: z.string()
@@ -33,9 +55,10 @@ ragRouter.post('/query', async (req: Request, res: Response, next: NextFunction)
     });
 
     const startTime = Date.now();
+    const controller = abortOnDisconnect(res);
     
     // Process query
-    const result = await ragService.query(question, options);
+    const result = await ragService.query(question, options, controller.signal);
     
     const duration = Date.now() - startTime;
     
@@ -68,6 +91,12 @@ ragRouter.post('/query', async (req: Request, res: Response, next: NextFunction)
         details: error.errors
       });
       return;
+    } else if (error instanceof QueueFullError) {
+      sendQueueFull(res, error);
+      return;
+    } else if (error instanceof QueryCancelledError) {
+      logger.info('RAG query cancelled, client disconnected');
+      return;
     } else {
       next(error);
       return;
@@ -75,6 +104,94 @@ ragRouter.post('/query', async (req: Request, res: Response, next: NextFunction)
   }
 });
 
+// Streaming query endpoint (Server-Sent Events)
+ragRouter.post('/query/stream', async (req: Request, res: Response, next: NextFunction): Promise<void> => {
+  let question: string;
+  let options: z.infer<typeof querySchema>['options'];
+
+  try {
+    ({ question, options } = querySchema.parse(req.body));
+  } catch (error) {
+    if (error instanceof z.ZodError) {
+      res.status(400).json({
+        success: false,
+        error: 'Invalid request data',
+        details: error.errors
+      });
+      return;
+    }
+    next(error);
+    return;
+  }
+
+  logger.info('RAG streaming query received', {
+    question: question.substring(0, 100) + (question.length > 100 ? '...' : ''),
+    options,
+    ip: req.ip
+  });
+
+  // Headers go out with the first event, so an admission failure can
+  // still be answered with a plain 503
+  const send = (event: string, data: unknown) => {
+    if (!res.headersSent) {
+      res.writeHead(200, {
+        'Content-Type': 'text/event-stream',
+        'Cache-Control': 'no-cache',
+        'Connection': 'keep-alive',
+        'X-Accel-Buffering': 'no'
+      });
+    }
+    res.write(`event: ${event}\ndata: ${JSON.stringify(data)}\n\n`);
+  };
+
+  const startTime = Date.now();
+  const controller = abortOnDisconnect(res);
+  let firstTokenAt: number | null = null;
+
+  try {
+    const result = await ragService.queryStream(question, options, (event, data) => {
+      if (event === 'token' && firstTokenAt === null) {
+        firstTokenAt = Date.now();
+      }
+      send(event, data);
+    }, controller.signal);
+
+    const duration = Date.now() - startTime;
+
+    logger.info('RAG streaming query completed', {
+      duration: `${duration}ms`,
+      timeToFirstToken: firstTokenAt !== null ? `${firstTokenAt - startTime}ms` : null,
+      sourcesFound: result.sources.length,
+      category: result.metadata.category
+    });
+
+    send('done', {
+      question,
+      answer: result.answer,
+      sources: result.sources,
+      metadata: {
+        ...result.metadata,
+        duration,
+        timeToFirstToken: firstTokenAt !== null ? firstTokenAt - startTime : null,
+        timestamp: new Date().toISOString()
+      }
+    });
+  } catch (error) {
+    if (error instanceof QueueFullError && !res.headersSent) {
+      sendQueueFull(res, error);
+      return;
+    }
+    if (error instanceof QueryCancelledError) {
+      logger.info('RAG streaming query cancelled, client disconnected');
+      return;
+    }
+    logger.error('RAG streaming query failed:', error);
+    send('error', { error: error instanceof Error ? error.message : 'RAG query failed' });
+  }
+
+  res.end();
+});
+
 // Stats endpoint
 ragRouter.get('/stats', async (req: Request, res: Response, next: NextFunction) => {
   try {
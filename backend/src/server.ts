@@ -77,6 +77,7 @@ app.use('*', (req, res) => {
     availableEndpoints: [
       'GET /api/health',
       'POST /api/rag/query',
+      'POST /api/rag/query/stream',
       'GET /api/rag/stats'
     ]
   });
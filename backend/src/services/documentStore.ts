@@ -0,0 +1,68 @@
+import { PrismaClient } from '@prisma/client';
+
+export interface IngestDocument {
+  id: string;
+  filename: string;
+  title: string | null;
+  content: string;
+  metadata: unknown;
+  updatedAt: Date;
+}
+
+const DOCUMENT_FIELDS = {
+  id: true,
+  filename: true,
+  title: true,
+  content: true,
+  metadata: true,
+  updatedAt: true
+} as const;
+
+/**
+ * Uploaded documents (the Prisma `Document` table) as a source for the RAG index.
+ *
+ * `processed` means "in the index": rows with processed = false are new, or
+ * were edited and reset, and still have to be ingested. Workers build their
+ * index from the knowledge base alone, so processed rows are read again
+ * whenever a worker (re)starts.
+ */
+export class DocumentStore {
+  private readonly prisma = new PrismaClient();
+
+  unprocessed(limit: number): Promise<IngestDocument[]> {
+    return this.prisma.document.findMany({
+      where: { processed: false },
+      orderBy: { createdAt: 'asc' },
+      take: limit,
+      select: DOCUMENT_FIELDS
+    });
+  }
+
+  /** One page of processed documents, ordered by id; pass the last id to continue. */
+  processed(limit: number, afterId?: string): Promise<IngestDocument[]> {
+    return this.prisma.document.findMany({
+      where: { processed: true },
+      orderBy: { id: 'asc' },
+      take: limit,
+      ...(afterId ? { cursor: { id: afterId }, skip: 1 } : {}),
+      select: DOCUMENT_FIELDS
+    });
+  }
+
+  /**
+   * Flag documents as indexed with their chunk counts. A row edited since it
+   * was read keeps processed = false, so its new content gets ingested too.
+   */
+  async markProcessed(documents: IngestDocument[], chunks: Record<string, number>): Promise<void> {
+    await this.prisma.$transaction(documents.map((document) =>
+      this.prisma.document.updateMany({
+        where: { id: document.id, updatedAt: document.updatedAt },
+        data: { processed: true, chunks: chunks[document.id] ?? 0 }
+      })
+    ));
+  }
+
+  disconnect(): Promise<void> {
+    return this.prisma.$disconnect();
+  }
+}
@@ -0,0 +1,90 @@
+// Binary frames exchanged with the Python RAG worker (see ipc_protocol.py).
+//
+// Header: uint32 payload length | uint8 kind | uint32 request id (big-endian),
+// followed by the payload. TOKEN payloads are raw UTF-8 text, everything
+// else is compact JSON.
+
+export const HEADER_SIZE = 9;
+const MAX_PAYLOAD = 64 * 1024 * 1024;
+
+export enum FrameKind {
+  Ready = 0,
+  Request = 1,
+  Result = 2,
+  Error = 3,
+  Sources = 4,
+  Token = 5,
+  Cancel = 6
+}
+
+export interface Frame {
+  kind: FrameKind;
+  requestId: number;
+  payload: Buffer;
+}
+
+export function encodeFrame(kind: FrameKind, requestId: number, payload: Buffer = Buffer.alloc(0)): Buffer {
+  const frame = Buffer.allocUnsafe(HEADER_SIZE + payload.length);
+  frame.writeUInt32BE(payload.length, 0);
+  frame.writeUInt8(kind, 4);
+  frame.writeUInt32BE(requestId, 5);
+  payload.copy(frame, HEADER_SIZE);
+  return frame;
+}
+
+export function encodeJsonFrame(kind: FrameKind, requestId: number, value: unknown): Buffer {
+  return encodeFrame(kind, requestId, Buffer.from(JSON.stringify(value), 'utf8'));
+}
+
+export function decodeJson(payload: Buffer): any {
+  return payload.length > 0 ? JSON.parse(payload.toString('utf8')) : null;
+}
+
+/**
+ * Reassembles frames from socket chunks of arbitrary size. Chunks are only
+ * concatenated once a complete frame is available, so a large payload split
+ * across many reads is copied once.
+ */
+export class FrameDecoder {
+  private chunks: Buffer[] = [];
+  private size = 0;
+  private needed = HEADER_SIZE;
+
+  push(chunk: Buffer): Frame[] {
+    this.chunks.push(chunk);
+    this.size += chunk.length;
+    if (this.size < this.needed) {
+      return [];
+    }
+
+    const buffer = this.chunks.length === 1 ? this.chunks[0] : Buffer.concat(this.chunks, this.size);
+    const frames: Frame[] = [];
+    let offset = 0;
+    this.needed = HEADER_SIZE;
+
+    while (buffer.length - offset >= HEADER_SIZE) {
+      const length = buffer.readUInt32BE(offset);
+      if (length > MAX_PAYLOAD) {
+        throw new Error(`Frame payload too large: ${length} bytes`);
+      }
+
+      const end = offset + HEADER_SIZE + length;
+      if (end > buffer.length) {
+        this.needed = end - offset;
+        break;
+      }
+
+      frames.push({
+        kind: buffer.readUInt8(offset + 4),
+        requestId: buffer.readUInt32BE(offset + 5),
+        payload: buffer.subarray(offset + HEADER_SIZE, end)
+      });
+      offset = end;
+    }
+
+    const rest = buffer.subarray(offset);
+    this.chunks = rest.length > 0 ? [rest] : [];
+    this.size = rest.length;
+    return frames;
+  }
+}
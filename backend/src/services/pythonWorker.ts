@@ -0,0 +1,490 @@
+import { spawn, ChildProcessWithoutNullStreams } from 'child_process';
+import { EventEmitter } from 'events';
+import net from 'net';
+import os from 'os';
+import path from 'path';
+import { logger } from '../utils/logger';
+import { FrameDecoder, FrameKind, Frame, encodeFrame, encodeJsonFrame, decodeJson } from './ipcProtocol';
+
+const CONNECT_RETRY_MS = 250;
+
+export interface PythonWorkerOptions {
+  id: number;
+  pythonBin: string;
+  engineDir: string;
+  readyTimeoutMs: number;
+  maxRequests: number;       // Recycle after this many requests (0 = never)
+  maxAgeMs: number;          // Recycle after this long (0 = never)
+  healthIntervalMs: number;  // Ping idle workers this often (0 = never)
+  healthTimeoutMs: number;
+  sharedSocketPath?: string; // Attach to a pre-fork server (SharedIndexServer) instead of spawning
+  denseWriter?: boolean;     // Sync and update the vector store (one spawned worker per pool)
+}
+
+export type WorkerState = 'starting' | 'ready' | 'recycling' | 'stopped';
+
+export type WorkerEventHandler = (event: 'sources' | 'token', data: any) => void;
+
+export interface WorkerInfo {
+  id: number;
+  pid?: number;
+  state: WorkerState;
+  inFlight: number;
+  requestsServed: number;
+  restarts: number;
+  uptime: number;
+  cancelled: Record<string, number>;
+}
+
+interface PendingRequest {
+  resolve: (result: any) => void;
+  reject: (error: Error) => void;
+  onEvent?: WorkerEventHandler;
+  counted: boolean;  // Health pings don't count towards recycling
+  cleanup?: () => void;
+}
+
+/**
+ * One resident `python -m rag_engine serve` process.
+ *
+ * Requests are multiplexed over a Unix socket using the binary frames in
+ * ipcProtocol.ts, each tagged with its own request id. Emits 'ready'
+ * whenever the process can take requests and 'exit' when it goes away.
+ * Crashed workers restart with exponential backoff; recycled workers
+ * (request count or age limit) restart immediately once idle.
+ *
+ * With `sharedSocketPath` the worker is one connection to a pre-fork
+ * server: the forked child that accepts it plays the part of the process,
+ * and "restarting" means reconnecting to its replacement.
+ */
+export class PythonWorker extends EventEmitter {
+  state: WorkerState = 'stopped';
+  inFlight = 0;
+  requestsServed = 0;
+  restarts = 0;
+  cancelled: Record<string, number> = {};  // Engine-side cancellations by stage, as of the last ping
+
+  private process: ChildProcessWithoutNullStreams | null = null;
+  private socket: net.Socket | null = null;
+  private servingPid: number | undefined;  // From the READY frame
+  private session = 0;
+  private pending = new Map<number, PendingRequest>();
+  private nextRequestId = 0;
+  private startedAt = 0;
+  private restartAttempts = 0;
+  private healthTimer: NodeJS.Timeout | null = null;
+  private stopped = false;
+
+  private readonly socketPath: string;
+
+  constructor(private readonly options: PythonWorkerOptions) {
+    super();
+    this.socketPath = options.sharedSocketPath
+      || path.join(os.tmpdir(), `rag-worker-${process.pid}-${options.id}.sock`);
+  }
+
+  get id(): number {
+    return this.options.id;
+  }
+
+  get pid(): number | undefined {
+    return this.servingPid ?? this.process?.pid;
+  }
+
+  get isAvailable(): boolean {
+    return this.state === 'ready';
+  }
+
+  info(): WorkerInfo {
+    return {
+      id: this.id,
+      pid: this.pid,
+      state: this.state,
+      inFlight: this.inFlight,
+      requestsServed: this.requestsServed,
+      restarts: this.restarts,
+      uptime: this.startedAt ? Date.now() - this.startedAt : 0,
+      cancelled: this.cancelled
+    };
+  }
+
+  start(): void {
+    if (this.state !== 'stopped' || this.stopped) {
+      return;
+    }
+
+    const session = ++this.session;
+    this.state = 'starting';
+    this.startedAt = Date.now();
+    this.requestsServed = 0;
+
+    const readyTimer = setTimeout(() => {
+      logger.error('RAG worker did not become ready in time', { worker: this.id });
+      this.restart('not ready in time');
+    }, this.options.readyTimeoutMs);
+
+    if (this.options.sharedSocketPath) {
+      logger.info('Attaching RAG worker to shared index server', { worker: this.id, socket: this.socketPath });
+    } else {
+      this.spawnProcess(session, readyTimer);
+    }
+
+    // The worker binds its socket only after setup, so keep trying until then
+    this.connect(session, readyTimer);
+  }
+
+  private spawnProcess(session: number, readyTimer: NodeJS.Timeout): void {
+    logger.info('Starting Python RAG worker', { worker: this.id, engineDir: this.options.engineDir });
+
+    const child = spawn(this.options.pythonBin, ['-m', 'rag_engine', 'serve', '--socket', this.socketPath], {
+      cwd: this.options.engineDir,
+      stdio: 'pipe',
+      env: {
+        ...process.env,
+        PYTHONPATH: this.options.engineDir,
+        PYTHONUNBUFFERED: '1',
+        RAG_DENSE_WRITER: this.options.denseWriter ? '1' : '0'
+      }
+    });
+    this.process = child;
+
+    const logOutput = (stream: string) => (data: Buffer) => {
+      logger.debug('RAG worker output', { worker: this.id, stream, output: data.toString().substring(0, 500) });
+    };
+    child.stdout.on('data', logOutput('stdout'));
+    child.stderr.on('data', logOutput('stderr'));
+
+    child.on('error', (error) => {
+      clearTimeout(readyTimer);
+      logger.error('RAG worker process error:', error);
+      this.handleExit(session, { error: error.message });
+    });
+
+    child.on('exit', (code, signal) => {
+      clearTimeout(readyTimer);
+      this.handleExit(session, { code, signal });
+    });
+  }
+
+  private connect(session: number, readyTimer: NodeJS.Timeout): void {
+    if (session !== this.session) {
+      return;
+    }
+
+    const socket = net.createConnection(this.socketPath);
+    const decoder = new FrameDecoder();
+
+    socket.once('error', () => {
+      socket.destroy();
+      setTimeout(() => this.connect(session, readyTimer), CONNECT_RETRY_MS);
+    });
+
+    socket.once('connect', () => {
+      if (session !== this.session) {
+        socket.destroy();
+        return;
+      }
+      socket.removeAllListeners('error');
+      socket.on('error', (error) => logger.warn('RAG worker socket error', { worker: this.id, error: error.message }));
+      socket.on('close', () => {
+        if (this.socket !== socket) {
+          return;
+        }
+        if (this.options.sharedSocketPath) {
+          // The forked child is gone (or going); reconnect to its replacement
+          clearTimeout(readyTimer);
+          this.handleExit(session, { reason: 'disconnected' });
+        } else if (this.state !== 'recycling' && !this.stopped) {
+          // Without its socket the process is useless; the exit handler restarts it
+          this.process?.kill('SIGKILL');
+        }
+      });
+      this.socket = socket;
+    });
+
+    socket.on('data', (chunk: Buffer) => {
+      for (const frame of decoder.push(chunk)) {
+        if (frame.kind === FrameKind.Ready) {
+          clearTimeout(readyTimer);
+          this.servingPid = decodeJson(frame.payload)?.pid;
+          this.restartAttempts = 0;
+          this.state = 'ready';
+          this.scheduleHealthCheck();
+          logger.info('RAG worker ready', { worker: this.id, pid: this.pid });
+          this.emit('ready', this);
+          continue;
+        }
+        this.handleFrame(frame);
+      }
+    });
+  }
+
+  request(message: Record<string, unknown>, onEvent?: WorkerEventHandler, signal?: AbortSignal): Promise<any> {
+    const socket = this.socket;
+    if (!socket || this.state === 'stopped' || this.state === 'starting') {
+      return Promise.reject(new Error('RAG worker is not running'));
+    }
+    if (signal?.aborted) {
+      return Promise.reject(new Error('RAG request cancelled'));
+    }
+
+    const id = this.nextRequestId = (this.nextRequestId % 0xffffffff) + 1;
+    this.inFlight++;
+
+    return new Promise((resolve, reject) => {
+      const entry: PendingRequest = { resolve, reject, onEvent, counted: message.type !== 'ping' };
+
+      if (signal) {
+        // Withdraw the request on the worker side and free the slot right away
+        const onAbort = () => {
+          if (this.settle(id)) {
+            this.socket?.write(encodeFrame(FrameKind.Cancel, id));
+            reject(new Error('RAG request cancelled'));
+          }
+        };
+        signal.addEventListener('abort', onAbort, { once: true });
+        entry.cleanup = () => signal.removeEventListener('abort', onAbort);
+      }
+
+      this.pending.set(id, entry);
+      socket.write(encodeJsonFrame(FrameKind.Request, id, message));
+    });
+  }
+
+  /** Kill the process (e.g. it failed a health check) and let it restart. */
+  restart(reason: string): void {
+    logger.warn('Restarting RAG worker', { worker: this.id, reason });
+
+    if (!this.options.sharedSocketPath) {
+      this.process?.kill('SIGKILL');
+      return;
+    }
+
+    // Shared mode: kill the forked child serving us; the supervisor replaces it
+    if (this.servingPid) {
+      try {
+        process.kill(this.servingPid, 'SIGKILL');
+      } catch {
+        // Already gone
+      }
+    }
+    this.socket?.destroy();
+  }
+
+  stop(): void {
+    this.stopped = true;
+    this.clearHealthCheck();
+    if (this.socket) {
+      this.socket.end(encodeJsonFrame(FrameKind.Request, 0, { type: 'shutdown' }));
+    } else {
+      this.process?.kill();
+    }
+  }
+
+  /** Drop a pending request; null if it had already finished. */
+  private settle(id: number): PendingRequest | null {
+    const pending = this.pending.get(id);
+    if (!pending) {
+      return null;
+    }
+
+    this.pending.delete(id);
+    this.inFlight--;
+    pending.cleanup?.();
+    return pending;
+  }
+
+  private handleFrame(frame: Frame): void {
+    const pending = this.pending.get(frame.requestId);
+    if (!pending) {
+      // Late frames for cancelled requests end up here
+      logger.debug('RAG worker frame for unknown request', { worker: this.id, id: frame.requestId, kind: frame.kind });
+      return;
+    }
+
+    // Intermediate streaming frames
+    if (frame.kind === FrameKind.Token) {
+      pending.onEvent?.('token', { text: frame.payload.toString('utf8') });
+      return;
+    }
+    if (frame.kind === FrameKind.Sources) {
+      pending.onEvent?.('sources', decodeJson(frame.payload));
+      return;
+    }
+
+    this.settle(frame.requestId);
+    if (pending.counted) {
+      this.requestsServed++;
+    }
+
+    const body = decodeJson(frame.payload);
+    if (frame.kind === FrameKind.Result) {
+      pending.resolve(body);
+    } else {
+      pending.reject(new Error(`RAG Error: ${body?.error}`));
+    }
+
+    this.maybeRecycle();
+  }
+
+  private maybeRecycle(): void {
+    if (this.state !== 'ready' && this.state !== 'recycling') {
+      return;
+    }
+
+    const { maxRequests, maxAgeMs } = this.options;
+    const tooManyRequests = maxRequests > 0 && this.requestsServed >= maxRequests;
+    const tooOld = maxAgeMs > 0 && Date.now() - this.startedAt >= maxAgeMs;
+    if (!tooManyRequests && !tooOld) {
+      return;
+    }
+
+    // Stop taking work, then exit once drained; handleExit restarts it
+    this.state = 'recycling';
+    if (this.inFlight === 0 && this.socket) {
+      logger.info('Recycling RAG worker', { worker: this.id, requestsServed: this.requestsServed });
+      this.socket.write(encodeJsonFrame(FrameKind.Request, 0, { type: 'shutdown' }));
+    }
+  }
+
+  private scheduleHealthCheck(): void {
+    this.clearHealthCheck();
+    if (this.options.healthIntervalMs <= 0) {
+      return;
+    }
+
+    this.healthTimer = setInterval(() => {
+      // Pings are answered inline by the worker, even while it is busy
+      if (this.state !== 'ready') {
+        this.maybeRecycle();
+        return;
+      }
+
+      const timer = setTimeout(() => this.restart('health check timed out'), this.options.healthTimeoutMs);
+      this.request({ type: 'ping' })
+        .then((stats) => {
+          this.cancelled = stats?.cancelled || {};
+          this.maybeRecycle();
+        })
+        .catch((error) => logger.warn('RAG worker health check failed', { worker: this.id, error: error.message }))
+        .finally(() => clearTimeout(timer));
+    }, this.options.healthIntervalMs);
+  }
+
+  private clearHealthCheck(): void {
+    if (this.healthTimer) {
+      clearInterval(this.healthTimer);
+      this.healthTimer = null;
+    }
+  }
+
+  private handleExit(session: number, detail: Record<string, unknown>): void {
+    if (session !== this.session) {
+      return;
+    }
+    // Late events from this process or connection are stale from here on
+    this.session++;
+
+    const wasRecycling = this.state === 'recycling';
+    logger.warn('RAG worker exited', { worker: this.id, ...detail, pendingRequests: this.pending.size });
+
+    this.process = null;
+    this.socket?.destroy();
+    this.socket = null;
+    this.servingPid = undefined;
+    this.state = 'stopped';
+    this.clearHealthCheck();
+
+    for (const id of Array.from(this.pending.keys())) {
+      this.settle(id)?.reject(new Error('RAG worker exited before answering'));
+    }
+    this.emit('exit', this);
+
+    if (this.stopped) {
+      return;
+    }
+
+    // Planned recycles restart right away; crashes back off so a broken
+    // environment doesn't spin
+    const delay = wasRecycling ? 0 : Math.min(1000 * 2 ** this.restartAttempts, 30000);
+    if (!wasRecycling) {
+      this.restartAttempts++;
+    }
+    this.restarts++;
+    logger.info('Restarting RAG worker', { worker: this.id, delay: `${delay}ms` });
+    setTimeout(() => this.start(), delay);
+  }
+}
+
+export interface SharedIndexServerOptions {
+  pythonBin: string;
+  engineDir: string;
+  socketPath: string;
+  workers: number;
+}
+
+/**
+ * `python -m rag_engine serve --workers N`: loads the index once and forks
+ * N children that share it copy-on-write. PythonWorkers attach to it with
+ * `sharedSocketPath`; the server itself only needs keeping alive.
+ */
+export class SharedIndexServer {
+  restarts = 0;
+
+  private process: ChildProcessWithoutNullStreams | null = null;
+  private restartAttempts = 0;
+  private stopped = false;
+
+  constructor(private readonly options: SharedIndexServerOptions) {}
+
+  get pid(): number | undefined {
+    return this.process?.pid;
+  }
+
+  start(): void {
+    if (this.process || this.stopped) {
+      return;
+    }
+
+    const { pythonBin, engineDir, socketPath, workers } = this.options;
+    logger.info('Starting shared-index RAG server', { workers, socket: socketPath });
+
+    const child = spawn(pythonBin, ['-m', 'rag_engine', 'serve', '--socket', socketPath, '--workers', String(workers)], {
+      cwd: engineDir,
+      stdio: 'pipe',
+      env: { ...process.env, PYTHONPATH: engineDir, PYTHONUNBUFFERED: '1' }
+    });
+    this.process = child;
+    const startedAt = Date.now();
+
+    const logOutput = (stream: string) => (data: Buffer) => {
+      logger.debug('RAG server output', { stream, output: data.toString().substring(0, 500) });
+    };
+    child.stdout.on('data', logOutput('stdout'));
+    child.stderr.on('data', logOutput('stderr'));
+    child.on('error', (error) => logger.error('RAG server process error:', error));
+
+    child.on('exit', (code, signal) => {
+      this.process = null;
+      if (this.stopped) {
+        return;
+      }
+
+      // A server that ran for a while earns a fresh backoff
+      if (Date.now() - startedAt > 60000) {
+        this.restartAttempts = 0;
+      }
+      const delay = Math.min(1000 * 2 ** this.restartAttempts, 30000);
+      this.restartAttempts++;
+      this.restarts++;
+      logger.warn('RAG server exited, restarting', { code, signal, delay: `${delay}ms` });
+      setTimeout(() => this.start(), delay);
+    });
+  }
+
+  stop(): void {
+    this.stopped = true;
+    // SIGTERM makes the supervisor stop its children too
+    this.process?.kill('SIGTERM');
+  }
+}
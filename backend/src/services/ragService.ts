@@ -1,5 +1,30 @@
 import { spawn } from 'child_process';
+import os from 'os';
+import path from 'path';
 import { logger } from '../utils/logger';
+import { PythonWorker, SharedIndexServer, WorkerInfo, WorkerEventHandler } from './pythonWorker';
+import { DocumentStore, IngestDocument } from './documentStore';
+
+// Directory holding rag_engine.py and data/ (defaults to the repository root)
+const ENGINE_DIR = process.env.RAG_ENGINE_DIR || path.resolve(__dirname, '../../..');
+const PYTHON_BIN = process.env.PYTHON_BIN || 'python3';
+const QUERY_TIMEOUT_MS = 60000;
+
+// Worker pool configuration
+const POOL_SIZE = Math.max(1, parseInt(process.env.RAG_WORKERS || '2', 10));
+const MAX_INFLIGHT_PER_WORKER = Math.max(1, parseInt(process.env.RAG_WORKER_MAX_INFLIGHT || '4', 10));
+const MAX_QUEUE = Math.max(0, parseInt(process.env.RAG_QUEUE_SIZE || '50', 10));
+const WORKER_MAX_REQUESTS = parseInt(process.env.RAG_WORKER_MAX_REQUESTS || '1000', 10);
+const WORKER_MAX_AGE_MS = parseInt(process.env.RAG_WORKER_MAX_AGE_MS || '0', 10);
+const WORKER_HEALTH_INTERVAL_MS = parseInt(process.env.RAG_WORKER_HEALTH_INTERVAL_MS || '30000', 10);
+const WORKER_READY_TIMEOUT_MS = 180000;
+// One Python server loads the index and forks the workers, which share it
+const SHARED_INDEX = process.env.RAG_SHARED_INDEX === '1';
+// 0 when another process (e.g. a separate indexer) owns the vector store
+const DENSE_WRITER = process.env.RAG_DENSE_WRITER !== '0';
+// Ingest unprocessed Prisma documents into the workers' indexes this often (0 = off)
+const DOCUMENT_SYNC_INTERVAL_MS = parseInt(process.env.RAG_DOCUMENT_SYNC_INTERVAL_MS || '0', 10);
+const DOCUMENT_BATCH_SIZE = 20;
 
 export interface QueryOptions {
   maxSources?: number;
@@ -20,19 +45,111 @@ export interface RAGResult {
     methods: string[];
     queryTime: number;
     chunksProcessed: number;
+    cacheHit?: boolean;
+    semanticCacheHit?: boolean;
+    coalesced?: boolean;
+    queueWaitMs?: number;
+    processingMs?: number;
+    workerId?: number;
   };
 }
 
+export interface PoolStats {
+  size: number;
+  sharedIndex: boolean;
+  serverPid?: number;
+  queueDepth: number;
+  maxQueue: number;
+  rejected: number;
+  workers: WorkerInfo[];
+}
+
+export interface CoalescingStats {
+  executions: number;  // Requests that ran on a worker
+  coalesced: number;   // Requests that joined an identical in-flight one
+  inFlight: number;    // Distinct questions currently running
+}
+
+export interface CancellationStats {
+  queued: number;    // Client went away while the request was still queued
+  running: number;   // Client went away while a worker was on it
+  timedOut: number;
+  workerStages: Record<string, number>;  // How far cancelled work had got, per the workers
+}
+
+export interface DocumentSyncStats {
+  enabled: boolean;
+  ingested: number;   // Documents indexed and marked processed
+  failed: number;     // Sync rounds that failed (retried on the next round)
+  replaying: number;  // Workers catching up on processed documents
+}
+
 export interface RAGStats {
   totalChunks: number;
   categories: string[];
   averageQueryTime: number;
   totalQueries: number;
+  workerRestarts: number;
+  pool: PoolStats;
+  coalescing: CoalescingStats;
+  cancellations: CancellationStats;
+  documents: DocumentSyncStats;
   systemHealth: 'healthy' | 'degraded' | 'error';
 }
 
+export type StreamEventHandler = WorkerEventHandler;
+
+/** Rejection for requests whose caller aborted (e.g. the HTTP client disconnected). */
+export class QueryCancelledError extends Error {
+  constructor() {
+    super('RAG query cancelled');
+    this.name = 'QueryCancelledError';
+  }
+}
+
+/** Thrown when the request queue is full; maps to 503 + Retry-After. */
+export class QueueFullError extends Error {
+  constructor(public readonly retryAfterSeconds: number) {
+    super('RAG service is at capacity, please retry later');
+    this.name = 'QueueFullError';
+  }
+}
+
+interface Job {
+  type: 'query' | 'stream';
+  question: string;
+  options: QueryOptions;
+  onEvent?: StreamEventHandler;
+  enqueuedAt: number;
+  worker: PythonWorker | null;
+  done: boolean;
+  timer: NodeJS.Timeout;
+  controller: AbortController;  // Aborting withdraws the request from its worker
+  detach: () => void;
+  resolve: (result: RAGResult) => void;
+  reject: (error: Error) => void;
+}
+
+interface SharedExecution {
+  promise: Promise<RAGResult>;
+  controller: AbortController;
+  waiters: number;
+}
+
 export class RAGService {
-  private pythonProcess: any = null;
+  private workers: PythonWorker[] = [];
+  private server: SharedIndexServer | null = null;
+  private queue: Job[] = [];
+  private inFlightQueries = new Map<string, SharedExecution>();
+  private coalescingStats = { executions: 0, coalesced: 0 };
+  private cancellationStats = { queued: 0, running: 0, timedOut: 0 };
+  private rejectedCount = 0;
+  private documents: DocumentStore | null = null;
+  private documentSyncTimer: NodeJS.Timeout | null = null;
+  private documentStats = { ingested: 0, failed: 0 };
+  private syncingDocuments: IngestDocument[] | null = null;  // Batch being ingested right now
+  private replaying = new Set<PythonWorker>();
+  private avgProcessingMs = 0;
   private isInitialized = false;
   private queryCount = 0;
   private totalQueryTime = 0;
@@ -50,6 +167,9 @@ export class RAGService {
       
       this.isInitialized = true;
       logger.info('RAG service initialized successfully');
+
+      // Warm the worker pool so the first query doesn't pay setup cost
+      this.startPool();
       
     } catch (error) {
       logger.error('Failed to initialize RAG service:', error);
@@ -61,7 +181,7 @@ export class RAGService {
 
   private async testPythonEnvironment(): Promise<void> {
     return new Promise((resolve, reject) => {
-      const testProcess = spawn('python3', ['-c', 'import sys; print("Python OK")'], {
+      const testProcess = spawn(PYTHON_BIN, ['-c', 'import sys; print("Python OK")'], {
         stdio: 'pipe'
       });
 
@@ -84,139 +204,398 @@ export class RAGService {
     });
   }
 
-  async query(question: string, options: QueryOptions = {}): Promise<RAGResult> {
-    if (!this.isInitialized) {
-      throw new Error('RAG service not initialized');
+  private startPool(): void {
+    logger.info('Starting RAG worker pool', { size: POOL_SIZE, maxQueue: MAX_QUEUE, sharedIndex: SHARED_INDEX });
+
+    let sharedSocketPath: string | undefined;
+    if (SHARED_INDEX) {
+      sharedSocketPath = path.join(os.tmpdir(), `rag-shared-${process.pid}.sock`);
+      this.server = new SharedIndexServer({
+        pythonBin: PYTHON_BIN,
+        engineDir: ENGINE_DIR,
+        socketPath: sharedSocketPath,
+        workers: POOL_SIZE
+      });
+      this.server.start();
     }
 
-    return new Promise((resolve, reject) => {
-      const startTime = Date.now();
-      
-      // Create Python script to run RAG query
-      const pythonScript = `
-import sys
-import json
-import os
-sys.path.append('.')
-from rag_engine import OptimizedEnhancedRAG
-
-try:
-    # Initialize RAG
-    rag = OptimizedEnhancedRAG()
-    rag.setup()
-    
-    # Query
-    question = """${question.replace(/"/g, '\\"')}"""
-    result = rag.optimized_query(question)
-    
-    # Format response
-    response = {
-        "success": True,
-        "answer": result["answer"],
-        "sources": [
-            {
-                "content": chunk["content"][:500] + ("..." if len(chunk["content"]) > 500 else ""),
-                "page": chunk["metadata"]["page"],
-                "score": chunk.get("final_score", chunk.get("score", 0)),
-                "category": chunk["metadata"].get("category", "general")
-            }
-            for chunk in result["relevant_chunks"][:${options.maxSources || 5}]
-        ],
-        "metadata": {
-            "category": result.get("category_hint", "general"),
-            "methods": result.get("methods", []),
-            "queryTime": result.get("query_time", 0),
-            "chunksProcessed": len(result["relevant_chunks"])
-        }
+    for (let id = 1; id <= POOL_SIZE; id++) {
+      const worker = new PythonWorker({
+        id,
+        pythonBin: PYTHON_BIN,
+        engineDir: ENGINE_DIR,
+        readyTimeoutMs: WORKER_READY_TIMEOUT_MS,
+        maxRequests: WORKER_MAX_REQUESTS,
+        maxAgeMs: WORKER_MAX_AGE_MS,
+        healthIntervalMs: WORKER_HEALTH_INTERVAL_MS,
+        healthTimeoutMs: 10000,
+        sharedSocketPath,
+        // Independent workers share data/vector_db; only the first writes to it
+        denseWriter: id === 1 && DENSE_WRITER
+      });
+      worker.on('ready', () => this.onWorkerReady(worker));
+      worker.start();
+      this.workers.push(worker);
     }
-    
-    print("RESULT_START")
-    print(json.dumps(response))
-    print("RESULT_END")
-    
-except Exception as e:
-    error_response = {
-        "success": False,
-        "error": str(e),
-        "type": type(e).__name__
+
+    if (DOCUMENT_SYNC_INTERVAL_MS > 0) {
+      this.documents = new DocumentStore();
+      this.documentSyncTimer = setInterval(() => this.syncDocuments(), DOCUMENT_SYNC_INTERVAL_MS);
     }
-    print("ERROR_START")
-    print(json.dumps(error_response))
-    print("ERROR_END")
-`;
-
-      // Execute Python script
-      const pythonProcess = spawn('python3', ['-c', pythonScript], {
-        stdio: 'pipe',
-        env: { ...process.env, PYTHONPATH: '.' }
-      });
+  }
 
-      let stdout = '';
-      let stderr = '';
+  private onWorkerReady(worker: PythonWorker): void {
+    if (!this.documents) {
+      this.dispatch();
+      return;
+    }
 
-      pythonProcess.stdout.on('data', (data) => {
-        stdout += data.toString();
+    // A (re)started worker only has the knowledge base; catch up before taking queries
+    this.replaying.add(worker);
+    this.replayDocuments(worker)
+      .catch((error: Error) => logger.error('Document replay failed', { worker: worker.id, error: error.message }))
+      .finally(() => {
+        this.replaying.delete(worker);
+        this.dispatch();
       });
+  }
 
-      pythonProcess.stderr.on('data', (data) => {
-        stderr += data.toString();
-      });
+  private async replayDocuments(worker: PythonWorker): Promise<void> {
+    // A sync that started before this worker was ready skipped it and may
+    // mark its batch processed after we have paged past those ids
+    const syncing = this.syncingDocuments;
+    let replayed = 0;
+    let afterId: string | undefined;
+    for (;;) {
+      const page = await (this.documents as DocumentStore).processed(DOCUMENT_BATCH_SIZE, afterId);
+      if (page.length === 0) {
+        break;
+      }
+      await this.ingest(worker, page);
+      replayed += page.length;
+      afterId = page[page.length - 1].id;
+    }
+
+    for (const batch of new Set([syncing, this.syncingDocuments])) {
+      if (batch) {
+        await this.ingest(worker, batch);
+      }
+    }
+    logger.info('RAG worker caught up on documents', { worker: worker.id, documents: replayed });
+  }
+
+  private ingest(worker: PythonWorker, documents: IngestDocument[]): Promise<{ chunks: Record<string, number> }> {
+    return worker.request({
+      type: 'ingest',
+      documents: documents.map(({ id, filename, title, content, metadata }) => ({ id, filename, title, content, metadata }))
+    });
+  }
+
+  /**
+   * Index documents with processed = false in every running worker (in
+   * place, no rebuild), then mark them processed. Runs on a timer.
+   */
+  async syncDocuments(): Promise<void> {
+    if (!this.documents || this.syncingDocuments) {
+      return;
+    }
+
+    try {
+      const batch = await this.documents.unprocessed(DOCUMENT_BATCH_SIZE);
+      if (batch.length === 0) {
+        return;
+      }
+      this.syncingDocuments = batch;
+
+      // Workers that aren't ready pick the batch up when they replay
+      const workers = this.workers.filter((worker) => worker.isAvailable);
+      if (workers.length === 0) {
+        return;
+      }
+      const results = await Promise.all(workers.map((worker) => this.ingest(worker, batch)));
+
+      await this.documents.markProcessed(batch, results[0].chunks);
+      this.documentStats.ingested += batch.length;
+      logger.info('Documents ingested', { documents: batch.length, workers: workers.length });
+    } catch (error) {
+      // Nothing is marked processed, so the whole batch is retried next round
+      this.documentStats.failed++;
+      logger.error('Document sync failed', { error: (error as Error).message });
+    } finally {
+      this.syncingDocuments = null;
+    }
+  }
+
+  async query(question: string, options: QueryOptions = {}, signal?: AbortSignal): Promise<RAGResult> {
+    // Single-flight: identical concurrent questions share one worker run
+    const key = this.coalescingKey(question, options);
+    let shared = this.inFlightQueries.get(key);
+    const coalesced = shared !== undefined;
+
+    if (shared) {
+      this.coalescingStats.coalesced++;
+      logger.debug('RAG query coalesced', { question: question.substring(0, 100) });
+    } else {
+      const controller = new AbortController();
+      const execution: SharedExecution = {
+        promise: this.submit('query', question, options, undefined, controller.signal),
+        controller,
+        waiters: 0
+      };
+      const forget = () => {
+        if (this.inFlightQueries.get(key) === execution) {
+          this.inFlightQueries.delete(key);
+        }
+      };
+      execution.promise.then(forget, forget);
+      this.coalescingStats.executions++;
+      this.inFlightQueries.set(key, execution);
+      shared = execution;
+    }
+
+    const result = await this.awaitShared(key, shared, signal);
+    return coalesced ? { ...result, metadata: { ...result.metadata, coalesced: true } } : result;
+  }
 
-      pythonProcess.on('close', (code) => {
-        const duration = Date.now() - startTime;
-        this.queryCount++;
-        this.totalQueryTime += duration;
-
-        logger.info('Python RAG process completed', {
-          code,
-          duration: `${duration}ms`,
-          stdoutLength: stdout.length,
-          stderrLength: stderr.length
-        });
-
-        try {
-          // Extract result from stdout
-          const resultMatch = stdout.match(/RESULT_START\n(.*)\nRESULT_END/s);
-          const errorMatch = stdout.match(/ERROR_START\n(.*)\nERROR_END/s);
-
-          if (errorMatch) {
-            const errorData = JSON.parse(errorMatch[1]);
-            reject(new Error(`RAG Error: ${errorData.error}`));
-            return;
+  /** Wait for a shared execution; it is only cancelled once every waiter has aborted. */
+  private awaitShared(key: string, shared: SharedExecution, signal?: AbortSignal): Promise<RAGResult> {
+    return new Promise((resolve, reject) => {
+      let left = false;
+      const leave = () => {
+        left = true;
+        shared.waiters--;
+        signal?.removeEventListener('abort', onAbort);
+      };
+      const onAbort = () => {
+        if (left) {
+          return;
+        }
+        leave();
+        if (shared.waiters === 0) {
+          if (this.inFlightQueries.get(key) === shared) {
+            this.inFlightQueries.delete(key);
           }
+          shared.controller.abort();
+        }
+        reject(new QueryCancelledError());
+      };
 
-          if (resultMatch) {
-            const result = JSON.parse(resultMatch[1]);
-            if (result.success) {
-              resolve(result as RAGResult);
-            } else {
-              reject(new Error('RAG query failed'));
-            }
-          } else {
-            reject(new Error('No valid result found in Python output'));
+      shared.waiters++;
+      if (signal?.aborted) {
+        onAbort();
+        return;
+      }
+      signal?.addEventListener('abort', onAbort, { once: true });
+
+      shared.promise.then(
+        (result) => {
+          if (!left) {
+            leave();
+            resolve(result);
+          }
+        },
+        (error) => {
+          if (!left) {
+            leave();
+            reject(error);
           }
+        }
+      );
+    });
+  }
+
+  /** Only options that reach the worker take part in the key. */
+  private coalescingKey(question: string, options: QueryOptions): string {
+    const normalized = question.toLowerCase().split(/\s+/).filter(Boolean).join(' ');
+    return JSON.stringify([normalized, options.maxSources || 5]);
+  }
 
-        } catch (parseError) {
-          logger.error('Failed to parse Python output:', {
-            error: parseError,
-            stdout: stdout.substring(0, 500),
-            stderr: stderr.substring(0, 500)
-          });
-          reject(new Error('Failed to parse RAG response'));
+  async queryStream(
+    question: string,
+    options: QueryOptions,
+    onEvent: StreamEventHandler,
+    signal?: AbortSignal
+  ): Promise<RAGResult> {
+    return this.submit('stream', question, options, onEvent, signal);
+  }
+
+  private submit(
+    type: 'query' | 'stream',
+    question: string,
+    options: QueryOptions,
+    onEvent?: StreamEventHandler,
+    signal?: AbortSignal
+  ): Promise<RAGResult> {
+    if (!this.isInitialized) {
+      return Promise.reject(new Error('RAG service not initialized'));
+    }
+    if (signal?.aborted) {
+      return Promise.reject(new QueryCancelledError());
+    }
+
+    // Admission control: only queue when no worker can take it right now
+    if (!this.pickWorker() && this.queue.length >= MAX_QUEUE) {
+      this.rejectedCount++;
+      logger.warn('RAG queue full, rejecting request', { queueDepth: this.queue.length });
+      return Promise.reject(new QueueFullError(this.estimateRetryAfter()));
+    }
+
+    return new Promise((resolve, reject) => {
+      const job: Job = {
+        type,
+        question,
+        options,
+        onEvent,
+        enqueuedAt: Date.now(),
+        worker: null,
+        done: false,
+        controller: new AbortController(),
+        detach: () => signal?.removeEventListener('abort', onAbort),
+        resolve,
+        reject,
+        // Timeout after 60 seconds, queue wait included
+        timer: setTimeout(() => {
+          this.cancellationStats.timedOut++;
+          this.cancelJob(job, new Error('RAG query timeout'));
+        }, QUERY_TIMEOUT_MS)
+      };
+
+      const onAbort = () => {
+        if (this.queue.includes(job)) {
+          this.cancellationStats.queued++;
+        } else {
+          this.cancellationStats.running++;
         }
-      });
+        this.cancelJob(job, new QueryCancelledError());
+      };
+      signal?.addEventListener('abort', onAbort, { once: true });
 
-      pythonProcess.on('error', (error) => {
-        logger.error('Python process error:', error);
-        reject(error);
-      });
+      this.queue.push(job);
+      this.dispatch();
+    });
+  }
 
-      // Timeout after 60 seconds
-      setTimeout(() => {
-        pythonProcess.kill();
-        reject(new Error('RAG query timeout'));
-      }, 60000);
+  /** Least-loaded ready worker with spare capacity. */
+  private pickWorker(): PythonWorker | null {
+    let best: PythonWorker | null = null;
+    for (const worker of this.workers) {
+      if (!worker.isAvailable || worker.inFlight >= MAX_INFLIGHT_PER_WORKER || this.replaying.has(worker)) {
+        continue;
+      }
+      if (!best || worker.inFlight < best.inFlight) {
+        best = worker;
+      }
+    }
+    return best;
+  }
+
+  private dispatch(): void {
+    while (this.queue.length > 0) {
+      const worker = this.pickWorker();
+      if (!worker) {
+        return;
+      }
+      this.run(worker, this.queue.shift() as Job);
+    }
+  }
+
+  private run(worker: PythonWorker, job: Job): void {
+    const startedAt = Date.now();
+    const queueWaitMs = startedAt - job.enqueuedAt;
+    job.worker = worker;
+
+    worker.request({
+      type: job.type,
+      question: job.question,
+      options: { maxSources: job.options.maxSources || 5 }
+    }, job.onEvent, job.controller.signal)
+      .then((result: RAGResult) => {
+        const processingMs = Date.now() - startedAt;
+        this.avgProcessingMs = this.avgProcessingMs === 0
+          ? processingMs
+          : this.avgProcessingMs * 0.9 + processingMs * 0.1;
+
+        result.metadata = {
+          ...result.metadata,
+          queueWaitMs,
+          processingMs,
+          workerId: worker.id
+        };
+        this.finish(job, null, result);
+      })
+      .catch((error: Error) => this.finish(job, error))
+      .finally(() => this.dispatch());
+  }
+
+  /** Drop a queued job, or withdraw a running one from its worker, and free its slot. */
+  private cancelJob(job: Job, error: Error): void {
+    if (job.done) {
+      return;
+    }
+
+    const queued = this.queue.indexOf(job);
+    if (queued >= 0) {
+      this.queue.splice(queued, 1);
+    }
+    this.finish(job, error);
+
+    // The worker stops the query at its next checkpoint; the slot is free now
+    job.controller.abort();
+    this.dispatch();
+  }
+
+  private finish(job: Job, error: Error | null, result?: RAGResult): void {
+    if (job.done) {
+      return;
+    }
+    job.done = true;
+    clearTimeout(job.timer);
+    job.detach();
+
+    const duration = Date.now() - job.enqueuedAt;
+    this.queryCount++;
+    this.totalQueryTime += duration;
+
+    logger.info('RAG query completed', {
+      type: job.type,
+      worker: job.worker?.id,
+      duration: `${duration}ms`,
+      success: !error,
+      cancelled: error instanceof QueryCancelledError
     });
+
+    if (error) {
+      job.reject(error);
+    } else {
+      job.resolve(result as RAGResult);
+    }
+  }
+
+  private workerCancellationStages(): Record<string, number> {
+    const stages: Record<string, number> = {};
+    for (const worker of this.workers) {
+      for (const [stage, count] of Object.entries(worker.cancelled)) {
+        stages[stage] = (stages[stage] || 0) + count;
+      }
+    }
+    return stages;
+  }
+
+  private estimateRetryAfter(): number {
+    const capacity = Math.max(1, this.workers.length * MAX_INFLIGHT_PER_WORKER);
+    const averageMs = this.avgProcessingMs || 5000;
+    return Math.max(1, Math.ceil((this.queue.length + 1) * averageMs / capacity / 1000));
+  }
+
+  async shutdown(): Promise<void> {
+    if (this.documentSyncTimer) {
+      clearInterval(this.documentSyncTimer);
+    }
+    for (const worker of this.workers) {
+      worker.stop();
+    }
+    this.server?.stop();
+    await this.documents?.disconnect();
   }
 
   async getStats(): Promise<RAGStats> {
@@ -225,7 +604,32 @@ except Exception as e:
       categories: ['speed_limits', 'traffic_rules', 'safety', 'licensing', 'general'],
       averageQueryTime: this.queryCount > 0 ? this.totalQueryTime / this.queryCount : 0,
       totalQueries: this.queryCount,
-      systemHealth: this.isInitialized ? 'healthy' : 'error'
+      workerRestarts: this.workers.reduce((sum, worker) => sum + worker.restarts, 0) + (this.server?.restarts || 0),
+      pool: {
+        size: this.workers.length,
+        sharedIndex: SHARED_INDEX,
+        serverPid: this.server?.pid,
+        queueDepth: this.queue.length,
+        maxQueue: MAX_QUEUE,
+        rejected: this.rejectedCount,
+        workers: this.workers.map((worker) => worker.info())
+      },
+      coalescing: {
+        ...this.coalescingStats,
+        inFlight: this.inFlightQueries.size
+      },
+      cancellations: {
+        ...this.cancellationStats,
+        workerStages: this.workerCancellationStages()
+      },
+      documents: {
+        enabled: this.documents !== null,
+        ...this.documentStats,
+        replaying: this.replaying.size
+      },
+      systemHealth: !this.isInitialized
+        ? 'error'
+        : this.workers.some((worker) => worker.isAvailable) ? 'healthy' : 'degraded'
     };
   }
 
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+ANN benchmark - IVF index recall and throughput vs brute force
+
+Synthetic, clustered, L2-normalized vectors stand in for chunk embeddings
+(real knowledge bases are far smaller than the larger sizes here). For
+each size, every storage format is built, saved and memory-mapped back,
+then searched with a batch of held-out queries at several nprobe values:
+
+    recall@10  overlap with the exact top 10 (brute-force inner product)
+    QPS        queries per second for the whole batch, single process
+
+Brute force over float32 vectors is the QPS baseline. Lossy formats are
+also measured with exact re-ranking of 4*k candidates against float16
+copies of the vectors ("+rr"), as LocalDenseIndex does.
+
+    python benchmarks/bench_ann.py --sizes 10000 100000 1000000 --nprobe 1 4 16 64
+"""
+
+import sys
+import time
+import argparse
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+from ann_index import IVFIndex, exact_search
+
+
+def synthesize(count: int, dim: int, clusters: int, rng: np.random.Generator,
+               block: int = 100000) -> np.ndarray:
+    """Gaussian clusters around random unit centers, normalized."""
+    centers = rng.standard_normal((clusters, dim), dtype=np.float32)
+    vectors = np.empty((count, dim), dtype=np.float32)
+    for start in range(0, count, block):
+        end = min(start + block, count)
+        rows = centers[rng.integers(0, clusters, end - start)]
+        rows += 0.6 * rng.standard_normal((end - start, dim), dtype=np.float32)
+        vectors[start:end] = rows / np.linalg.norm(rows, axis=1, keepdims=True)
+    return vectors
+
+
+def recall(found: np.ndarray, truth: np.ndarray) -> float:
+    return float(np.mean([len(set(a) & set(b)) / truth.shape[1] for a, b in zip(found, truth)]))
+
+
+def directory_mb(path: Path) -> float:
+    return sum(f.stat().st_size for f in path.iterdir()) / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--storages", nargs="+", default=["float16", "int8", "pq"])
+    parser.add_argument("--pq-m", type=int, default=16, help="PQ sub-vectors (bytes per vector)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'vectors':>8s} {'index':16s} {'nprobe':>6s} {'recall@10':>9s} {'QPS':>8s} {'build s':>8s} {'disk MB':>8s}")
+    for size in args.sizes:
+        rng = np.random.default_rng(args.seed)
+        data = synthesize(size + args.queries, args.dim, max(16, size // 500), rng)
+        vectors, queries = data[:size], data[size:]
+        originals = vectors.astype(np.float16)
+
+        start = time.perf_counter()
+        _, truth = exact_search(vectors, queries, args.k)
+        elapsed = time.perf_counter() - start
+        print(f"{size:8d} {'brute force':16s} {'-':>6s} {1.0:9.3f} {len(queries) / elapsed:8.0f} "
+              f"{'-':>8s} {vectors.nbytes / 1e6:8.1f}")
+
+        for storage in args.storages:
+            index = IVFIndex(args.dim, storage=storage, pq_m=args.pq_m, seed=args.seed)
+            start = time.perf_counter()
+            index.add(vectors)
+            build_seconds = time.perf_counter() - start
+
+            with tempfile.TemporaryDirectory() as tmp:
+                path = Path(tmp) / "ivf"
+                index.save(path)
+                index = IVFIndex.load(path)
+                label = f"ivf{index.nlist}-{storage}"
+                runs = [(label, None)]
+                if storage in ("int8", "pq"):
+                    runs.append((label + "+rr", originals))
+                for name, rerank in runs:
+                    for nprobe in args.nprobe:
+                        if nprobe > index.nlist:
+                            continue
+                        start = time.perf_counter()
+                        _, found = index.search(queries, args.k, nprobe, rerank=rerank)
+                        elapsed = time.perf_counter() - start
+                        print(f"{size:8d} {name:16s} {nprobe:6d} {recall(found, truth):9.3f} "
+                              f"{len(queries) / elapsed:8.0f} {build_seconds:8.1f} {directory_mb(path):8.1f}")
+                del index
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Batch query benchmark - optimized_query_batch vs looping optimized_query
+
+Runs retrieval only (no LLM client) over a question set, checks that both
+paths return the same chunks and reports throughput.
+
+    python benchmarks/bench_batch.py --copies 20
+"""
+
+import io
+import sys
+import time
+import argparse
+import contextlib
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from rag_engine import OptimizedEnhancedRAG
+
+QUESTIONS = [
+    "What is the speed limit on highways in Ontario?",
+    "What documents do I need for a G1 test?",
+    "Can G1 drivers drive on 400-series highways?",
+    "What is the blood alcohol limit for drivers?",
+    "What should you do when a school bus has flashing red lights?",
+    "What are the penalties for distracted driving?",
+    "How do I renew my driver's license?",
+    "What are the rules for motorcycle licensing?",
+    "What should I do in case of an accident?",
+    "What are the parking rules in Ontario?",
+    "Is insurance mandatory in Ontario?",
+    "How do I merge onto a highway?",
+    "When should I use my headlights?",
+    "Can I turn right on a red light?",
+]
+
+
+def chunk_ids(result):
+    return [chunk["metadata"]["chunk_id"] for chunk in result["relevant_chunks"]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--copies", type=int, default=20, help="Repeat the question set this many times")
+    args = parser.parse_args()
+
+    # Distinct strings so the exact-match query cache never hits
+    questions = [f"{q} ({i})" for i in range(args.copies) for q in QUESTIONS]
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        rag = OptimizedEnhancedRAG(data_dir=args.data_dir)
+        rag.setup()
+        rag.llm = None
+
+        start = time.perf_counter()
+        looped = [rag.optimized_query(q) for q in questions]
+        loop_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        batched = rag.optimized_query_batch(questions)
+        batch_time = time.perf_counter() - start
+
+    matches = sum(chunk_ids(a) == chunk_ids(b) for a, b in zip(looped, batched))
+    print(f"Questions:        {len(questions)}")
+    print(f"Same chunks:      {matches}/{len(questions)}")
+    print(f"Loop throughput:  {len(questions) / loop_time:8.1f} q/s")
+    print(f"Batch throughput: {len(questions) / batch_time:8.1f} q/s ({loop_time / batch_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
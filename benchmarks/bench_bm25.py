@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+BM25 benchmark - ImpactBM25 vs rank_bm25.BM25Okapi
+
+Checks that both produce the same scores on the real knowledge base, then
+times per-query scoring on corpora grown by resampling its chunks.
+
+    python benchmarks/bench_bm25.py --sizes 567 5000 50000
+"""
+
+import sys
+import json
+import time
+import random
+import argparse
+from pathlib import Path
+
+import numpy as np
+from rank_bm25 import BM25Okapi
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from bm25_index import ImpactBM25
+
+QUERIES = [
+    "What is the speed limit on highways in Ontario?",
+    "What documents do I need for a G1 test?",
+    "Can G1 drivers drive on 400-series highways?",
+    "What is the blood alcohol limit for drivers?",
+    "What should you do when a school bus has flashing red lights?",
+    "What should I do in case of an accident?",
+]
+
+
+def tokenize(text: str):
+    return [t for t in text.lower().split() if len(t) > 2]
+
+
+def load_corpus(data_dir: Path):
+    with open(data_dir / "knowledge_base.json", "r") as f:
+        return [tokenize(chunk.get("content", "")) for chunk in json.load(f)]
+
+
+def time_queries(index, queries, repeats: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for query in queries:
+            index.get_scores(query)
+    return (time.perf_counter() - start) / (repeats * len(queries))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[567, 5000, 50000])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    corpus = load_corpus(Path(args.data_dir))
+    queries = [q.lower().split() for q in QUERIES]
+
+    # 1. Equivalence on the real corpus
+    reference = BM25Okapi(corpus)
+    impact = ImpactBM25(corpus)
+    max_diff = max(
+        float(np.max(np.abs(reference.get_scores(q) - impact.get_scores(q))))
+        for q in queries
+    )
+    same_ranking = all(
+        np.array_equal(np.argsort(-reference.get_scores(q), kind="stable")[:10],
+                       np.argsort(-impact.get_scores(q), kind="stable")[:10])
+        for q in queries
+    )
+    print(f"Equivalence on {len(corpus)} docs: max |diff| = {max_diff:.2e}, top-10 identical: {same_ranking}")
+
+    # 2. Scaling
+    print(f"\n{'docs':>10} {'build okapi':>12} {'build impact':>13} {'query okapi':>12} {'query impact':>13} {'speedup':>8}")
+    rng = random.Random(0)
+    for size in args.sizes:
+        grown = [corpus[rng.randrange(len(corpus))] for _ in range(size)]
+
+        start = time.perf_counter()
+        okapi = BM25Okapi(grown)
+        okapi_build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        impact = ImpactBM25(grown)
+        impact_build = time.perf_counter() - start
+
+        okapi_query = time_queries(okapi, queries, args.repeats)
+        impact_query = time_queries(impact, queries, args.repeats)
+
+        print(f"{size:>10} {okapi_build:>11.3f}s {impact_build:>12.3f}s "
+              f"{okapi_query * 1000:>10.2f}ms {impact_query * 1000:>11.3f}ms {okapi_query / impact_query:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Chunk store benchmark - memory per chunk and per query result, dicts vs views
+
+Builds the index from the knowledge base (resampled to --chunks chunks
+with fresh ids, if given), then measures with tracemalloc:
+
+    per chunk   bytes held by the chunks as a list of enriched dicts (the
+                old layout) vs a ChunkStore built from them
+    per query   bytes and blocks held by retrieve() results as ResultViews
+                vs the same results as dicts, plus the traced peak of one
+                uncached retrieval
+
+    python benchmarks/bench_chunk_store.py --chunks 20000
+"""
+
+import io
+import gc
+import sys
+import json
+import random
+import argparse
+import tempfile
+import contextlib
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+with contextlib.redirect_stdout(io.StringIO()):
+    from rag_engine import OptimizedEnhancedRAG
+    from chunk_store import ChunkStore
+
+QUESTIONS = [
+    "What is the speed limit on highways in Ontario?",
+    "What documents do I need for a G1 test?",
+    "What is the blood alcohol limit for drivers?",
+    "What should you do when a school bus has flashing red lights?",
+    "Is auto insurance mandatory in Ontario?",
+    "How do I merge onto a highway?",
+]
+
+
+def held(build):
+    """(result, bytes, blocks) still allocated after build() returns."""
+    gc.collect()
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    blocks = sys.getallocatedblocks()
+    result = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0] - start
+    blocks = sys.getallocatedblocks() - blocks
+    tracemalloc.stop()
+    return result, size, blocks
+
+
+def load_engine(data_dir: Path, chunks: int, seed: int) -> OptimizedEnhancedRAG:
+    with open(ROOT / "data" / "knowledge_base.json", "r") as f:
+        knowledge_base = json.load(f)
+    if chunks:
+        rng = random.Random(seed)
+        knowledge_base = [
+            {**chunk, "metadata": {**chunk["metadata"], "chunk_id": f"bench_{i}"}}
+            for i, chunk in enumerate(rng.choice(knowledge_base) for _ in range(chunks))
+        ]
+    with open(data_dir / "knowledge_base.json", "w") as f:
+        json.dump(knowledge_base, f)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        rag = OptimizedEnhancedRAG(data_dir=str(data_dir))
+        rag.index_version = "bench"
+        rag._build_optimized_retrieval(rag._load_and_enhance_chunks())
+        rag._init_semantic_cache()
+    return rag
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=0, help="Resample the knowledge base to this many chunks")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        rag = load_engine(Path(tmp), args.chunks, args.seed)
+    count = len(rag.chunks)
+
+    dicts, dict_bytes, _ = held(rag.chunks.to_dicts)
+    store, store_bytes, _ = held(lambda: ChunkStore.from_chunks(json.loads(json.dumps(dicts))))
+    assert store == rag.chunks
+    del dicts
+    print(f"{count} chunks")
+    print(f"  per chunk: {dict_bytes / count:7.0f} B as dicts, {store_bytes / count:7.0f} B in a ChunkStore "
+          f"({store.nbytes / count:.0f} B text and columns)")
+
+    views, view_bytes, view_blocks, dict_bytes, dict_blocks, peaks = 0, 0, 0, 0, 0, []
+    for question in QUESTIONS:
+        rag.retrieval_cache.clear()
+        with contextlib.redirect_stdout(io.StringIO()):
+            rag.retrieve(question + " (warm-up)", args.top_k)
+        rag.retrieval_cache.clear()
+
+        gc.collect()
+        tracemalloc.start()
+        with contextlib.redirect_stdout(io.StringIO()):
+            results, _ = rag.retrieve(question, args.top_k)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        rag.retrieval_cache.clear()
+
+        views += len(results)
+        _, size, blocks = held(lambda: [rag._materialize_ranked(
+            (r["chunk_index"], r["score"], r["method"], r["final_score"], r["fusion_methods"])
+        ) for r in results])
+        view_bytes, view_blocks = view_bytes + size, view_blocks + blocks
+        _, size, blocks = held(lambda: [dict(r) for r in results])
+        dict_bytes, dict_blocks = dict_bytes + size, dict_blocks + blocks
+
+    queries = len(QUESTIONS)
+    print(f"  per query ({views / queries:.0f} results): "
+          f"{dict_bytes / queries:6.0f} B / {dict_blocks / queries:4.0f} blocks as dicts, "
+          f"{view_bytes / queries:6.0f} B / {view_blocks / queries:4.0f} blocks as views; "
+          f"retrieval peak {sum(peaks) / queries / 1024:.0f} KiB")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
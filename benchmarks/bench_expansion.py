@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Query expansion benchmark - single-pass variant scoring vs one search per variant
+
+Expanded questions are retrieved as two variants, the question and the
+question plus expansion terms. Per question, timed over the question set:
+
+    per variant  BM25 get_scores and a TF-IDF transform + cosine similarity
+                 for each variant (the previous retrieval path)
+    single pass  _score_queries: weighted BM25 query vectors scored with one
+                 postings gather, one TF-IDF transform and matmul
+
+Both feed the same category boosts and fusion (_rank_question), and the
+fused results must match exactly at RAG_EXPANSION_WEIGHT=1. The dense leg
+is off: it already embeds and searches all variants in one batch.
+
+    python benchmarks/bench_expansion.py --repeat 20
+"""
+
+import io
+import os
+import sys
+import time
+import argparse
+import contextlib
+from pathlib import Path
+
+import numpy as np
+from sklearn.metrics.pairwise import cosine_similarity
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+with contextlib.redirect_stdout(io.StringIO()):
+    from rag_engine import OptimizedEnhancedRAG
+
+QUESTIONS = [
+    "What is the speed limit on highways in Ontario?",
+    "What documents do I need for a G1 test?",
+    "Can G1 drivers drive on 400-series highways?",
+    "What is the blood alcohol limit for drivers?",
+    "What should you do when a school bus has flashing red lights?",
+    "What are the penalties for distracted driving?",
+    "How do I renew my driver's license?",
+    "What should I do in case of an accident?",
+    "What are the parking rules in Ontario?",
+    "Is insurance mandatory in Ontario?",
+    "How do I merge onto a highway?",
+    "When should I use my headlights?",
+]
+
+
+def per_variant(rag, question, queries, top_k):
+    bm25_scores = np.array([rag.bm25.get_scores(text.lower().split()) for text, _, _ in queries])
+    tfidf_scores = np.array([cosine_similarity(rag.tfidf.transform([words]), rag.tfidf_matrix)[0]
+                             for _, _, words in queries])
+    return rag._rank_question(question, len(queries), 0, (bm25_scores, tfidf_scores, None), top_k)
+
+
+def single_pass(rag, question, queries, top_k):
+    return rag._rank_question(question, len(queries), 0, rag._score_queries([queries], top_k), top_k)
+
+
+def fused(results):
+    return [(r["chunk_index"], round(r["final_score"], 9), r["fusion_methods"]) for r in results[0]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    os.environ["RAG_DENSE_RETRIEVAL"] = "0"
+    with contextlib.redirect_stdout(io.StringIO()):
+        rag = OptimizedEnhancedRAG(data_dir=args.data_dir)
+        rag.setup()
+    rag.expansion_weight = 1.0
+
+    prepared = [(question, rag._preprocess_query(question)) for question in QUESTIONS]
+
+    matches = sum(
+        fused(per_variant(rag, *item, args.top_k)) == fused(single_pass(rag, *item, args.top_k))
+        for item in prepared
+    )
+    timings = {}
+    for name, search in (("per variant", per_variant), ("single pass", single_pass)):
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for item in prepared:
+                search(rag, *item, args.top_k)
+        timings[name] = (time.perf_counter() - start) / (args.repeat * len(prepared)) * 1e6
+
+    expanded = sum(len(queries) > 1 for _, queries in prepared)
+    print(f"Questions:         {len(prepared)} ({expanded} expanded)")
+    print(f"Same fused results: {matches}/{len(prepared)}")
+    for name, micros in timings.items():
+        print(f"{name + ':':19s}{micros:8.0f} µs/question")
+    print(f"Speedup:           {timings['per variant'] / timings['single pass']:8.1f}x")
+    return 0 if matches == len(prepared) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
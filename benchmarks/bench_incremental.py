@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Incremental index benchmark - in-place updates vs a full rebuild
+
+Builds the index from the knowledge base minus its last --add chunks, then
+adds those chunks, removes --remove chunks and edits --update chunks with
+add_chunks/remove_chunks/update_chunk, timing each step. After
+compact_index() every index structure is compared, array by array, with a
+full rebuild over the same edited knowledge base.
+
+    python benchmarks/bench_incremental.py --add 50 --remove 20 --update 10
+"""
+
+import io
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import contextlib
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+with contextlib.redirect_stdout(io.StringIO()):
+    from rag_engine import OptimizedEnhancedRAG
+
+QUESTIONS = [
+    "What is the speed limit on highways in Ontario?",
+    "What documents do I need for a G1 test?",
+    "What is the blood alcohol limit for drivers?",
+    "What should you do when a school bus has flashing red lights?",
+]
+
+
+def build(raw_chunks):
+    """Full rebuild from a knowledge base; returns (engine, seconds)."""
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(Path(tmp) / "knowledge_base.json", "w") as f:
+            json.dump(raw_chunks, f)
+        with contextlib.redirect_stdout(io.StringIO()):
+            rag = OptimizedEnhancedRAG(data_dir=tmp)
+            start = time.perf_counter()
+            rag._build_optimized_retrieval(rag._load_and_enhance_chunks())
+            elapsed = time.perf_counter() - start
+    rag.index_version = "bench"
+    rag.compact_ratio = float("inf")
+    rag._init_semantic_cache()
+    return rag, elapsed
+
+
+def timed(fn, *args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        result = fn(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def same_csr(a, b) -> bool:
+    return all(np.array_equal(getattr(a, name), getattr(b, name)) for name in ("data", "indices", "indptr")) \
+        and a.shape == b.shape
+
+
+def differences(rag, reference):
+    checks = {
+        "chunks": rag.chunks == reference.chunks,
+        "category_indices": rag.category_indices == reference.category_indices,
+        "token vocabulary": rag.vocabulary.terms == reference.vocabulary.terms,
+        "bm25 vocabulary": rag.bm25.vocabulary == reference.bm25.vocabulary,
+        "bm25 tf": same_csr(rag.bm25.tf, reference.bm25.tf),
+        "bm25 idf": np.array_equal(rag.bm25.idf, reference.bm25.idf),
+        "bm25 impacts": same_csr(rag.bm25.impacts, reference.bm25.impacts),
+        "tfidf features": np.array_equal(rag.tfidf.features, reference.tfidf.features),
+        "tfidf idf": np.array_equal(rag.tfidf.idf, reference.tfidf.idf),
+        "tfidf matrix": same_csr(rag.tfidf_matrix, reference.tfidf_matrix),
+    }
+    with contextlib.redirect_stdout(io.StringIO()):
+        checks["rankings"] = all(
+            rag.retrieve(question)[0] == reference.retrieve(question)[0] for question in QUESTIONS
+        )
+    return [name for name, ok in checks.items() if not ok]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default=str(ROOT / "data"))
+    parser.add_argument("--add", type=int, default=50)
+    parser.add_argument("--remove", type=int, default=20)
+    parser.add_argument("--update", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    with open(Path(args.data_dir) / "knowledge_base.json", "r") as f:
+        knowledge_base = json.load(f)
+    base, added = knowledge_base[:-args.add], knowledge_base[-args.add:]
+
+    rag, base_time = build(base)
+    indexed = [chunk["metadata"]["chunk_id"] for chunk in rag.chunks]
+    rng = random.Random(args.seed)
+    removed = set(rng.sample(indexed, args.remove))
+    updated = rng.sample([i for i in indexed if i not in removed], args.update)
+
+    print(f"base index: {len(base)} raw chunks, {len(rag.chunks)} indexed, built in {base_time * 1000:.1f} ms")
+
+    _, prepare_ms = timed(rag._prepare_incremental)
+    _, add_ms = timed(rag.add_chunks, added)
+    _, remove_ms = timed(rag.remove_chunks, sorted(removed))
+    update_ms = 0.0
+    edits = {}
+    for chunk_id in updated:
+        chunk = next(c for c in base if c["metadata"]["chunk_id"] == chunk_id)
+        edits[chunk_id] = chunk["content"] + " Drivers must obey the posted speed limit on every highway."
+        _, elapsed = timed(rag.update_chunk, chunk_id, edits[chunk_id])
+        update_ms += elapsed
+    _, compact_ms = timed(rag.compact_index)
+
+    # The same edits applied to the knowledge base file
+    edited = [
+        {**chunk, "content": edits.get(chunk["metadata"]["chunk_id"], chunk["content"])}
+        for chunk in base + added
+        if chunk["metadata"]["chunk_id"] not in removed
+    ]
+    reference, rebuild_time = build(edited)
+
+    print(f"  first-change setup      {prepare_ms:8.1f} ms")
+    print(f"  add {args.add:4d} chunks         {add_ms:8.1f} ms")
+    print(f"  remove {args.remove:4d} chunks      {remove_ms:8.1f} ms")
+    print(f"  update {args.update:4d} chunks      {update_ms:8.1f} ms  ({update_ms / max(args.update, 1):.1f} ms each)")
+    print(f"  compact                 {compact_ms:8.1f} ms")
+    print(f"  full rebuild            {rebuild_time * 1000:8.1f} ms")
+
+    mismatched = differences(rag, reference)
+    if mismatched:
+        print(f"❌ differs from a full rebuild: {', '.join(mismatched)}")
+        sys.exit(1)
+    print(f"✅ identical to a full rebuild ({len(reference.chunks)} chunks)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Ingestion benchmark - streaming, batched enrichment vs load-everything
+
+Writes a synthetic knowledge base of --chunks chunks (the real one,
+resampled with fresh chunk ids) and enriches it into a JSONL file:
+
+    load-all   json.load the whole file, enrich every chunk, then write
+    stream     EnrichmentPipeline.to_file with 1..N worker processes
+
+Each run is a fresh subprocess reporting its own peak RSS (VmHWM) and the
+largest peak among its pool workers. Run it at two sizes to see streaming
+memory stay flat while load-all grows with the input. Linux only.
+
+    python benchmarks/bench_ingestion.py --chunks 20000 100000 --workers 1 2 4
+"""
+
+import sys
+import json
+import time
+import hashlib
+import random
+import argparse
+import resource
+import tempfile
+import subprocess
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+from ingestion import EnrichmentPipeline, enrich_chunk
+
+
+def synthesize(source: Path, target: Path, chunks: int, seed: int):
+    with open(source, "r") as f:
+        knowledge_base = json.load(f)
+    rng = random.Random(seed)
+    with open(target, "w") as out:
+        out.write("[\n")
+        for i in range(chunks):
+            chunk = rng.choice(knowledge_base)
+            chunk = {**chunk, "metadata": {**chunk["metadata"], "chunk_id": f"synthetic_{i}"}}
+            out.write(("  " if i == 0 else ",\n  ") + json.dumps(chunk))
+        out.write("\n]\n")
+
+
+def peak_rss_mb() -> float:
+    # Unlike ru_maxrss, VmHWM starts over at exec, so it is this run's own
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    raise RuntimeError("VmHWM not available")
+
+
+def run_once(mode: str, workers: int, input_path: str, output_path: str):
+    """One measurement (in a subprocess); prints JSON stats."""
+    start = time.perf_counter()
+    if mode == "load-all":
+        with open(input_path, "r") as f:
+            raw_chunks = json.load(f)
+        enriched = [chunk for chunk in map(enrich_chunk, raw_chunks) if chunk is not None]
+        with open(output_path, "w") as out:
+            for chunk in enriched:
+                out.write(json.dumps(chunk, ensure_ascii=False) + "\n")
+        read, kept = len(raw_chunks), len(enriched)
+    else:
+        pipeline = EnrichmentPipeline(workers=workers)
+        stats = pipeline.to_file(input_path, output_path, progress_every=float("inf"))
+        read, kept = stats["read"], stats["kept"]
+    elapsed = time.perf_counter() - start
+    print(json.dumps({
+        "read": read, "kept": kept, "seconds": elapsed, "peak_rss": peak_rss_mb(),
+        "worker_rss": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    }))
+
+
+def measure(mode: str, workers: int, input_path: Path, output_path: Path) -> dict:
+    result = subprocess.run(
+        [sys.executable, __file__, "--run", mode, str(workers), str(input_path), str(output_path)],
+        check=True, capture_output=True, text=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default=str(ROOT / "data"))
+    parser.add_argument("--chunks", type=int, nargs="+", default=[20000, 100000])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--run", nargs=4, metavar=("MODE", "WORKERS", "INPUT", "OUTPUT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        mode, workers, input_path, output_path = args.run
+        run_once(mode, int(workers), input_path, output_path)
+        return
+
+    print(f"{'chunks':>7s} {'mode':10s} {'workers':>7s} {'chunks/s':>9s} {'seconds':>8s} {'peak RSS':>9s} {'per worker':>10s}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for chunks in args.chunks:
+            input_path = Path(tmp) / f"kb_{chunks}.json"
+            synthesize(Path(args.data_dir) / "knowledge_base.json", input_path, chunks, args.seed)
+            outputs = {}
+            runs = [("load-all", 1)] + [("stream", workers) for workers in args.workers]
+            for mode, workers in runs:
+                output_path = Path(tmp) / f"out_{mode}_{workers}.jsonl"
+                m = measure(mode, workers, input_path, output_path)
+                outputs[(mode, workers)] = hashlib.sha256(output_path.read_bytes()).hexdigest()
+                output_path.unlink()
+                worker_rss = f"{m['worker_rss']:8.1f}MB" if mode == "stream" and workers > 1 else f"{'-':>10s}"
+                print(f"{chunks:7d} {mode:10s} {workers:7d} {m['read'] / m['seconds']:9.0f} "
+                      f"{m['seconds']:8.2f} {m['peak_rss']:7.1f}MB {worker_rss}")
+            if len(set(outputs.values())) != 1:
+                print("❌ enriched output differs between runs")
+                sys.exit(1)
+            input_path.unlink()
+    print("✅ identical enriched output from every run")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+IPC serialization benchmark - binary frames vs the older stdout contracts
+
+Encodes a response on the "worker" side and decodes it on the "client" side,
+with the byte stream delivered in 64 KiB chunks the way a pipe or socket
+hands it over. Compared transports:
+
+    markers  json.dumps between RESULT_START/RESULT_END lines, accumulated
+             as one string and regex-matched (the original per-query script)
+    ndjson   one JSON object per line (the first resident-worker protocol)
+    frames   length-prefixed binary frames from ipc_protocol.py
+
+The streaming case sends an answer token by token: ndjson wraps every token
+in a JSON event, frames send raw UTF-8 TOKEN frames.
+
+    python benchmarks/bench_ipc.py --iterations 2000
+"""
+
+import re
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+import ipc_protocol as ipc
+
+CHUNK_SIZE = 64 * 1024
+MARKERS = re.compile(r"RESULT_START\n(.*)\nRESULT_END", re.S)
+
+WORDS = ("drivers must stop at the stop line before the crosswalk and yield to pedestrians "
+         "the maximum speed on 400-series highways is 100 km/h unless posted otherwise").split()
+
+
+def text(n_words: int, offset: int = 0) -> str:
+    return " ".join(WORDS[(offset + i) % len(WORDS)] for i in range(n_words))
+
+
+def make_response(num_sources: int, answer_words: int) -> dict:
+    return {
+        "answer": text(answer_words),
+        "sources": [
+            {"content": text(80, i)[:500] + "...", "page": 10 + i, "score": 12.5 - i * 0.1, "category": "speed_limits"}
+            for i in range(num_sources)
+        ],
+        "metadata": {
+            "category": "speed_limits",
+            "methods": ["bm25", "tfidf"],
+            "queryTime": 1.234,
+            "cacheHit": False,
+            "semanticCacheHit": False,
+            "chunksProcessed": num_sources
+        }
+    }
+
+
+def chunks(data: bytes):
+    for start in range(0, len(data), CHUNK_SIZE):
+        yield data[start:start + CHUNK_SIZE]
+
+
+# -- one response ------------------------------------------------------------
+
+def markers_roundtrip(response: dict) -> dict:
+    wire = ("RESULT_START\n" + json.dumps(response) + "\nRESULT_END\n").encode("utf-8")
+    output = ""
+    for chunk in chunks(wire):
+        output += chunk.decode("utf-8")
+    return json.loads(MARKERS.search(output).group(1))
+
+
+def ndjson_roundtrip(response: dict) -> dict:
+    wire = (json.dumps({"id": "1", "success": True, "result": response}) + "\n").encode("utf-8")
+    buffered = b""
+    for chunk in chunks(wire):
+        buffered += chunk
+    line, _, _ = buffered.partition(b"\n")
+    return json.loads(line)["result"]
+
+
+def frames_roundtrip(response: dict) -> dict:
+    wire = ipc.encode_json(ipc.RESULT, 1, response)
+    decoder = ipc.FrameDecoder()
+    for chunk in chunks(wire):
+        for _, _, payload in decoder.feed(chunk):
+            return ipc.decode_json(payload)
+
+
+# -- a streamed answer -------------------------------------------------------
+
+def ndjson_stream(tokens) -> str:
+    wire = b"".join(
+        (json.dumps({"id": "1", "event": "token", "data": {"text": token}}) + "\n").encode("utf-8")
+        for token in tokens
+    )
+    pieces = []
+    for line in wire.splitlines():
+        pieces.append(json.loads(line)["data"]["text"])
+    return "".join(pieces)
+
+
+def frames_stream(tokens) -> str:
+    wire = b"".join(ipc.encode_frame(ipc.TOKEN, 1, token.encode("utf-8")) for token in tokens)
+    decoder = ipc.FrameDecoder()
+    pieces = []
+    for chunk in chunks(wire):
+        for _, _, payload in decoder.feed(chunk):
+            pieces.append(payload.decode("utf-8"))
+    return "".join(pieces)
+
+
+def timed(fn, arg, iterations: int) -> float:
+    """Mean microseconds per call."""
+    fn(arg)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn(arg)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    cases = {
+        "typical (5 sources)": make_response(5, 300),
+        "large (100 sources)": make_response(100, 3000),
+    }
+    for name, response in cases.items():
+        size = len(ipc.encode_json(ipc.RESULT, 1, response))
+        iterations = max(1, args.iterations // (20 if size > 100_000 else 1))
+        assert markers_roundtrip(response) == ndjson_roundtrip(response) == frames_roundtrip(response)
+
+        print(f"{name}: {size / 1024:.1f} KiB")
+        baseline = timed(markers_roundtrip, response, iterations)
+        for label, fn in (("markers", markers_roundtrip), ("ndjson", ndjson_roundtrip), ("frames", frames_roundtrip)):
+            elapsed = baseline if fn is markers_roundtrip else timed(fn, response, iterations)
+            print(f"  {label:8s} {elapsed:9.1f} us/msg  ({baseline / elapsed:.2f}x)")
+
+    tokens = [("" if i == 0 else " ") + word for i, word in enumerate(text(300).split())]
+    assert ndjson_stream(tokens) == frames_stream(tokens)
+    print(f"streamed answer: {len(tokens)} tokens")
+    ndjson_time = timed(ndjson_stream, tokens, args.iterations)
+    frames_time = timed(frames_stream, tokens, args.iterations)
+    print(f"  ndjson   {ndjson_time / len(tokens):9.2f} us/token")
+    print(f"  frames   {frames_time / len(tokens):9.2f} us/token  ({ndjson_time / frames_time:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Load benchmark - full query pipeline against the fake LLM backend
+
+Drives OptimizedEnhancedRAG.aquery with a fixed concurrency and reports
+throughput, latency percentiles and the fallback (error) rate. Runs fully
+offline; tune the fake model with RAG_FAKE_LLM_* variables.
+
+    RAG_FAKE_LLM_LATENCY_MS=400 RAG_FAKE_LLM_ERROR_RATE=0.02 \\
+        python benchmarks/bench_load.py --queries 200 --concurrency 16
+"""
+
+import io
+import os
+import sys
+import time
+import asyncio
+import argparse
+import contextlib
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("RAG_LLM_BACKEND", "fake")
+from rag_engine import OptimizedEnhancedRAG
+
+QUESTIONS = [
+    "What is the speed limit on highways in Ontario?",
+    "What documents do I need for a G1 test?",
+    "Can G1 drivers drive on 400-series highways?",
+    "What is the blood alcohol limit for drivers?",
+    "What should you do when a school bus has flashing red lights?",
+    "What should I do in case of an accident?",
+    "Is insurance mandatory in Ontario?",
+    "How do I merge onto a highway?",
+]
+
+
+async def run(rag, questions, concurrency: int):
+    latencies, failures = [], 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(question):
+        nonlocal failures
+        async with semaphore:
+            start = time.perf_counter()
+            result = await rag.aquery(question)
+            latencies.append(time.perf_counter() - start)
+            if not result["answer"].startswith("[fake-"):
+                failures += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(q) for q in questions))
+    return time.perf_counter() - start, latencies, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    os.environ["RAG_MAX_CONCURRENT_QUERIES"] = str(args.concurrency)
+    # Unique questions so every query reaches the LLM
+    questions = [f"{QUESTIONS[i % len(QUESTIONS)]} (#{i})" for i in range(args.queries)]
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        rag = OptimizedEnhancedRAG(data_dir=args.data_dir)
+        rag.setup()
+        rag.semantic_cache = None
+        elapsed, latencies, failures = asyncio.run(run(rag, questions, args.concurrency))
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    print(f"Backend:     {rag.llm.name}")
+    print(f"Queries:     {args.queries} at concurrency {args.concurrency}")
+    print(f"Throughput:  {args.queries / elapsed:.1f} q/s")
+    print(f"Latency:     p50 {p50 * 1000:.0f}ms  p95 {p95 * 1000:.0f}ms  p99 {p99 * 1000:.0f}ms")
+    print(f"Fallbacks:   {failures} ({failures / args.queries:.1%})")
+
+
+if __name__ == "__main__":
+    main()
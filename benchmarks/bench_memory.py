@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Serving memory benchmark - one shared index (pre-fork) vs a process per worker
+
+For each worker count, starts either `rag_engine serve --workers N` (index
+loaded once, children forked copy-on-write) or N independent `serve`
+processes, warms every worker with queries over the socket protocol and
+reads /proc/<pid>/smaps_rollup:
+
+    RSS  resident pages, shared ones counted in full
+    PSS  shared pages split between the processes mapping them
+    USS  pages private to the process (its real per-worker cost)
+
+Linux only. Uses the fake LLM backend, so no API key is needed.
+
+    python benchmarks/bench_memory.py --workers 1 4 16 --queries 20
+"""
+
+import os
+import sys
+import time
+import socket
+import argparse
+import subprocess
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+import ipc_protocol as ipc
+
+QUESTIONS = [
+    "What is the speed limit on highways in Ontario?",
+    "What documents do I need for a G1 test?",
+    "Can G1 drivers drive on 400-series highways?",
+    "What is the blood alcohol limit for drivers?",
+    "What should you do when a school bus has flashing red lights?",
+    "What are the penalties for distracted driving?",
+    "How do I renew my driver's license?",
+    "What should I do in case of an accident?",
+]
+
+
+def memory(pid: int) -> dict:
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return {
+        "rss": fields["Rss"],
+        "pss": fields["Pss"],
+        "uss": fields["Private_Clean"] + fields["Private_Dirty"]
+    }
+
+
+def connect(path: str, timeout: float = 300.0) -> socket.socket:
+    deadline = time.monotonic() + timeout
+    while True:
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            client.connect(path)
+            return client
+        except OSError:
+            client.close()
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.2)
+
+
+def warm(client: socket.socket, queries: int, offset: int) -> int:
+    """Wait for READY, run some queries; returns the serving pid."""
+    reader = client.makefile("rb")
+    _, _, payload = ipc.read_frame(reader)
+    pid = ipc.decode_json(payload)["pid"]
+
+    for i in range(queries):
+        question = f"{QUESTIONS[(offset + i) % len(QUESTIONS)]} ({offset}-{i})"
+        client.sendall(ipc.encode_json(ipc.REQUEST, i + 1, {"type": "query", "question": question}))
+        kind, _, payload = ipc.read_frame(reader)
+        if kind != ipc.RESULT:
+            raise RuntimeError(ipc.decode_json(payload))
+    return pid
+
+
+def run(mode: str, workers: int, queries: int, data_dir: str) -> dict:
+    env = dict(os.environ, RAG_LLM_BACKEND="fake", RAG_FAKE_LLM_LATENCY_MS="0", RAG_FAKE_LLM_TOKENS_PER_SEC="0")
+    base = f"/tmp/rag-bench-{os.getpid()}"
+
+    if mode == "shared":
+        paths = [f"{base}.sock"] * workers
+        commands = [["--socket", paths[0], "--workers", str(workers)]]
+    else:
+        paths = [f"{base}.{i}.sock" for i in range(workers)]
+        commands = [["--socket", path] for path in paths]
+
+    processes = [
+        subprocess.Popen(
+            [sys.executable, "-m", "rag_engine", "serve", "--data-dir", data_dir] + args,
+            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        for args in commands
+    ]
+    clients = []
+    try:
+        clients = [connect(path) for path in paths]
+        pids = [warm(client, queries, i * queries) for i, client in enumerate(clients)]
+
+        workers_mem = [memory(pid) for pid in pids]
+        # The supervisor holds the index too; its pages are part of the real total
+        extra = [memory(p.pid) for p in processes if p.pid not in pids]
+        return {
+            "rss": sum(m["rss"] for m in workers_mem) / workers,
+            "pss": sum(m["pss"] for m in workers_mem) / workers,
+            "uss": sum(m["uss"] for m in workers_mem) / workers,
+            "total_pss": sum(m["pss"] for m in workers_mem + extra)
+        }
+    finally:
+        for client in clients:
+            client.close()
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--queries", type=int, default=20, help="Warm-up queries per worker")
+    args = parser.parse_args()
+
+    print(f"{'mode':12s} {'workers':>7s} {'RSS/worker':>11s} {'PSS/worker':>11s} {'USS/worker':>11s} {'total PSS':>10s}")
+    for workers in args.workers:
+        for mode in ("independent", "shared"):
+            m = run(mode, workers, args.queries, args.data_dir)
+            print(f"{mode:12s} {workers:7d} {m['rss']:9.1f}MB {m['pss']:9.1f}MB {m['uss']:9.1f}MB {m['total_pss']:8.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Ranking benchmark - category boost and top-k selection cost vs corpus size
+
+Synthetic score vectors stand in for one retrieval leg's scores (a share
+of documents, --density, match the query at all). One category holds
+--category-share of the documents. Each query boosts that category and
+picks the top k positive scores, timed per query:
+
+    loop+argsort   per-position Python boost loop and a full argsort
+                   (the previous _rank_results)
+    vectorized     OptimizedEnhancedRAG._rank_results: one fancy-indexed
+                   multiply over precomputed positions, argpartition
+
+Both must return the same indices and scores.
+
+    python benchmarks/bench_rank.py --sizes 1000 10000 100000 1000000
+"""
+
+import io
+import sys
+import time
+import argparse
+import contextlib
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+with contextlib.redirect_stdout(io.StringIO()):
+    from rag_engine import OptimizedEnhancedRAG
+
+
+def loop_argsort(scores, top_k, category_indices, category_hint, boost_factor, chunk_count):
+    if category_hint in category_indices:
+        for idx in category_indices[category_hint]:
+            if idx < len(scores):
+                scores[idx] *= boost_factor
+
+    top_indices = np.argsort(scores)[::-1][:top_k * 2]
+    top_indices = top_indices[(top_indices < chunk_count) & (scores[top_indices] > 0)][:top_k]
+    return top_indices, scores[top_indices].astype(np.float64)
+
+
+def ranker(size: int, category_indices) -> OptimizedEnhancedRAG:
+    """An engine with just the state _rank_results reads (only len(chunks) is used)."""
+    rag = OptimizedEnhancedRAG.__new__(OptimizedEnhancedRAG)
+    rag.chunks = range(size)
+    rag.category_indices = category_indices
+    rag.index_version = "bench"
+    rag._category_positions = None
+    return rag
+
+
+def per_query_us(rank, queries) -> float:
+    start = time.perf_counter()
+    for scores in queries:
+        rank(scores.copy())
+    return (time.perf_counter() - start) / len(queries) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 1000000])
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--density", type=float, default=0.1, help="Share of documents with a positive score")
+    parser.add_argument("--category-share", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'docs':>8s} {'loop+argsort µs':>16s} {'vectorized µs':>14s} {'speedup':>8s}")
+    for size in args.sizes:
+        rng = np.random.default_rng(args.seed)
+        category_of = np.where(rng.random(size) < args.category_share, "licensing", "general")
+        category_indices = {}
+        for i, category in enumerate(category_of):
+            category_indices.setdefault(category, []).append(i)
+        queries = [np.where(rng.random(size) < args.density, rng.random(size) * 20, 0.0)
+                   for _ in range(args.queries)]
+
+        rag = ranker(size, category_indices)
+        rag._category_boost_positions()
+        for scores in queries[:5]:
+            expected = loop_argsort(scores.copy(), args.top_k, category_indices, "licensing", 1.3, size)
+            found = rag._rank_results(scores.copy(), args.top_k, "licensing", 1.3)
+            assert all(np.array_equal(a, b) for a, b in zip(expected, found))
+
+        before = per_query_us(
+            lambda s: loop_argsort(s, args.top_k, category_indices, "licensing", 1.3, size), queries)
+        after = per_query_us(lambda s: rag._rank_results(s, args.top_k, "licensing", 1.3), queries)
+        print(f"{size:8d} {before:16.0f} {after:14.0f} {before / after:7.1f}x")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Tokenizer benchmark - lexical index build time and memory, string vs shared token ids
+
+Builds BM25 and TF-IDF over the knowledge base texts (resampled to
+--chunks texts, if given) both ways:
+
+    strings    whitespace tokens (longer than two characters) for
+               ImpactBM25 and TfidfVectorizer.fit_transform on the raw
+               text, each with its own string vocabulary (the previous build)
+    token ids  one TokenVocabulary pass per text, ImpactBM25.from_token_ids
+               and TokenTfidf over the same integer ids
+
+Reports the best build time of --repeat runs and, with tracemalloc, the
+bytes still held by the built indexes and the peak while building. The
+TF-IDF features and matrix must be identical and the BM25 scores equal up
+to summation order.
+
+    python benchmarks/bench_tokenizer.py --chunks 20000
+"""
+
+import io
+import gc
+import sys
+import json
+import time
+import random
+import argparse
+import contextlib
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+with contextlib.redirect_stdout(io.StringIO()):
+    from rag_engine import STOP_WORDS, TFIDF_PARAMS
+    from bm25_index import ImpactBM25
+    from tokenizer import TokenVocabulary, TokenTfidf
+
+QUERIES = [
+    "What is the speed limit on highways in Ontario?",
+    "What documents do I need for a G1 test?",
+    "What is the blood alcohol limit for drivers?",
+    "Is auto insurance mandatory in Ontario?",
+]
+
+
+def build_strings(texts):
+    bm25 = ImpactBM25([[t for t in text.lower().split() if len(t) > 2] for text in texts])
+    tfidf = TfidfVectorizer(stop_words=STOP_WORDS, **TFIDF_PARAMS)
+    return bm25, tfidf, tfidf.fit_transform(texts)
+
+
+def build_token_ids(texts):
+    vocabulary = TokenVocabulary(STOP_WORDS)
+    docs = [vocabulary.encode(text) for text in texts]
+    bm25 = ImpactBM25.from_token_ids([vocabulary.bm25_terms(doc) for doc in docs], vocabulary.ids)
+    tfidf = TokenTfidf(vocabulary, **TFIDF_PARAMS)
+    return vocabulary, bm25, tfidf, tfidf.fit_transform(vocabulary.doc_words(docs))
+
+
+def best_time(build, texts, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        build(texts)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def traced(build, texts):
+    """(result, bytes held afterwards, peak bytes) of one build."""
+    gc.collect()
+    tracemalloc.start()
+    result = build(texts)
+    gc.collect()
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, held, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=0, help="Resample the knowledge base to this many texts")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with open(ROOT / "data" / "knowledge_base.json", "r") as f:
+        texts = [chunk["content"] for chunk in json.load(f)]
+    if args.chunks:
+        rng = random.Random(args.seed)
+        texts = [rng.choice(texts) for _ in range(args.chunks)]
+
+    (bm25, tfidf, matrix), string_held, string_peak = traced(build_strings, texts)
+    (vocabulary, id_bm25, id_tfidf, id_matrix), id_held, id_peak = traced(build_token_ids, texts)
+
+    same_tfidf = (
+        list(tfidf.get_feature_names_out()) == id_tfidf.feature_names()
+        and np.array_equal(tfidf.idf_, id_tfidf.idf)
+        and all(np.array_equal(getattr(matrix, a), getattr(id_matrix, a)) for a in ("data", "indices", "indptr"))
+    )
+    same_bm25 = all(
+        np.allclose(bm25.get_scores(query.lower().split()), id_bm25.get_scores(query.lower().split()), rtol=1e-12, atol=0)
+        for query in QUERIES
+    )
+
+    timings = {name: best_time(build, texts, args.repeat)
+               for name, build in (("strings", build_strings), ("token ids", build_token_ids))}
+
+    print(f"{len(texts)} texts, {len(vocabulary)} distinct tokens, {matrix.shape[1]} TF-IDF features")
+    print(f"  strings:   {timings['strings']:6.2f} s  held {string_held / 2**20:6.1f} MiB  peak {string_peak / 2**20:6.1f} MiB")
+    print(f"  token ids: {timings['token ids']:6.2f} s  held {id_held / 2**20:6.1f} MiB  peak {id_peak / 2**20:6.1f} MiB")
+    print(f"  speedup {timings['strings'] / timings['token ids']:.1f}x; "
+          f"same TF-IDF: {same_tfidf}, same BM25 scores: {same_bm25}")
+    return 0 if same_tfidf and same_bm25 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Impact-postings BM25 - Okapi BM25 over a precomputed sparse term x doc matrix
+
+Every posting stores its final BM25 contribution idf(t) * tf * (k1 + 1) /
+(tf + k1 * (1 - b + b * dl / avgdl)), so scoring a query is a single sparse
+row-gather and sum over the postings of the query terms. Scores match
+rank_bm25.BM25Okapi (same idf flooring with epsilon * average idf).
+
+Documents can be added and removed in place: document frequencies and
+lengths are updated from the changed rows only, then the impacts are
+re-derived from them. Removed documents keep an empty row until compact(),
+which yields exactly the index a fresh build over the survivors would.
+
+Terms are strings, numbered by the index's own vocabulary, or the integer
+ids of a shared TokenVocabulary (from_token_ids), which are then the
+columns directly and are never renumbered here.
+"""
+
+from collections import Counter
+from typing import List, Dict, Iterable, Optional, Sequence, Union
+
+import numpy as np
+from scipy import sparse
+
+from incremental_index import first_seen_order, select_rows
+
+
+class ImpactBM25:
+    def __init__(self, corpus: Optional[List[List[str]]] = None, k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25):
+        """Index a tokenized corpus (list of token lists)."""
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+
+        self.vocabulary: Dict[str, int] = {}
+        self.tf = None
+        self.impacts = None
+
+        if corpus is not None:
+            self._build(self._count(corpus))
+
+    def _count(self, corpus: List[List[str]]):
+        """Term frequency rows for `corpus`, adding unseen terms to the vocabulary."""
+        indptr, indices, data = [0], [], []
+        for document in corpus:
+            for term, freq in Counter(document).items():
+                indices.append(self.vocabulary.setdefault(term, len(self.vocabulary)))
+                data.append(freq)
+            indptr.append(len(indices))
+
+        return sparse.csr_matrix(
+            (np.array(data, dtype=np.int32), np.array(indices, dtype=np.int32), np.array(indptr, dtype=np.int64)),
+            shape=(len(corpus), len(self.vocabulary))
+        )
+
+    @staticmethod
+    def _count_ids(docs: Sequence[np.ndarray], num_terms: int):
+        """Term frequency rows for documents given as term id arrays."""
+        lengths = np.array([len(doc) for doc in docs], dtype=np.int64)
+        ids = np.concatenate(docs).astype(np.int64) if len(docs) else np.zeros(0, dtype=np.int64)
+        cells, freqs = np.unique(np.repeat(np.arange(len(docs)), lengths) * num_terms + ids, return_counts=True)
+        indptr = np.zeros(len(docs) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cells // num_terms, minlength=len(docs)), out=indptr[1:])
+        return sparse.csr_matrix(
+            (freqs.astype(np.int32), (cells % num_terms).astype(np.int32), indptr),
+            shape=(len(docs), num_terms)
+        )
+
+    @classmethod
+    def from_token_ids(cls, docs: Sequence[np.ndarray], vocabulary: Dict[str, int], k1: float = 1.5, b: float = 0.75,
+                       epsilon: float = 0.25) -> "ImpactBM25":
+        """Index documents given as term id arrays of a shared vocabulary (term -> id, kept by reference)."""
+        index = cls(k1=k1, b=b, epsilon=epsilon)
+        index.vocabulary = vocabulary
+        index._build(index._count_ids(docs, len(vocabulary)))
+        return index
+
+    @classmethod
+    def from_term_frequencies(cls, tf, vocabulary: Union[List[str], Dict[str, int]], k1: float = 1.5, b: float = 0.75,
+                              epsilon: float = 0.25) -> "ImpactBM25":
+        """Build from a doc x term frequency matrix and its column vocabulary.
+
+        `vocabulary` is the terms by column, or a shared term -> id dict
+        (kept by reference, as from_token_ids does).
+        """
+        index = cls(k1=k1, b=b, epsilon=epsilon)
+        index.vocabulary = vocabulary if isinstance(vocabulary, dict) else {term: i for i, term in enumerate(vocabulary)}
+        index._build(sparse.csr_matrix(tf))
+        return index
+
+    @property
+    def vocab_terms(self) -> List[str]:
+        """Terms ordered by column id."""
+        terms = [None] * len(self.vocabulary)
+        for term, idx in self.vocabulary.items():
+            terms[idx] = term
+        return terms
+
+    def _build(self, tf):
+        """Compute corpus statistics and the term x doc impact matrix."""
+        self.tf = tf
+        self.corpus_size, num_terms = tf.shape
+        self.removed = np.zeros(self.corpus_size, dtype=bool)
+
+        self.doc_len = np.asarray(tf.sum(axis=1)).ravel().astype(np.int64)
+        self.df = np.bincount(tf.indices, minlength=num_terms)
+        self._reweight()
+
+    def _reweight(self):
+        """Derive idf and the impact matrix from df, doc_len and the live doc count."""
+        tf = self.tf
+        num_docs = tf.shape[0]
+        self.avgdl = self.doc_len.sum() / self.corpus_size if self.corpus_size else 0.0
+
+        # Okapi idf with negative values floored at epsilon * average idf;
+        # terms only found in removed documents don't count towards the average
+        df = self.df
+        idf = np.log(self.corpus_size - df + 0.5) - np.log(df + 0.5)
+        present = idf[df > 0]
+        self.average_idf = float(present.mean()) if len(present) else 0.0
+        idf[idf < 0] = self.epsilon * self.average_idf
+        self.idf = idf
+
+        # Bake idf and length normalization into every posting
+        doc_ids = np.repeat(np.arange(num_docs), np.diff(tf.indptr))
+        freqs = tf.data.astype(np.float64)
+        norm = self.k1 * (1 - self.b + self.b * self.doc_len[doc_ids] / self.avgdl)
+        weights = idf[tf.indices] * freqs * (self.k1 + 1) / (freqs + norm)
+
+        self.impacts = sparse.csr_matrix(
+            (weights, tf.indices, tf.indptr), shape=tf.shape
+        ).T.tocsr()
+
+    def add_documents(self, corpus: List[List[str]]) -> range:
+        """Append tokenized documents; returns their doc ids."""
+        return self._append(self._count(corpus))
+
+    def add_token_ids(self, docs: Sequence[np.ndarray]) -> range:
+        """Append documents given as term id arrays of the shared vocabulary; returns their doc ids."""
+        return self._append(self._count_ids(docs, len(self.vocabulary)))
+
+    def _append(self, rows) -> range:
+        num_terms = rows.shape[1]
+        first = self.tf.shape[0]
+
+        tf = self.tf
+        self.tf = sparse.csr_matrix(
+            (
+                np.concatenate([tf.data, rows.data]),
+                np.concatenate([tf.indices, rows.indices]),
+                np.concatenate([tf.indptr, rows.indptr[1:] + tf.indptr[-1]])
+            ),
+            shape=(first + rows.shape[0], num_terms)
+        )
+
+        self.df = np.bincount(rows.indices, minlength=num_terms) + np.pad(self.df, (0, num_terms - len(self.df)))
+        self.doc_len = np.concatenate([self.doc_len, np.asarray(rows.sum(axis=1)).ravel().astype(np.int64)])
+        self.removed = np.concatenate([self.removed, np.zeros(rows.shape[0], dtype=bool)])
+        self.corpus_size += rows.shape[0]
+        self._reweight()
+        return range(first, self.tf.shape[0])
+
+    def remove_documents(self, doc_ids: Iterable[int]):
+        """Drop documents from the statistics; their rows stay empty until compact()."""
+        doc_ids = np.unique(np.fromiter(doc_ids, dtype=np.int64))
+        doc_ids = doc_ids[~self.removed[doc_ids]]
+        if not len(doc_ids):
+            return
+
+        tf = self.tf
+        lengths = np.diff(tf.indptr)
+        dropped = np.zeros(tf.shape[0], dtype=bool)
+        dropped[doc_ids] = True
+        keep = ~np.repeat(dropped, lengths)
+
+        self.df = self.df - np.bincount(tf.indices[~keep], minlength=len(self.df))
+        lengths[doc_ids] = 0
+        indptr = np.zeros_like(tf.indptr)
+        np.cumsum(lengths, out=indptr[1:])
+        self.tf = sparse.csr_matrix((tf.data[keep], tf.indices[keep], indptr), shape=tf.shape)
+
+        self.doc_len[doc_ids] = 0
+        self.removed[doc_ids] = True
+        self.corpus_size -= len(doc_ids)
+        self._reweight()
+
+    def compact(self, order: List[int]):
+        """Keep the documents in `order` (renumbered 0..n-1) and drop unused terms.
+
+        Terms are renumbered by first appearance, as the constructor would
+        number them for the same documents, so the result is identical to
+        ImpactBM25(corpus in `order`). For string terms only: an index over
+        shared token ids is refit after the vocabulary is compacted instead.
+        """
+        rows = select_rows(self.tf, order)
+        mapping, old_ids = first_seen_order(rows.indices, len(self.vocabulary))
+        terms = self.vocab_terms
+        self.vocabulary = {terms[old]: new for new, old in enumerate(old_ids)}
+
+        tf = sparse.csr_matrix(
+            (
+                rows.data.astype(np.int32),
+                mapping[rows.indices].astype(np.int32),
+                rows.indptr.astype(np.int64)
+            ),
+            shape=(len(order), len(self.vocabulary))
+        )
+        self._build(tf)
+
+    def _query_vector(self, query: Iterable[str]):
+        term_ids = [self.vocabulary[t] for t in query if t in self.vocabulary]
+        if not term_ids:
+            return None
+        ids, counts = np.unique(term_ids, return_counts=True)
+        return ids, counts.astype(np.float64)
+
+    def get_scores(self, query: Iterable[str]) -> np.ndarray:
+        """BM25 score of every document for a tokenized query."""
+        vector = self._query_vector(query)
+        if vector is None:
+            return np.zeros(self.tf.shape[0])
+
+        ids, counts = vector
+        # Only the postings of the query terms are touched
+        return self.impacts[ids].T @ counts
+
+    def get_scores_batch(self, queries: List[List[str]]) -> np.ndarray:
+        """BM25 scores for many tokenized queries at once (num_queries x num_docs)."""
+        rows, cols, counts = [], [], []
+        for row, query in enumerate(queries):
+            vector = self._query_vector(query)
+            if vector is None:
+                continue
+            ids, freqs = vector
+            rows.extend([row] * len(ids))
+            cols.extend(ids)
+            counts.extend(freqs)
+
+        query_matrix = sparse.csr_matrix(
+            (np.array(counts, dtype=np.float64), (rows, cols)),
+            shape=(len(queries), len(self.vocabulary))
+        )
+        return (query_matrix @ self.impacts).toarray()
+
+    def get_scores_weighted(self, queries: List[Dict[int, float]]) -> np.ndarray:
+        """BM25 scores for weighted queries, term id -> weight (num_queries x num_docs).
+
+        A plain query's weights are its term counts. The postings of each
+        distinct term are gathered once however many queries use it, so a
+        question and its expansions cost about as much as the expansion.
+        Ids without a column yet (not in any indexed document) are skipped.
+        """
+        num_terms = self.tf.shape[1]
+        term_weights = [
+            {term: weight for term, weight in query.items() if 0 <= term < num_terms}
+            for query in queries
+        ]
+        ids = np.array(sorted(set().union(*term_weights)), dtype=np.int64)
+        if not len(ids):
+            return np.zeros((len(queries), self.tf.shape[0]))
+
+        weights = np.zeros((len(ids), len(queries)))
+        for column, query in enumerate(term_weights):
+            if query:
+                weights[np.searchsorted(ids, list(query)), column] = list(query.values())
+        return np.ascontiguousarray((self.impacts[ids].T @ weights).T)
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Cancellation tokens for queries whose caller has gone away
+
+A CancelToken is handed down from the worker (client disconnect, timeout)
+or aquery (asyncio cancellation) into the engine and the LLM backend, which
+check it at their natural boundaries: before retrieval, before generation
+and between streamed tokens. Checks raise QueryCancelled tagged with the
+stage the query had reached, so callers can count the work saved.
+"""
+
+import threading
+from typing import Optional
+
+# How far a query had got when abandoned; everything after it was skipped
+STAGE_QUEUED = "queued"
+STAGE_RETRIEVAL = "retrieval"
+STAGE_GENERATION = "generation"
+STAGE_LLM = "llm"
+
+
+class QueryCancelled(Exception):
+    """The query was cancelled; `stage` says how far it had got."""
+
+    def __init__(self, stage: str):
+        super().__init__(f"Query cancelled ({stage})")
+        self.stage = stage
+
+
+class CancelToken:
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def wait(self, timeout: float) -> bool:
+        """Sleep up to `timeout` seconds; True if cancelled meanwhile."""
+        return self._event.wait(timeout)
+
+    def check(self, stage: str):
+        if self._event.is_set():
+            raise QueryCancelled(stage)
+
+
+def check(token: Optional[CancelToken], stage: str):
+    """Raise QueryCancelled if `token` is set; no-op without a token."""
+    if token is not None:
+        token.check(stage)
@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+"""
+Columnar chunk storage - one text buffer, NumPy columns, views by position
+
+The engine used to hold every enriched chunk as a dict with its own
+content and original_content strings and a 14-key metadata dict. A
+ChunkStore keeps instead:
+
+    content              one UTF-8 buffer plus offsets (original_content
+                         only where cleanup changed the text)
+    page, category,      typed columns (category as an id into
+    quality_score        `categories`; page -1 where it isn't an integer)
+    metadata             one interned key tuple per schema plus a tuple of
+                         interned values per chunk
+
+store[i] is a ChunkView and search results are ResultViews: __slots__
+objects holding a position (and scores) that read like the old dicts,
+decoding text only when a key is read. dict(view) materializes one;
+copy.deepcopy(view) copies the position and scores but shares the store.
+
+save()/load() write the columns as .npy files; the text buffer is
+memory-mapped on load.
+"""
+
+import json
+from array import array
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+CHUNK_KEYS = ("content", "original_content", "metadata", "quality_score", "category")
+RESULT_KEYS = ("content", "metadata", "score", "method", "category", "quality_score",
+               "chunk_index", "final_score", "fusion_methods")
+
+
+class Column:
+    """A growable NumPy array (capacity doubles, so appends are amortized O(1))."""
+
+    def __init__(self, dtype, values: Optional[np.ndarray] = None):
+        self._array = np.zeros(16, dtype=dtype) if values is None else np.array(values, dtype=dtype)
+        self._size = 0 if values is None else len(self._array)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __getitem__(self, i):
+        return self.values[i]
+
+    def append(self, value):
+        if self._size == len(self._array):
+            # A fresh array: views handed out earlier stay valid
+            grown = np.zeros(max(16, 2 * self._size), dtype=self._array.dtype)
+            grown[:self._size] = self._array[:self._size]
+            self._array = grown
+        self._array[self._size] = value
+        self._size += 1
+
+    @property
+    def values(self) -> np.ndarray:
+        return self._array[:self._size]
+
+    @property
+    def nbytes(self) -> int:
+        return self._array.itemsize * self._size
+
+
+class TextColumn:
+    """Append-only strings in one UTF-8 buffer plus end offsets."""
+
+    def __init__(self, data=None, offsets: Optional[np.ndarray] = None):
+        self._data = bytearray() if data is None else data
+        self._offsets = array("q", [0])
+        if offsets is not None:
+            self._offsets = array("q", np.asarray(offsets, dtype=np.int64).tobytes())
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return bytes(self._data[self._offsets[i]:self._offsets[i + 1]]).decode("utf-8")
+
+    def append(self, text: str):
+        if not isinstance(self._data, bytearray):
+            # Loaded from disk (read-only map): copy on first write
+            self._data = bytearray(self._data)
+        self._data += text.encode("utf-8")
+        self._offsets.append(len(self._data))
+
+    @property
+    def offsets(self) -> np.ndarray:
+        return np.frombuffer(self._offsets, dtype=np.int64)
+
+    @property
+    def data(self) -> np.ndarray:
+        return np.frombuffer(self._data, dtype=np.uint8) if isinstance(self._data, bytearray) else self._data
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._data) + self._offsets.itemsize * len(self._offsets)
+
+
+class ChunkStore:
+    """Enriched chunks in columns; store[i] is a ChunkView of position i."""
+
+    def __init__(self):
+        self.content = TextColumn()
+        # original_content where it differs from content ("" elsewhere)
+        self.original = TextColumn()
+        self._original_differs = Column(np.bool_)
+        self._page = Column(np.int32)
+        self._category = Column(np.uint8)
+        self._quality = Column(np.float64)
+
+        self.categories: List[str] = []
+        self._category_ids: Dict[str, int] = {}
+        self._schemas: List[Tuple[str, ...]] = []
+        self._schema_ids: Dict[Tuple[str, ...], int] = {}
+        self._values: Dict[Any, Any] = {}
+        self._metadata: List[Tuple[int, tuple]] = []
+
+    @classmethod
+    def from_chunks(cls, chunks: Iterable[Dict]) -> "ChunkStore":
+        store = cls()
+        store.extend(chunks)
+        return store
+
+    # ---- Writing ----
+
+    def append(self, chunk: Dict) -> int:
+        """Store an enriched chunk dict; returns its position."""
+        content = chunk["content"]
+        original = chunk.get("original_content", content)
+        metadata = chunk["metadata"]
+
+        self.content.append(content)
+        self.original.append("" if original == content else original)
+        self._original_differs.append(original != content)
+        page = metadata.get("page")
+        self._page.append(page if isinstance(page, int) else -1)
+        self._category.append(self._intern_category(chunk["category"]))
+        self._quality.append(chunk["quality_score"])
+        self._metadata.append(self._intern_metadata(metadata))
+        return len(self._metadata) - 1
+
+    def extend(self, chunks: Iterable[Dict]):
+        for chunk in chunks:
+            self.append(chunk)
+
+    def _intern_category(self, category: str) -> int:
+        if category not in self._category_ids:
+            self._category_ids[category] = len(self.categories)
+            self.categories.append(category)
+        return self._category_ids[category]
+
+    def _intern_metadata(self, metadata: Dict) -> Tuple[int, tuple]:
+        keys = tuple(metadata)
+        if keys not in self._schema_ids:
+            self._schema_ids[keys] = len(self._schemas)
+            self._schemas.append(keys)
+        values = tuple(self._intern_value(metadata[key]) for key in keys)
+        return self._schema_ids[keys], values
+
+    def _intern_value(self, value: Any) -> Any:
+        try:
+            return self._values.setdefault((type(value), value), value)
+        except TypeError:
+            return value  # unhashable (nested) values are kept as they are
+
+    def take(self, positions: Sequence[int]) -> "ChunkStore":
+        """A new store holding the chunks at these positions, in this order."""
+        store = ChunkStore()
+        for i in positions:
+            store.append(self.chunk_dict(i))
+        return store
+
+    # ---- Reading ----
+
+    def __len__(self) -> int:
+        return len(self._metadata)
+
+    def __getitem__(self, i: int) -> "ChunkView":
+        if not -len(self) <= i < len(self):
+            raise IndexError(i)
+        return ChunkView(self, i % len(self))
+
+    def __iter__(self) -> Iterator["ChunkView"]:
+        return (ChunkView(self, i) for i in range(len(self)))
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, ChunkStore):
+            return NotImplemented
+        return len(self) == len(other) and all(self.chunk_dict(i) == other.chunk_dict(i) for i in range(len(self)))
+
+    @property
+    def page(self) -> np.ndarray:
+        return self._page.values
+
+    @property
+    def category_ids(self) -> np.ndarray:
+        return self._category.values
+
+    @property
+    def quality(self) -> np.ndarray:
+        return self._quality.values
+
+    def category_id(self, category: str) -> int:
+        """Id of a category, -1 if no chunk has it."""
+        return self._category_ids.get(category, -1)
+
+    def category(self, i: int) -> str:
+        return self.categories[self._category[i]]
+
+    def texts(self, positions: Optional[Iterable[int]] = None) -> List[str]:
+        """Contents at the given positions (all by default)."""
+        return [self.content[i] for i in (range(len(self)) if positions is None else positions)]
+
+    def original_content(self, i: int) -> str:
+        return self.original[i] if self._original_differs[i] else self.content[i]
+
+    def metadata(self, i: int) -> Dict:
+        schema, values = self._metadata[i]
+        return dict(zip(self._schemas[schema], values))
+
+    def metadata_value(self, i: int, key: str, default: Any = None) -> Any:
+        schema, values = self._metadata[i]
+        keys = self._schemas[schema]
+        return values[keys.index(key)] if key in keys else default
+
+    def chunk_id(self, i: int) -> Optional[str]:
+        return self.metadata_value(i, "chunk_id")
+
+    def field(self, i: int, key: str) -> Any:
+        if key == "content":
+            return self.content[i]
+        if key == "metadata":
+            return self.metadata(i)
+        if key == "category":
+            return self.category(i)
+        if key == "quality_score":
+            return float(self._quality[i])
+        if key == "original_content":
+            return self.original_content(i)
+        raise KeyError(key)
+
+    def chunk_dict(self, i: int) -> Dict:
+        """The enriched chunk dict at position i."""
+        return {key: self.field(i, key) for key in CHUNK_KEYS}
+
+    def to_dicts(self) -> List[Dict]:
+        return [self.chunk_dict(i) for i in range(len(self))]
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the text buffers and columns (metadata tuples excluded)."""
+        columns = (self._original_differs, self._page, self._category, self._quality)
+        return self.content.nbytes + self.original.nbytes + sum(column.nbytes for column in columns)
+
+    # ---- Storage ----
+
+    def save(self, directory: Path, prefix: str = "chunks"):
+        directory = Path(directory)
+        np.save(directory / f"{prefix}_content.npy", self.content.data)
+        np.save(directory / f"{prefix}_content_offsets.npy", self.content.offsets)
+        np.save(directory / f"{prefix}_original.npy", self.original.data)
+        np.save(directory / f"{prefix}_original_offsets.npy", self.original.offsets)
+        np.save(directory / f"{prefix}_original_differs.npy", self._original_differs.values)
+        np.save(directory / f"{prefix}_page.npy", self.page)
+        np.save(directory / f"{prefix}_category.npy", self.category_ids)
+        np.save(directory / f"{prefix}_quality.npy", self.quality)
+        with open(directory / f"{prefix}_metadata.json", "w") as f:
+            json.dump({
+                "categories": self.categories,
+                "schemas": self._schemas,
+                "metadata": self._metadata
+            }, f)
+
+    @classmethod
+    def load(cls, directory: Path, prefix: str = "chunks") -> "ChunkStore":
+        """Load a saved store; the text buffers stay memory-mapped until written to."""
+        directory = Path(directory)
+        store = cls()
+        store.content = TextColumn(
+            np.load(directory / f"{prefix}_content.npy", mmap_mode="r"),
+            np.load(directory / f"{prefix}_content_offsets.npy")
+        )
+        store.original = TextColumn(
+            np.load(directory / f"{prefix}_original.npy", mmap_mode="r"),
+            np.load(directory / f"{prefix}_original_offsets.npy")
+        )
+        store._original_differs = Column(np.bool_, np.load(directory / f"{prefix}_original_differs.npy"))
+        store._page = Column(np.int32, np.load(directory / f"{prefix}_page.npy"))
+        store._category = Column(np.uint8, np.load(directory / f"{prefix}_category.npy"))
+        store._quality = Column(np.float64, np.load(directory / f"{prefix}_quality.npy"))
+
+        with open(directory / f"{prefix}_metadata.json", "r") as f:
+            saved = json.load(f)
+        store.categories = saved["categories"]
+        store._category_ids = {category: i for i, category in enumerate(store.categories)}
+        store._schemas = [tuple(keys) for keys in saved["schemas"]]
+        store._schema_ids = {keys: i for i, keys in enumerate(store._schemas)}
+        store._metadata = [
+            (schema, tuple(store._intern_value(value) for value in values))
+            for schema, values in saved["metadata"]
+        ]
+        return store
+
+
+class ChunkView(Mapping):
+    """Read-only, dict-like view of one stored chunk."""
+
+    __slots__ = ("store", "index")
+
+    def __init__(self, store: ChunkStore, index: int):
+        self.store = store
+        self.index = index
+
+    def __getitem__(self, key: str) -> Any:
+        return self.store.field(self.index, key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(CHUNK_KEYS)
+
+    def __len__(self) -> int:
+        return len(CHUNK_KEYS)
+
+    def __repr__(self) -> str:
+        return f"ChunkView({self.index})"
+
+    def __deepcopy__(self, memo) -> "ChunkView":
+        # The store is shared, not copied: a view stays a position
+        return ChunkView(self.store, self.index)
+
+
+class ResultView(Mapping):
+    """A ranked chunk: position and scores; text is read from the store on access."""
+
+    __slots__ = ("store", "chunk_index", "score", "method", "final_score", "fusion_methods")
+
+    def __init__(self, store: ChunkStore, chunk_index: int, score: float, method: str,
+                 final_score: float, fusion_methods: List[str]):
+        self.store = store
+        self.chunk_index = chunk_index
+        self.score = score
+        self.method = method
+        self.final_score = final_score
+        self.fusion_methods = fusion_methods
+
+    def __getitem__(self, key: str) -> Any:
+        if key in ("chunk_index", "score", "method", "final_score", "fusion_methods"):
+            return getattr(self, key)
+        if key in RESULT_KEYS:
+            return self.store.field(self.chunk_index, key)
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(RESULT_KEYS)
+
+    def __len__(self) -> int:
+        return len(RESULT_KEYS)
+
+    def __repr__(self) -> str:
+        return f"ResultView({self.chunk_index}, {self.method}, {self.final_score:.4f})"
+
+    def __deepcopy__(self, memo) -> "ResultView":
+        # Share the store so cached results don't each copy the knowledge base
+        return ResultView(self.store, self.chunk_index, self.score, self.method,
+                          self.final_score, list(self.fusion_methods))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self)
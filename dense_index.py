@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+"""
+Dense retrieval leg - chunk embeddings in a persistent Chroma collection
+
+Chunks are embedded with an EmbeddingBackend and upserted in batches into
+a collection named after the backend (one vector space per collection),
+keyed by metadata.chunk_id. Each record carries a hash of the chunk text,
+so after a restart sync() only embeds chunks that are new or changed and
+deletes the ones that are gone. Queries are embedded by the same backend
+and answered by Chroma's cosine HNSW index; similarities are
+1 - cosine distance.
+
+Chroma's client is not fork-safe: once a process has used it, clients
+created in its forked children hang. A process that forks serving workers
+therefore leaves Chroma to children (run_in_child for the initial sync,
+then one client per worker).
+
+Without Chroma, LocalDenseIndex offers the same interface over a built-in
+IVF index (ann_index.py): float16 vectors and the index live in files
+under one generation directory and are memory-mapped on load, so forked
+workers share them. Updates append to the generation; other processes
+see them on their next search.
+"""
+
+import os
+import re
+import json
+import fcntl
+import shutil
+import hashlib
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from embedding_backends import EmbeddingBackend
+from ann_index import IVFIndex, swap_symlink
+
+LOCAL_FORMAT_VERSION = 2
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def collection_name(prefix: str, backend: EmbeddingBackend) -> str:
+    """A valid Chroma collection name for this backend's vector space."""
+    return re.sub(r"[^a-zA-Z0-9._-]+", "-", f"{prefix}-{backend.name}").strip("-._")[:512]
+
+
+def run_in_child(fn: Callable[[], Any]) -> Any:
+    """fn() run in a forked child; its result must be JSON serializable."""
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            os.close(read_fd)
+            try:
+                payload = {"result": fn()}
+            except BaseException as e:
+                payload = {"error": f"{type(e).__name__}: {e}"}
+                code = 1
+            with os.fdopen(write_fd, "w") as f:
+                json.dump(payload, f)
+        finally:
+            os._exit(code)
+
+    os.close(write_fd)
+    with os.fdopen(read_fd) as f:
+        data = f.read()
+    os.waitpid(pid, 0)
+    payload = json.loads(data) if data else {"error": "child exited without a result"}
+    if "error" in payload:
+        raise RuntimeError(payload["error"])
+    return payload["result"]
+
+
+class DenseIndex:
+    def __init__(self, backend: EmbeddingBackend, batch_size: int = 64, prefix: str = "chunks"):
+        """Call attach() with a Chroma client before use."""
+        self.backend = backend
+        self.batch_size = max(1, batch_size)
+        self.name = collection_name(prefix, backend)
+        self.collection = None
+
+    @property
+    def ready(self) -> bool:
+        return self.collection is not None
+
+    def attach(self, client):
+        """(Re)open the collection through `client`, e.g. a fresh one after fork."""
+        self.collection = client.get_or_create_collection(
+            self.name,
+            metadata={"hnsw:space": "cosine"},
+            embedding_function=None
+        )
+
+    def upsert(self, ids: List[str], texts: List[str], metadatas: List[Dict]):
+        """Embed and store chunks, `batch_size` at a time."""
+        for start in range(0, len(ids), self.batch_size):
+            end = start + self.batch_size
+            batch_texts = texts[start:end]
+            self.collection.upsert(
+                ids=ids[start:end],
+                embeddings=self.backend.embed_documents(batch_texts),
+                metadatas=[
+                    {**metadata, "content_hash": content_hash(text)}
+                    for metadata, text in zip(metadatas[start:end], batch_texts)
+                ]
+            )
+
+    def delete(self, ids: List[str]):
+        for start in range(0, len(ids), self.batch_size):
+            self.collection.delete(ids=ids[start:start + self.batch_size])
+
+    def sync(self, ids: List[str], texts: List[str], metadatas: List[Dict]) -> Tuple[int, int]:
+        """Make the collection hold exactly these chunks; returns (embedded, deleted)."""
+        stored = self.collection.get(include=["metadatas"])
+        stored_hashes = {
+            chunk_id: (metadata or {}).get("content_hash")
+            for chunk_id, metadata in zip(stored["ids"], stored["metadatas"])
+        }
+
+        wanted = set(ids)
+        stale = [chunk_id for chunk_id in stored_hashes if chunk_id not in wanted]
+        if stale:
+            self.delete(stale)
+
+        todo = [
+            i for i, (chunk_id, text) in enumerate(zip(ids, texts))
+            if stored_hashes.get(chunk_id) != content_hash(text)
+        ]
+        if todo:
+            self.upsert([ids[i] for i in todo], [texts[i] for i in todo], [metadatas[i] for i in todo])
+        return len(todo), len(stale)
+
+    def search(self, queries: List[str], n_results: int) -> List[List[Tuple[str, float]]]:
+        """(chunk id, cosine similarity) pairs per query, best first."""
+        count = self.collection.count()
+        if not queries or count == 0:
+            return [[] for _ in queries]
+
+        response = self.collection.query(
+            query_embeddings=self.backend.embed_queries(queries),
+            n_results=min(n_results, count),
+            include=["distances"]
+        )
+        return [
+            [(chunk_id, 1.0 - distance) for chunk_id, distance in zip(ids, distances)]
+            for ids, distances in zip(response["ids"], response["distances"])
+        ]
+
+    def __len__(self) -> int:
+        return self.collection.count()
+
+
+class LocalDenseIndex:
+    """DenseIndex over a memory-mapped IVF index in `directory`, no Chroma needed.
+
+    `directory/current` is a symlink to one generation directory:
+
+        meta.json      format version, dimension and rows covered by ivf
+        vectors.f16    float16 embeddings, one row per added record
+        records.jsonl  append-only log; {"add": id, "hash": h} takes the
+                       next row, {"delete": id} tombstones the live one
+        ivf            the IVF index over the rows present at sync time
+
+    sync() writes a new, compacted generation and swaps `current` to it.
+    upsert() and delete() only append to the current generation, so an
+    incremental change costs its own rows. Vectors are appended before
+    their records, and other processes pick both up on their next search.
+    Writers serialize on a lock file. Results from int8 or PQ storage are
+    re-ranked against the vectors.
+    """
+
+    def __init__(self, backend: EmbeddingBackend, directory: Path, batch_size: int = 64,
+                 nprobe: int = 16, storage: str = "float16"):
+        self.backend = backend
+        self.batch_size = max(1, batch_size)
+        self.nprobe = nprobe
+        self.storage = storage
+        self.name = collection_name("ann", backend)
+        self.directory = Path(directory) / self.name
+        self.ready = True
+
+        self.chunk_ids: List[Optional[str]] = []
+        self.hashes: List[Optional[str]] = []
+        self.vectors: Optional[np.ndarray] = None
+        self.index: Optional[IVFIndex] = None
+        self._live: Dict[str, int] = {}
+        self._generation: Optional[Path] = None
+        self._dim = 0
+        self._offset = 0
+        self._indexed_storage: Optional[str] = None
+        self._load()
+
+    # ---- Reading ----
+
+    def _load(self) -> bool:
+        """Read the current generation; False, keeping the old state, if there is none."""
+        try:
+            generation = (self.directory / "current").resolve(strict=True)
+            with open(generation / "meta.json", "r") as f:
+                meta = json.load(f)
+            with open(generation / "records.jsonl", "rb") as f:
+                data = f.read()
+        except (OSError, ValueError):
+            return False
+        if meta.get("version") != LOCAL_FORMAT_VERSION:
+            return False
+
+        chunk_ids, hashes, live = [], [], {}
+        offset, deleted = self._replay(data, chunk_ids, hashes, live)
+        try:
+            vectors = self._map(generation, len(chunk_ids), meta["dim"])
+        except (OSError, ValueError):
+            return False
+
+        # A different storage format is rebuilt here from the vectors (and by the next sync on disk)
+        index = IVFIndex.load(generation / "ivf")
+        indexed_storage = index.storage if index is not None else None
+        indexed = meta["indexed"]
+        if index is None or index.storage != self.storage:
+            index, indexed = IVFIndex(meta["dim"], storage=self.storage), 0
+        self._catch_up(index, vectors, indexed, deleted)
+
+        self.chunk_ids, self.hashes, self._live = chunk_ids, hashes, live
+        self.vectors, self.index = vectors, index
+        self._generation, self._dim, self._offset = generation, meta["dim"], offset
+        self._indexed_storage = indexed_storage
+        return True
+
+    def refresh(self):
+        """Pick up appends and new generations written since the last look."""
+        try:
+            generation = (self.directory / "current").resolve(strict=True)
+            size = (generation / "records.jsonl").stat().st_size
+        except OSError:
+            return
+        if generation != self._generation:
+            self._load()
+        elif size > self._offset:
+            self._read_tail()
+
+    def _read_tail(self):
+        with open(self._generation / "records.jsonl", "rb") as f:
+            f.seek(self._offset)
+            data = f.read()
+        first = len(self.chunk_ids)
+        consumed, deleted = self._replay(data, self.chunk_ids, self.hashes, self._live)
+        if not consumed:
+            return
+        self._offset += consumed
+        self.vectors = self._map(self._generation, len(self.chunk_ids), self._dim)
+        self._catch_up(self.index, self.vectors, first, deleted)
+
+    @staticmethod
+    def _replay(data: bytes, chunk_ids: List[Optional[str]], hashes: List[Optional[str]],
+                live: Dict[str, int]) -> Tuple[int, List[int]]:
+        """Apply the complete lines of a records.jsonl tail; (bytes consumed, rows deleted)."""
+        end = data.rfind(b"\n") + 1
+        deleted = []
+        for line in data[:end].splitlines():
+            record = json.loads(line)
+            if "add" in record:
+                live[record["add"]] = len(chunk_ids)
+                chunk_ids.append(record["add"])
+                hashes.append(record["hash"])
+            else:
+                row = live.pop(record["delete"], None)
+                if row is not None:
+                    chunk_ids[row] = None
+                    hashes[row] = None
+                    deleted.append(row)
+        return end, deleted
+
+    @staticmethod
+    def _map(generation: Path, rows: int, dim: int) -> np.ndarray:
+        if rows == 0:
+            return np.zeros((0, dim), dtype=np.float16)
+        return np.memmap(generation / "vectors.f16", dtype=np.float16, mode="r", shape=(rows, dim))
+
+    @staticmethod
+    def _catch_up(index: IVFIndex, vectors: np.ndarray, first: int, deleted: List[int]):
+        """Index rows from `first` on and drop deleted ones, in memory."""
+        if len(vectors) > first:
+            index.add(np.asarray(vectors[first:], dtype=np.float32), np.arange(first, len(vectors)))
+        if deleted and len(index):
+            index.remove(np.array(deleted))
+
+    # ---- Writing ----
+
+    @contextmanager
+    def _writing(self):
+        """Exclusive across processes; starts from everything already written."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(self.directory / "write.lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                self.refresh()
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _publish(self, ids: List[str], hashes: List[str], vectors: np.ndarray):
+        """Write a new generation holding exactly these rows and swap it in."""
+        generation = Path(tempfile.mkdtemp(prefix="gen-", dir=self.directory))
+        dim = vectors.shape[1]
+        vectors.tofile(generation / "vectors.f16")
+        with open(generation / "records.jsonl", "wb") as f:
+            f.write(self._records([], ids, hashes))
+
+        index = IVFIndex(dim, storage=self.storage)
+        if len(vectors):
+            index.add(vectors.astype(np.float32))
+            index.save(generation / "ivf")
+        with open(generation / "meta.json", "w") as f:
+            json.dump({"version": LOCAL_FORMAT_VERSION, "dim": dim, "indexed": len(index)}, f)
+
+        previous = swap_symlink(self.directory / "current", generation)
+        # Keep the previous generation for readers still loading it
+        for path in self.directory.iterdir():
+            if path.name.startswith("gen-") and path not in (generation, previous):
+                shutil.rmtree(path, ignore_errors=True)
+        # Files of the version 1 layout
+        for name in ("vectors.npy", "records.json"):
+            (self.directory / name).unlink(missing_ok=True)
+        shutil.rmtree(self.directory / "ivf", ignore_errors=True)
+        self._load()
+
+    def _append(self, deleted: List[str], ids: List[str] = (), hashes: List[str] = (),
+                vectors: Optional[np.ndarray] = None):
+        """Append to the current generation: vectors first, then their records."""
+        if vectors is not None and len(vectors):
+            with open(self._generation / "vectors.f16", "ab") as f:
+                f.write(vectors.astype(np.float16).tobytes())
+        with open(self._generation / "records.jsonl", "ab") as f:
+            f.write(self._records(deleted, ids, hashes))
+        self._read_tail()
+
+    @staticmethod
+    def _records(deleted: List[str], ids: List[str], hashes: List[str]) -> bytes:
+        lines = [json.dumps({"delete": chunk_id}) for chunk_id in deleted]
+        lines += [json.dumps({"add": chunk_id, "hash": h}) for chunk_id, h in zip(ids, hashes)]
+        return "".join(line + "\n" for line in lines).encode("utf-8")
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        batches = [
+            self.backend.embed_documents(texts[start:start + self.batch_size])
+            for start in range(0, len(texts), self.batch_size)
+        ]
+        return np.concatenate(batches).astype(np.float16)
+
+    def sync(self, ids: List[str], texts: List[str], metadatas: List[Dict]) -> Tuple[int, int]:
+        """Make the index hold exactly these chunks; returns (embedded, deleted)."""
+        with self._writing():
+            stored_hashes = {chunk_id: self.hashes[row] for chunk_id, row in self._live.items()}
+            hashes = [content_hash(text) for text in texts]
+
+            todo = [i for i, (chunk_id, h) in enumerate(zip(ids, hashes)) if stored_hashes.get(chunk_id) != h]
+            wanted = set(ids)
+            stale = [chunk_id for chunk_id in self._live if chunk_id not in wanted]
+            compact = len(self._live) == len(self.chunk_ids) and (
+                self._indexed_storage == self.storage or not self._live)
+            if not todo and not stale and self._generation is not None and compact:
+                return 0, 0
+            if not ids and self._generation is None:
+                return 0, 0
+
+            # A new generation, compacted and in the given order: kept rows plus fresh embeddings
+            fresh = dict(zip((ids[i] for i in todo), self._embed([texts[i] for i in todo]))) if todo else {}
+            dim = next(iter(fresh.values())).shape[0] if fresh else self._dim
+            vectors = np.empty((len(ids), dim), dtype=np.float16)
+            for i, chunk_id in enumerate(ids):
+                vectors[i] = fresh[chunk_id] if chunk_id in fresh else self.vectors[self._live[chunk_id]]
+            self._publish(list(ids), hashes, vectors)
+        return len(todo), len(stale)
+
+    def upsert(self, ids: List[str], texts: List[str], metadatas: List[Dict]):
+        """Embed and add chunks, replacing existing ones with the same id."""
+        with self._writing():
+            vectors = self._embed(texts)
+            hashes = [content_hash(text) for text in texts]
+            if self._generation is None:
+                self._publish(list(ids), hashes, vectors)
+            else:
+                self._append([chunk_id for chunk_id in ids if chunk_id in self._live], ids, hashes, vectors)
+
+    def delete(self, ids: List[str]):
+        """Tombstone these chunks (compacted by the next sync)."""
+        with self._writing():
+            dropped = [chunk_id for chunk_id in ids if chunk_id in self._live]
+            if dropped:
+                self._append(dropped)
+
+    def search(self, queries: List[str], n_results: int) -> List[List[Tuple[str, float]]]:
+        """(chunk id, cosine similarity) pairs per query, best first."""
+        self.refresh()
+        if not queries or self.index is None or not len(self.index):
+            return [[] for _ in queries]
+
+        rerank = self.vectors if self.storage in ("int8", "pq") else None
+        scores, rows = self.index.search(self.backend.embed_queries(queries), n_results, self.nprobe, rerank=rerank)
+        return [
+            [(self.chunk_ids[row], float(score)) for row, score in zip(row_ids, row_scores) if row >= 0]
+            for row_ids, row_scores in zip(rows, scores)
+        ]
+
+    def __len__(self) -> int:
+        return len(self.index) if self.index is not None else 0
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Embedding backends - text to vectors for the dense retrieval leg
+
+RAG_EMBEDDING_BACKEND selects the implementation:
+    hashing                Character n-gram feature hashing; local, no model
+                           download and no network (default backend, for
+                           offline runs and CI). Not semantic, so it only
+                           turns the dense leg on with RAG_DENSE_RETRIEVAL=1
+    sentence-transformers  A local sentence-transformers model
+                           (RAG_EMBEDDING_MODEL, default all-MiniLM-L6-v2)
+    voyage                 Voyage AI API (needs VOYAGE_API_KEY)
+
+Every backend returns L2-normalized float32 rows, so cosine distance in
+the vector store is one minus the dot product. `name` identifies the
+vector space: vectors from different names must never be compared.
+"""
+
+import os
+from typing import List, Optional
+
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer
+
+try:
+    from sentence_transformers import SentenceTransformer
+    SENTENCE_TRANSFORMERS_AVAILABLE = True
+except Exception:
+    SENTENCE_TRANSFORMERS_AVAILABLE = False
+
+try:
+    import voyageai
+    VOYAGE_AVAILABLE = True
+except Exception:
+    VOYAGE_AVAILABLE = False
+
+
+class EmbeddingBackend:
+    """Embed documents and queries into one vector space."""
+
+    name = "base"
+
+    def embed_documents(self, texts: List[str]) -> np.ndarray:
+        raise NotImplementedError
+
+    def embed_queries(self, texts: List[str]) -> np.ndarray:
+        """Query-side embeddings (default: same as documents)."""
+        return self.embed_documents(texts)
+
+
+def _normalized(vectors) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1.0)
+
+
+class HashingEmbedding(EmbeddingBackend):
+    """Offline embeddings: hashed character n-grams within word boundaries.
+
+    Not semantic, but unlike the word-level TF-IDF leg it matches spelling
+    variants and word fragments ("licence"/"license", "G1"/"G1's").
+    """
+
+    def __init__(self, dim: int = 512, ngram_range=(3, 5)):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+        self._vectorizer = HashingVectorizer(
+            n_features=dim,
+            analyzer="char_wb",
+            ngram_range=ngram_range,
+            alternate_sign=False,
+            norm="l2"
+        )
+
+    def embed_documents(self, texts: List[str]) -> np.ndarray:
+        return self._vectorizer.transform(texts).toarray().astype(np.float32)
+
+
+class SentenceTransformerEmbedding(EmbeddingBackend):
+    def __init__(self, model: str = "all-MiniLM-L6-v2"):
+        if not SENTENCE_TRANSFORMERS_AVAILABLE:
+            raise RuntimeError("sentence-transformers is not installed")
+        self.model = SentenceTransformer(model)
+        self.name = f"st-{model}"
+
+    def embed_documents(self, texts: List[str]) -> np.ndarray:
+        return _normalized(self.model.encode(texts, normalize_embeddings=True))
+
+
+class VoyageEmbedding(EmbeddingBackend):
+    def __init__(self, api_key: str, model: str = "voyage-3-lite"):
+        if not VOYAGE_AVAILABLE:
+            raise RuntimeError("voyageai is not installed")
+        self.client = voyageai.Client(api_key=api_key)
+        self.model = model
+        self.name = f"voyage-{model}"
+
+    def _embed(self, texts: List[str], input_type: str) -> np.ndarray:
+        return _normalized(self.client.embed(texts, model=self.model, input_type=input_type).embeddings)
+
+    def embed_documents(self, texts: List[str]) -> np.ndarray:
+        return self._embed(texts, "document")
+
+    def embed_queries(self, texts: List[str]) -> np.ndarray:
+        return self._embed(texts, "query")
+
+
+def configured_backend_name() -> str:
+    return os.getenv("RAG_EMBEDDING_BACKEND", "hashing").lower()
+
+
+def is_semantic_backend(name: Optional[str] = None) -> bool:
+    """Whether the backend is a real embedding model (everything but hashing)."""
+    return (name or configured_backend_name()) != "hashing"
+
+
+def create_embedding_backend(name: Optional[str] = None) -> EmbeddingBackend:
+    """Backend selected by name or RAG_EMBEDDING_BACKEND; raises if it can't be used."""
+    name = (name or configured_backend_name()).lower()
+
+    if name == "hashing":
+        return HashingEmbedding(dim=int(os.getenv("RAG_EMBEDDING_DIM", "512")))
+
+    if name == "sentence-transformers":
+        return SentenceTransformerEmbedding(os.getenv("RAG_EMBEDDING_MODEL", "all-MiniLM-L6-v2"))
+
+    if name == "voyage":
+        api_key = os.getenv("VOYAGE_API_KEY")
+        if not api_key:
+            raise RuntimeError("VOYAGE_API_KEY not found")
+        return VoyageEmbedding(api_key, os.getenv("RAG_EMBEDDING_MODEL", "voyage-3-lite"))
+
+    raise ValueError(f"Unknown embedding backend: {name}")
+
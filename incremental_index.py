@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Building blocks for updating the retrieval index in place
+
+AppendableCSR keeps sparse rows in growable buffers, so appending documents
+costs only their own non-zeros and removing one just empties its row
+(a tombstone) until the next compaction.
+
+TF-IDF can't be updated exactly row by row: vocabulary pruning (max_df,
+max_features) and idf depend on the whole corpus. Instead every document's
+token ids are kept, and compaction renumbers the shared vocabulary in
+first-seen order and refits BM25 and TF-IDF on those ids (see tokenizer.py),
+bit-for-bit identical to a fresh build without tokenizing anything again.
+"""
+
+from typing import Iterable, List, Tuple
+
+import numpy as np
+from scipy import sparse
+
+
+class AppendableCSR:
+    def __init__(self, matrix):
+        """Start from an existing CSR matrix (copied into private buffers)."""
+        matrix = sparse.csr_matrix(matrix)
+        self.num_columns = matrix.shape[1]
+        self._data = np.array(matrix.data)
+        self._indices = np.array(matrix.indices)
+        self._indptr = np.array(matrix.indptr)
+        self._nnz = len(self._data)
+        self.num_rows = matrix.shape[0]
+        self.cleared = 0
+
+    def _reserve(self, nnz: int, rows: int):
+        """Grow the buffers geometrically so appends are amortized O(new nnz)."""
+        if nnz > len(self._data):
+            size = max(nnz, 2 * len(self._data))
+            self._data = np.resize(self._data, size)
+            self._indices = np.resize(self._indices, size)
+        if rows + 1 > len(self._indptr):
+            self._indptr = np.resize(self._indptr, max(rows + 1, 2 * len(self._indptr)))
+
+    def append(self, rows) -> range:
+        """Append the rows of a CSR matrix with the same columns; returns their row ids."""
+        rows = sparse.csr_matrix(rows)
+        if rows.shape[1] != self.num_columns:
+            raise ValueError(f"Expected {self.num_columns} columns, got {rows.shape[1]}")
+
+        first = self.num_rows
+        nnz = self._nnz + rows.nnz
+        self._reserve(nnz, first + rows.shape[0])
+        self._data[self._nnz:nnz] = rows.data
+        self._indices[self._nnz:nnz] = rows.indices
+        self._indptr[first + 1:first + rows.shape[0] + 1] = rows.indptr[1:] + self._nnz
+        self._nnz = nnz
+        self.num_rows += rows.shape[0]
+        return range(first, self.num_rows)
+
+    def clear_rows(self, rows: Iterable[int]):
+        """Zero the given rows in place; they score 0 until compaction drops them."""
+        for row in rows:
+            self._data[self._indptr[row]:self._indptr[row + 1]] = 0
+            self.cleared += 1
+
+    @property
+    def matrix(self) -> sparse.csr_matrix:
+        """The current rows as a CSR matrix sharing the buffers (no copy)."""
+        return sparse.csr_matrix(
+            (self._data[:self._nnz], self._indices[:self._nnz], self._indptr[:self.num_rows + 1]),
+            shape=(self.num_rows, self.num_columns),
+            copy=False
+        )
+
+
+def first_seen_order(columns: np.ndarray, num_columns: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Renumber column ids by first appearance in `columns`.
+
+    Returns (mapping old id -> new id, -1 for unused ids; old ids in new order).
+    """
+    used, first = np.unique(columns, return_index=True)
+    old_ids = used[np.argsort(first, kind="stable")]
+    mapping = np.full(num_columns, -1, dtype=np.int64)
+    mapping[old_ids] = np.arange(len(old_ids))
+    return mapping, old_ids
+
+
+def select_rows(matrix: sparse.csr_matrix, rows: List[int]) -> sparse.csr_matrix:
+    """Rows of a CSR matrix in the given order, keeping each row's entry order."""
+    matrix = sparse.csr_matrix(matrix)
+    starts = matrix.indptr[rows]
+    lengths = matrix.indptr[np.asarray(rows, dtype=np.int64) + 1] - starts
+    positions = (np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+                 if len(rows) else np.zeros(0, dtype=np.int64))
+    indptr = np.zeros(len(rows) + 1, dtype=matrix.indptr.dtype)
+    np.cumsum(lengths, out=indptr[1:])
+    return sparse.csr_matrix(
+        (matrix.data[positions], matrix.indices[positions], indptr),
+        shape=(len(rows), matrix.shape[1])
+    )
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+On-disk index snapshot - enriched chunks plus BM25/TF-IDF state
+
+A snapshot is a directory of plain .npy arrays (memory-mapped on load) and
+small JSON files, tagged with the SHA-256 of the knowledge base it was built
+from. Loading a snapshot whose hash or format version doesn't match returns
+None so the caller falls back to a full rebuild.
+"""
+
+import os
+import json
+import shutil
+import hashlib
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+from scipy import sparse
+
+from chunk_store import ChunkStore
+
+SNAPSHOT_VERSION = 4
+MANIFEST_FILE = "manifest.json"
+
+
+def knowledge_base_hash(path: Path) -> str:
+    """Content hash of the knowledge base file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _save_csr(directory: Path, prefix: str, matrix: sparse.csr_matrix):
+    matrix = sparse.csr_matrix(matrix)
+    np.save(directory / f"{prefix}_data.npy", matrix.data)
+    np.save(directory / f"{prefix}_indices.npy", matrix.indices)
+    np.save(directory / f"{prefix}_indptr.npy", matrix.indptr)
+
+
+def _load_csr(directory: Path, prefix: str, shape) -> sparse.csr_matrix:
+    return sparse.csr_matrix(
+        (
+            np.load(directory / f"{prefix}_data.npy", mmap_mode="r"),
+            np.load(directory / f"{prefix}_indices.npy", mmap_mode="r"),
+            np.load(directory / f"{prefix}_indptr.npy", mmap_mode="r"),
+        ),
+        shape=tuple(shape),
+        copy=False
+    )
+
+
+def save_snapshot(
+    snapshot_dir: Path,
+    source_hash: str,
+    chunks: ChunkStore,
+    vocabulary,
+    bm25,
+    tfidf,
+    tfidf_matrix,
+    category_indices: Dict[str, List[int]]
+) -> Path:
+    """Write a snapshot atomically (build in a temp dir, then swap in)."""
+    snapshot_dir = Path(snapshot_dir)
+    tmp_dir = snapshot_dir.with_name(snapshot_dir.name + ".tmp")
+    if tmp_dir.exists():
+        shutil.rmtree(tmp_dir)
+    tmp_dir.mkdir(parents=True)
+
+    # Enriched chunks, column by column
+    chunks.save(tmp_dir)
+
+    # Shared token vocabulary, in id order
+    with open(tmp_dir / "tokens.json", "w") as f:
+        json.dump(vocabulary.terms, f)
+
+    # BM25 term statistics as a doc x token id frequency matrix
+    _save_csr(tmp_dir, "bm25_tf", bm25.tf)
+
+    # TF-IDF features (n-grams of token ids), idf weights and document matrix
+    np.save(tmp_dir / "tfidf_features.npy", tfidf.features)
+    np.save(tmp_dir / "tfidf_idf.npy", np.asarray(tfidf.idf))
+    _save_csr(tmp_dir, "tfidf", tfidf_matrix)
+
+    manifest = {
+        "version": SNAPSHOT_VERSION,
+        "source_hash": source_hash,
+        "num_chunks": len(chunks),
+        "bm25": {
+            "k1": bm25.k1,
+            "b": bm25.b,
+            "epsilon": bm25.epsilon,
+            "shape": list(bm25.tf.shape)
+        },
+        "tfidf": {"shape": list(tfidf_matrix.shape)},
+        "category_indices": category_indices
+    }
+    with open(tmp_dir / MANIFEST_FILE, "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    if snapshot_dir.exists():
+        shutil.rmtree(snapshot_dir)
+    os.replace(tmp_dir, snapshot_dir)
+
+    return snapshot_dir
+
+
+def read_manifest(snapshot_dir: Path) -> Optional[Dict[str, Any]]:
+    """Return the snapshot manifest, or None if missing or unreadable."""
+    try:
+        with open(Path(snapshot_dir) / MANIFEST_FILE, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def load_snapshot(snapshot_dir: Path, source_hash: str) -> Optional[Dict[str, Any]]:
+    """Load a snapshot if it matches the current format and knowledge base."""
+    snapshot_dir = Path(snapshot_dir)
+    manifest = read_manifest(snapshot_dir)
+    if manifest is None:
+        return None
+    if manifest.get("version") != SNAPSHOT_VERSION:
+        print(f"⚠️ Index snapshot version {manifest.get('version')} != {SNAPSHOT_VERSION}, ignoring")
+        return None
+    if manifest.get("source_hash") != source_hash:
+        print("⚠️ Index snapshot is stale (knowledge base changed), ignoring")
+        return None
+
+    with open(snapshot_dir / "tokens.json", "r") as f:
+        tokens = json.load(f)
+
+    return {
+        "manifest": manifest,
+        "chunks": ChunkStore.load(snapshot_dir),
+        "tokens": tokens,
+        "bm25_tf": _load_csr(snapshot_dir, "bm25_tf", manifest["bm25"]["shape"]),
+        "tfidf_features": np.load(snapshot_dir / "tfidf_features.npy"),
+        "tfidf_idf": np.load(snapshot_dir / "tfidf_idf.npy", mmap_mode="r"),
+        "tfidf_matrix": _load_csr(snapshot_dir, "tfidf", manifest["tfidf"]["shape"]),
+        "category_indices": manifest["category_indices"]
+    }
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+Streaming knowledge base ingestion - parse, enrich and write chunk by chunk
+
+Raw chunks are read incrementally from a JSON array or a JSONL file, so the
+whole knowledge base is never held in memory. Enrichment (quality filter,
+cleanup, quality score, category) runs in batches, optionally fanned out
+over a process pool, and enriched chunks come back in input order as each
+batch finishes. At most `max_pending` batches are in flight at a time:
+memory is bounded by the batch size, not the input size.
+
+    python ingestion.py data/knowledge_base.json data/enriched.jsonl --workers 4
+"""
+
+import os
+import re
+import sys
+import json
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Optional, Union
+
+from keyword_engine import QUALITY_INDICATORS, IMPORTANT_TERMS, CHUNK_CATEGORIES, keyword_hits, count_hits
+
+READ_BLOCK_SIZE = 1 << 16
+
+# Chunks outside these bounds are dropped
+MIN_CHUNK_LENGTH = 80
+MAX_CHUNK_LENGTH = 1000
+
+# Normalize common terms for better matching
+NORMALIZATIONS = [
+    (re.compile(pattern, re.IGNORECASE), replacement)
+    for pattern, replacement in {
+        r'\\bG\\s*1\\b': 'G1',
+        r'\\bG\\s*2\\b': 'G2',
+        r'\\bM\\s*1\\b': 'M1',
+        r'\\bM\\s*2\\b': 'M2',
+        r'(\\d+)\\s*km\\s*/\\s*h': r'\\1 km/h',
+        r'\\$([0-9,]+)': r'$\\1',
+        r'0\\.08': '0.08',
+        r'blood\\s+alcohol': 'blood alcohol',
+        r'school\\s+bus': 'school bus',
+        r'speed\\s+limit': 'speed limit',
+        r'driver\\s*\'?s\\s+licen[cs]e': "driver's license"
+    }.items()
+]
+
+RawRecord = Union[str, Dict]
+
+
+# ---- Streaming input ----
+
+def iter_records(path: Union[str, Path], raw: bool = False,
+                 block_size: int = READ_BLOCK_SIZE) -> Iterator[RawRecord]:
+    """Records of a JSON array or JSONL file, read a block at a time.
+
+    The format is detected from the first non-blank character. With
+    raw=True records are yielded as their JSON text, which is cheaper to
+    hand to another process than the parsed dict.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        head = f.read(block_size)
+        if head.lstrip()[:1] == "[":
+            yield from _iter_array(f, head, raw, block_size)
+            return
+
+        f.seek(0)
+        for line in f:
+            line = line.strip()
+            if line:
+                yield line if raw else json.loads(line)
+
+
+def _iter_array(f, buffer: str, raw: bool, block_size: int) -> Iterator[RawRecord]:
+    decoder = json.JSONDecoder()
+    whitespace = re.compile(r"[\s,]*")
+    pos = buffer.index("[") + 1
+    eof = False
+
+    while True:
+        pos = whitespace.match(buffer, pos).end()
+        if pos == len(buffer) or not eof and len(buffer) - pos < block_size // 2:
+            # Keep at least half a block ahead so most records decode in one go
+            if eof:
+                raise ValueError(f"Unterminated JSON array in {f.name}")
+            more = f.read(block_size)
+            eof = not more
+            buffer = buffer[pos:] + more
+            pos = 0
+            continue
+        if buffer[pos] == "]":
+            return
+
+        try:
+            record, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            # A record cut off at the end of the buffer
+            more = f.read(block_size)
+            eof = not more
+            buffer = buffer[pos:] + more
+            pos = 0
+            continue
+
+        yield buffer[pos:end] if raw else record
+        pos = end
+
+
+# ---- Enrichment ----
+
+def is_high_quality(content: str, hits: Optional[FrozenSet[str]] = None) -> bool:
+    """Enhanced quality detection; `hits` are content's keyword_hits if known."""
+    if len(content) < MIN_CHUNK_LENGTH or len(content) > MAX_CHUNK_LENGTH:
+        return False
+
+    # Character quality
+    alpha_ratio = sum(map(str.isalpha, content)) / len(content)
+    if alpha_ratio < 0.7:
+        return False
+
+    # Content indicators
+    if hits is None:
+        hits = keyword_hits(content)
+    return count_hits(hits, QUALITY_INDICATORS) >= 2
+
+
+def clean_content(content: str) -> str:
+    """Enhanced content processing for better retrieval."""
+    content = content.replace("\\", "").strip()
+    for pattern, replacement in NORMALIZATIONS:
+        content = pattern.sub(replacement, content)
+    return content
+
+
+def quality_score(content: str, hits: Optional[FrozenSet[str]] = None) -> float:
+    """Calculate content quality score."""
+    score = 0.0
+
+    # Length factor
+    ideal_length = 300
+    length_score = 1.0 - abs(len(content) - ideal_length) / ideal_length
+    score += length_score * 0.3
+
+    # Information density
+    if hits is None:
+        hits = keyword_hits(content)
+    density = count_hits(hits, IMPORTANT_TERMS)
+    score += min(density / 5.0, 1.0) * 0.4
+
+    # Readability
+    sentences = content.count('.') + content.count('!') + content.count('?')
+    if sentences > 0:
+        avg_sentence_length = len(content.split()) / sentences
+        readability = 1.0 / (1.0 + abs(avg_sentence_length - 20) / 20)
+        score += readability * 0.3
+
+    return min(score, 1.0)
+
+
+def categorize(content: str, hits: Optional[FrozenSet[str]] = None) -> str:
+    """Categorize chunk content for better retrieval."""
+    if hits is None:
+        hits = keyword_hits(content)
+    for category, keywords in CHUNK_CATEGORIES.items():
+        if count_hits(hits, keywords) >= 2:
+            return category
+    return "general"
+
+
+def enrich_chunk(chunk: Dict) -> Optional[Dict]:
+    """Enriched form of a raw knowledge base chunk, None if it is filtered out."""
+    content = chunk.get("content", "")
+    hits = keyword_hits(content)
+    if not is_high_quality(content, hits):
+        return None
+
+    enhanced_content = clean_content(content)
+    if enhanced_content != content:
+        hits = keyword_hits(enhanced_content)
+    return {
+        "content": enhanced_content,
+        "original_content": content,
+        "metadata": chunk["metadata"],
+        "quality_score": quality_score(enhanced_content, hits),
+        "category": categorize(enhanced_content, hits)
+    }
+
+
+def enrich_batch(records: List[RawRecord]) -> List[Dict]:
+    """Enrich a batch of raw chunks (dicts or JSON text), dropping filtered ones."""
+    enriched = []
+    for record in records:
+        chunk = enrich_chunk(json.loads(record) if isinstance(record, str) else record)
+        if chunk is not None:
+            enriched.append(chunk)
+    return enriched
+
+
+def _enrich_batch_jsonl(records: List[RawRecord]) -> str:
+    """enrich_batch serialized as JSONL, so results cross processes as one string."""
+    return "".join(json.dumps(chunk, ensure_ascii=False) + "\n" for chunk in enrich_batch(records))
+
+
+# ---- Pipeline ----
+
+class EnrichmentPipeline:
+    """Batched, optionally parallel chunk enrichment with throughput stats."""
+
+    def __init__(self, workers: int = 1, batch_size: int = 256, max_pending: Optional[int] = None):
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.max_pending = max_pending or 2 * self.workers
+        self.read = 0
+        self.kept = 0
+        self.seconds = 0.0
+
+    @classmethod
+    def from_env(cls) -> "EnrichmentPipeline":
+        return cls(
+            workers=int(os.getenv("RAG_INGEST_WORKERS", "1")),
+            batch_size=int(os.getenv("RAG_INGEST_BATCH_SIZE", "256"))
+        )
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.read / self.seconds if self.seconds > 0 else 0.0
+
+    def stats(self) -> Dict:
+        return {
+            "read": self.read,
+            "kept": self.kept,
+            "seconds": round(self.seconds, 3),
+            "chunks_per_second": round(self.chunks_per_second, 1)
+        }
+
+    def _batches(self, records: Iterable[RawRecord]) -> Iterator[List[RawRecord]]:
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) == self.batch_size:
+                self.read += len(batch)
+                yield batch
+                batch = []
+        if batch:
+            self.read += len(batch)
+            yield batch
+
+    def _map(self, fn, records: Iterable[RawRecord]) -> Iterator:
+        """fn over batches of records, results in input order."""
+        start = time.perf_counter()
+        try:
+            if self.workers == 1:
+                for batch in self._batches(records):
+                    yield fn(batch)
+                return
+
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                pending = deque()
+                for batch in self._batches(records):
+                    pending.append(pool.submit(fn, batch))
+                    if len(pending) >= self.max_pending:
+                        yield pending.popleft().result()
+                while pending:
+                    yield pending.popleft().result()
+        finally:
+            self.seconds += time.perf_counter() - start
+
+    def run(self, records: Iterable[RawRecord]) -> Iterator[Dict]:
+        """Enriched chunks for a stream of raw ones, in input order."""
+        for enriched in self._map(enrich_batch, records):
+            self.kept += len(enriched)
+            yield from enriched
+
+    def to_file(self, input_path: Union[str, Path], output_path: Union[str, Path],
+                progress_every: float = 5.0) -> Dict:
+        """Stream input_path through enrichment into a JSONL file; returns stats()."""
+        output_path = Path(output_path)
+        tmp_path = output_path.with_name(output_path.name + ".tmp")
+        last_report = time.perf_counter()
+
+        with open(tmp_path, "w", encoding="utf-8") as out:
+            for text in self._map(_enrich_batch_jsonl, iter_records(input_path, raw=True)):
+                out.write(text)
+                self.kept += text.count("\n")
+                if time.perf_counter() - last_report >= progress_every:
+                    last_report = time.perf_counter()
+                    print(f"⏳ {self.read} chunks read, {self.kept} kept ({self.chunks_per_second:.0f} chunks/s)")
+        os.replace(tmp_path, output_path)
+        return self.stats()
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="Raw knowledge base (JSON array or JSONL)")
+    parser.add_argument("output", help="Enriched chunks (JSONL)")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("RAG_INGEST_WORKERS", "1")))
+    parser.add_argument("--batch-size", type=int, default=int(os.getenv("RAG_INGEST_BATCH_SIZE", "256")))
+    args = parser.parse_args()
+
+    pipeline = EnrichmentPipeline(workers=args.workers, batch_size=args.batch_size)
+    stats = pipeline.to_file(args.input, args.output)
+    print(f"✅ {stats['read']} chunks read, {stats['kept']} written to {args.output} "
+          f"in {stats['seconds']:.2f}s ({stats['chunks_per_second']:.0f} chunks/s)")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Binary IPC frames between the Node backend and the resident RAG worker
+
+Every frame is a 9-byte big-endian header followed by the payload:
+
+    uint32 payload length | uint8 kind | uint32 request id | payload
+
+Structured payloads (requests, results, errors, sources) are compact
+ASCII-escaped JSON; TOKEN frames carry raw UTF-8 text so the hot streaming path skips
+JSON entirely. Request ids let several requests share one connection, and a
+CANCEL frame (empty payload) withdraws a request by id.
+
+The TypeScript side lives in backend/src/services/ipcProtocol.ts; keep the
+two in sync.
+"""
+
+import json
+import struct
+from typing import Any, BinaryIO, List, Optional, Tuple
+
+HEADER = struct.Struct(">IBI")
+MAX_PAYLOAD = 64 * 1024 * 1024
+
+# Frame kinds
+READY = 0    # worker -> client, {"pid": ...}
+REQUEST = 1  # client -> worker, {"type", "question", "options"}
+RESULT = 2   # worker -> client, final result
+ERROR = 3    # worker -> client, {"error", "errorType"}
+SOURCES = 4  # worker -> client, streaming sources event
+TOKEN = 5    # worker -> client, streaming answer text (raw UTF-8)
+CANCEL = 6   # client -> worker, empty payload
+
+Frame = Tuple[int, int, bytes]
+
+
+def encode_frame(kind: int, request_id: int, payload: bytes = b"") -> bytes:
+    return HEADER.pack(len(payload), kind, request_id) + payload
+
+
+def encode_json(kind: int, request_id: int, value: Any) -> bytes:
+    # ASCII-escaped output is markedly faster to produce and stays valid UTF-8
+    payload = json.dumps(value, separators=(",", ":")).encode("ascii")
+    return encode_frame(kind, request_id, payload)
+
+
+def decode_json(payload: bytes) -> Any:
+    return json.loads(payload.decode("utf-8")) if payload else None
+
+
+def read_frame(stream: BinaryIO) -> Optional[Frame]:
+    """Read one frame from a blocking binary stream; None at EOF."""
+    header = stream.read(HEADER.size)
+    if len(header) < HEADER.size:
+        return None
+
+    length, kind, request_id = HEADER.unpack(header)
+    if length > MAX_PAYLOAD:
+        raise ValueError(f"Frame payload too large: {length} bytes")
+
+    payload = stream.read(length) if length else b""
+    if len(payload) < length:
+        return None
+    return kind, request_id, payload
+
+
+class FrameDecoder:
+    """Incremental decoder for frames arriving in arbitrary chunks.
+
+    Chunks are only joined once a complete frame has arrived, so a large
+    payload split across many reads is copied once rather than per read.
+    """
+
+    def __init__(self):
+        self._pending: List[bytes] = []
+        self._size = 0
+        self._needed = HEADER.size
+
+    def feed(self, data: bytes) -> List[Frame]:
+        self._pending.append(data)
+        self._size += len(data)
+        if self._size < self._needed:
+            return []
+
+        buffer = self._pending[0] if len(self._pending) == 1 else b"".join(self._pending)
+        frames = []
+        offset = 0
+        self._needed = HEADER.size
+
+        while len(buffer) - offset >= HEADER.size:
+            length, kind, request_id = HEADER.unpack_from(buffer, offset)
+            if length > MAX_PAYLOAD:
+                raise ValueError(f"Frame payload too large: {length} bytes")
+            end = offset + HEADER.size + length
+            if end > len(buffer):
+                self._needed = end - offset
+                break
+            frames.append((kind, request_id, buffer[offset + HEADER.size:end]))
+            offset = end
+
+        rest = buffer[offset:]
+        self._pending = [rest] if rest else []
+        self._size = len(rest)
+        return frames
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Domain keyword tables and a single-pass multi-keyword matcher
+
+Chunk filtering, quality scoring, categorization and query routing all
+test texts for keywords from the tables below. Rather than scanning the
+text once per keyword, KEYWORDS is one Aho-Corasick automaton over every
+table: keyword_hits() walks the lowercased text once and returns the set of
+keywords it contains, and each caller derives its counts from that set.
+
+Matches are plain substrings, exactly like `keyword in text`.
+"""
+
+from collections import deque
+from typing import Dict, FrozenSet, Iterable, List
+
+# ---- Chunk enrichment ----
+
+QUALITY_INDICATORS = [
+    "speed", "limit", "license", "test", "document", "highway",
+    "insurance", "collision", "emergency", "traffic", "driving",
+    "alcohol", "school", "bus", "turn", "merge", "headlight"
+]
+
+# Matched against lowercased text, so "G1" and "G2" never count
+IMPORTANT_TERMS = [
+    "speed limit", "highway", "G1", "G2", "test", "license",
+    "insurance", "collision", "emergency", "km/h", "alcohol",
+    "school bus", "traffic", "turn", "merge", "headlight", "fine"
+]
+
+CHUNK_CATEGORIES = {
+    "speed_limits": ["speed", "limit", "km/h", "highway", "maximum"],
+    "licensing": ["g1", "g2", "license", "test", "document", "identification"],
+    "safety": ["alcohol", "blood", "impaired", "seatbelt", "headlight"],
+    "traffic_rules": ["traffic", "light", "red", "turn", "merge", "intersection"],
+    "insurance": ["insurance", "coverage", "liability", "$200,000"],
+    "emergency": ["collision", "emergency", "accident", "injury", "first aid"],
+    "highway_driving": ["highway", "merge", "acceleration", "lane", "400-series"]
+}
+
+# ---- Query routing ----
+
+QUERY_CATEGORIES = {
+    "speed_limits": ["speed", "limit", "fast", "maximum", "km/h"],
+    "licensing": ["g1", "g2", "license", "test", "document"],
+    "safety": ["alcohol", "blood", "impaired", "headlight", "seatbelt"],
+    "traffic_rules": ["traffic", "light", "turn", "intersection", "red"],
+    "insurance": ["insurance", "coverage", "liability", "mandatory"],
+    "emergency": ["collision", "accident", "emergency", "injury"],
+    "highway_driving": ["highway", "merge", "lane", "400-series"]
+}
+
+# Enhanced domain expansions; the first key found in a question wins
+QUERY_EXPANSIONS = {
+    "speed limit": ["maximum speed", "posted speed", "100 km/h", "80 km/h", "highway speed"],
+    "g1": ["G1 license", "level one", "beginner permit", "knowledge test", "Class G1"],
+    "g2": ["G2 license", "level two", "road test", "probationary", "Class G2"],
+    "documents": ["identification", "ID", "papers required", "birth certificate", "passport"],
+    "blood alcohol": ["0.08", "impaired driving", "alcohol limit", "BAC", "blood alcohol concentration"],
+    "school bus": ["yellow bus", "red lights", "flashing lights", "stop arm", "children"],
+    "insurance": ["auto insurance", "coverage required", "liability", "$200,000", "third-party"],
+    "right turn": ["turn right", "red light", "intersection", "complete stop"],
+    "merge": ["highway entrance", "acceleration lane", "lane change"],
+    "collision": ["accident", "crash", "emergency", "injury", "first aid"],
+    "headlight": ["headlights", "low beam", "high beam", "visibility"]
+}
+
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton reporting which keywords occur in a text.
+
+    The automaton is compiled to a dense DFA over UTF-8 bytes (UTF-8 is
+    self-synchronizing, so byte matches are exactly character matches).
+    Transitions live in one flat list indexed by state * 256 + byte, and
+    states that complete a keyword are numbered last, so the inner loop is
+    a list lookup and a comparison per byte.
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords = list(dict.fromkeys(keyword for keyword in keywords if keyword))
+
+        # Trie of the keywords
+        goto: List[Dict[int, int]] = [{}]
+        outputs: List[FrozenSet[str]] = [frozenset()]
+        for keyword in self.keywords:
+            state = 0
+            for byte in keyword.encode("utf-8"):
+                if byte not in goto[state]:
+                    goto.append({})
+                    outputs.append(frozenset())
+                    goto[state][byte] = len(goto) - 1
+                state = goto[state][byte]
+            outputs[state] = outputs[state] | {keyword}
+
+        # Failure links, breadth first; each state inherits the outputs of its
+        # failure state and its missing transitions become failure transitions
+        num_states = len(goto)
+        delta = [[0] * 256 for _ in range(num_states)]
+        for byte, child in goto[0].items():
+            delta[0][byte] = child
+        queue = deque((child, 0) for child in goto[0].values())
+        while queue:
+            state, fail = queue.popleft()
+            outputs[state] = outputs[state] | outputs[fail]
+            row = delta[state]
+            row[:] = delta[fail]
+            for byte, child in goto[state].items():
+                row[byte] = child
+                queue.append((child, delta[fail][byte]))
+
+        # Renumber: non-accepting states first, then flatten
+        order = [s for s in range(num_states) if not outputs[s]] + [s for s in range(num_states) if outputs[s]]
+        offset = [0] * num_states
+        for new_id, state in enumerate(order):
+            offset[state] = new_id * 256
+        self._table = [offset[target] for state in order for target in delta[state]]
+        self._first_accepting = sum(1 for s in range(num_states) if not outputs[s]) * 256
+        self._outputs = {offset[s]: outputs[s] for s in range(num_states) if outputs[s]}
+        self.num_states = num_states
+
+    def find(self, text: str) -> FrozenSet[str]:
+        """The keywords occurring in `text` (case-sensitive)."""
+        table = self._table
+        first_accepting = self._first_accepting
+        state = 0
+        accepted = []
+        for byte in text.encode("utf-8", "surrogatepass"):
+            state = table[state + byte]
+            if state >= first_accepting:
+                accepted.append(state)
+
+        if not accepted:
+            return frozenset()
+        outputs = self._outputs
+        return frozenset().union(*(outputs[state] for state in set(accepted)))
+
+
+def _all_keywords() -> List[str]:
+    keywords = QUALITY_INDICATORS + IMPORTANT_TERMS + list(QUERY_EXPANSIONS)
+    for table in (CHUNK_CATEGORIES, QUERY_CATEGORIES):
+        for group in table.values():
+            keywords += group
+    return keywords
+
+
+KEYWORDS = KeywordAutomaton(_all_keywords())
+
+
+def keyword_hits(text: str) -> FrozenSet[str]:
+    """Every keyword of every table found in the lowercased text, in one pass."""
+    return KEYWORDS.find(text.lower())
+
+
+def count_hits(hits: FrozenSet[str], keywords: List[str]) -> int:
+    """How many of `keywords` (no duplicates) are in `hits`; same as counting `k in text`."""
+    return len(hits.intersection(keywords))
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+LLM backends - answer generation behind one small interface
+
+RAG_LLM_BACKEND selects the implementation:
+    xai   Grok via xai_sdk (default, needs XAI_API_KEY)
+    fake  Deterministic local stand-in for offline load testing and CI
+
+The fake backend's behaviour is tuned with RAG_FAKE_LLM_* variables
+(latency median/spread in ms, tokens per second, error rate, answer
+length and RNG seed), so throughput and tail-latency benchmarks of the
+full stack can run without the paid API.
+
+Both methods take an optional CancelToken; streaming stops at the next
+chunk once it is set, raising QueryCancelled.
+"""
+
+import os
+import time
+import random
+import hashlib
+import threading
+from typing import Iterator, Optional
+
+from cancellation import CancelToken, STAGE_LLM, check
+
+try:
+    from xai_sdk import Client
+    from xai_sdk.chat import user, system
+    XAI_AVAILABLE = True
+except Exception as e:
+    print(f"⚠️ xai_sdk not available: {e}")
+    XAI_AVAILABLE = False
+
+
+class LLMBackend:
+    """Generate an answer from a system prompt and a user prompt."""
+
+    name = "base"
+
+    def generate(self, system_prompt: str, prompt: str, cancel: Optional[CancelToken] = None) -> str:
+        raise NotImplementedError
+
+    def stream(self, system_prompt: str, prompt: str, cancel: Optional[CancelToken] = None) -> Iterator[str]:
+        """Yield answer text incrementally (default: one piece)."""
+        yield self.generate(system_prompt, prompt, cancel)
+
+
+class XAIBackend(LLMBackend):
+    name = "xai"
+
+    def __init__(self, api_key: str, model: str = "grok-4-0709", temperature: float = 0.05):
+        if not XAI_AVAILABLE:
+            raise RuntimeError("xai_sdk is not installed")
+        self.client = Client(api_key=api_key)
+        self.model = model
+        self.temperature = temperature
+
+    def _create_chat(self, system_prompt: str, prompt: str):
+        chat = self.client.chat.create(model=self.model, temperature=self.temperature)
+        chat.append(system(system_prompt))
+        chat.append(user(prompt))
+        return chat
+
+    def generate(self, system_prompt: str, prompt: str, cancel: Optional[CancelToken] = None) -> str:
+        if cancel is None:
+            response = self._create_chat(system_prompt, prompt).sample()
+            return response.content.strip()
+        # A blocking sample() can't be interrupted; streaming can stop between chunks
+        return "".join(self.stream(system_prompt, prompt, cancel)).strip()
+
+    def stream(self, system_prompt: str, prompt: str, cancel: Optional[CancelToken] = None) -> Iterator[str]:
+        responses = self._create_chat(system_prompt, prompt).stream()
+        try:
+            for _, chunk in responses:
+                # Closing the generator below tears down the underlying call
+                check(cancel, STAGE_LLM)
+                if chunk.content:
+                    yield chunk.content
+        finally:
+            close = getattr(responses, "close", None)
+            if close is not None:
+                close()
+
+
+class FakeLLMError(RuntimeError):
+    """Injected failure from FakeLLMBackend."""
+
+
+class FakeLLMBackend(LLMBackend):
+    """Deterministic offline backend with a configurable latency profile.
+
+    The answer text depends only on the prompt. Latency is log-normal around
+    `latency_ms` (spread `latency_sigma`) for the first token, then
+    `tokens_per_second`. Errors are injected at `error_rate`. Latency and
+    errors come from one seeded RNG, so a run replays identically.
+    """
+
+    name = "fake"
+
+    def __init__(self, latency_ms: float = 300.0, latency_sigma: float = 0.5, tokens_per_second: float = 50.0,
+                 error_rate: float = 0.0, answer_tokens: int = 80, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.answer_tokens = answer_tokens
+
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "FakeLLMBackend":
+        return cls(
+            latency_ms=float(os.getenv("RAG_FAKE_LLM_LATENCY_MS", "300")),
+            latency_sigma=float(os.getenv("RAG_FAKE_LLM_LATENCY_SIGMA", "0.5")),
+            tokens_per_second=float(os.getenv("RAG_FAKE_LLM_TOKENS_PER_SEC", "50")),
+            error_rate=float(os.getenv("RAG_FAKE_LLM_ERROR_RATE", "0")),
+            answer_tokens=int(os.getenv("RAG_FAKE_LLM_ANSWER_TOKENS", "80")),
+            seed=int(os.getenv("RAG_FAKE_LLM_SEED", "0"))
+        )
+
+    def _draw(self):
+        """First-token delay (s) and whether this call fails."""
+        with self._lock:
+            delay = self.latency_ms / 1000.0
+            if self.latency_sigma > 0:
+                delay *= self._rng.lognormvariate(0.0, self.latency_sigma)
+            fails = self._rng.random() < self.error_rate
+        return delay, fails
+
+    def _answer_tokens(self, prompt: str):
+        """Extractive answer: a fingerprint plus the start of the prompt's context."""
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8]
+        context = prompt.split("CONTEXT:", 1)[-1].split("QUESTION:", 1)[0]
+        words = context.split()[:self.answer_tokens]
+        return [f"[fake-{digest}]"] + words
+
+    def _sleep(self, seconds: float, cancel: Optional[CancelToken]):
+        # Wake up early on cancellation, like an aborted HTTP request would
+        if cancel is None:
+            time.sleep(seconds)
+        elif cancel.wait(seconds):
+            check(cancel, STAGE_LLM)
+
+    def stream(self, system_prompt: str, prompt: str, cancel: Optional[CancelToken] = None) -> Iterator[str]:
+        delay, fails = self._draw()
+        self._sleep(delay, cancel)
+        if fails:
+            raise FakeLLMError("Injected fake LLM failure")
+
+        token_delay = 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+        for i, token in enumerate(self._answer_tokens(prompt)):
+            if i and token_delay:
+                self._sleep(token_delay, cancel)
+            yield token if i == 0 else " " + token
+
+    def generate(self, system_prompt: str, prompt: str, cancel: Optional[CancelToken] = None) -> str:
+        return "".join(self.stream(system_prompt, prompt, cancel)).strip()
+
+
+def create_llm_backend(name: Optional[str] = None) -> Optional[LLMBackend]:
+    """Backend selected by name or RAG_LLM_BACKEND; None when unavailable."""
+    name = (name or os.getenv("RAG_LLM_BACKEND", "xai")).lower()
+
+    if name == "fake":
+        return FakeLLMBackend.from_env()
+
+    if name == "xai":
+        api_key = os.getenv("XAI_API_KEY")
+        if not api_key or not XAI_AVAILABLE:
+            return None
+        return XAIBackend(
+            api_key=api_key,
+            model=os.getenv("RAG_LLM_MODEL", "grok-4-0709")
+        )
+
+    raise ValueError(f"Unknown LLM backend: {name}")
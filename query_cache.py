@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Query caches - exact-match LRU/TTL cache and a semantic answer cache
+
+QueryCache entries are deep-copied on the way in and out, so callers can
+freely mutate what they get back without corrupting the cached value. Size
+is bounded both by entry count and by an approximate byte budget.
+
+SemanticAnswerCache matches paraphrased questions by vector similarity.
+"""
+
+import copy
+import json
+import time
+import random
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Any, Dict, Hashable, Iterable, List, Optional
+
+import numpy as np
+
+
+def _json_default(value: Any) -> Any:
+    # Chunk and result views read their text from the store; size them by it, not by their repr
+    if isinstance(value, Mapping):
+        return dict(value)
+    return str(value)
+
+
+def _estimate_size(value: Any) -> int:
+    """Approximate in-memory footprint of a JSON-like value."""
+    try:
+        return len(json.dumps(value, default=_json_default))
+    except (TypeError, ValueError):
+        return 1024
+
+
+class QueryCache:
+    def __init__(self, max_entries: int = 256, max_bytes: int = 32 * 1024 * 1024, ttl_seconds: float = 3600.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+
+        # key -> (value, size, expires_at), least recently used first
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry[2] > time.monotonic()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return a private copy of the cached value, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, size, expires_at = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+        return copy.deepcopy(value)
+
+    def put(self, key: Hashable, value: Any):
+        """Store a private copy of value, evicting LRU entries to fit."""
+        value = copy.deepcopy(value)
+        size = _estimate_size(value)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (value, size, time.monotonic() + self.ttl_seconds)
+            self._bytes += size
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key: Hashable):
+        # Caller holds the lock
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+
+class SemanticAnswerCache:
+    """Reuse answers for paraphrased questions.
+
+    Question vectors are L2-normalized and kept in a fixed-size matrix; a
+    lookup is one matrix-vector product. A neighbour only counts as a hit
+    when its cosine similarity clears `threshold` *and* the chunks it was
+    answered from overlap the current retrieval by at least `min_overlap`
+    (Jaccard), which guards against similar wording about different rules.
+    """
+
+    def __init__(self, dim: int, capacity: int = 512, threshold: float = 0.6, min_overlap: float = 0.6,
+                 ttl_seconds: float = 3600.0, audit_rate: float = 0.0):
+        self.dim = dim
+        self.capacity = capacity
+        self.threshold = threshold
+        self.min_overlap = min_overlap
+        self.ttl_seconds = ttl_seconds
+        self.audit_rate = audit_rate
+
+        self._vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self._entries: List[Optional[Dict[str, Any]]] = [None] * capacity
+        self._next_slot = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.overlap_rejections = 0
+        self.audits = 0
+        self.false_hits = 0
+
+    def _normalize(self, vector) -> Optional[np.ndarray]:
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return None
+        return vector / norm
+
+    def lookup(self, vector, chunk_ids: Iterable[int]) -> Optional[Dict[str, Any]]:
+        """Nearest cached answer for this question vector and retrieved chunk set."""
+        vector = self._normalize(vector)
+        chunk_ids = set(chunk_ids)
+
+        with self._lock:
+            if vector is None:
+                self.misses += 1
+                return None
+
+            similarities = self._vectors @ vector
+            now = time.monotonic()
+            # Best candidates first; stop at the first that passes both checks
+            for slot in np.argsort(-similarities):
+                similarity = float(similarities[slot])
+                if similarity < self.threshold:
+                    break
+                entry = self._entries[slot]
+                if entry is None or entry["expires_at"] <= now:
+                    continue
+
+                union = chunk_ids | entry["chunk_ids"]
+                overlap = len(chunk_ids & entry["chunk_ids"]) / len(union) if union else 0.0
+                if overlap < self.min_overlap:
+                    self.overlap_rejections += 1
+                    continue
+
+                self.hits += 1
+                return {
+                    "answer": entry["answer"],
+                    "question": entry["question"],
+                    "similarity": similarity,
+                    "overlap": overlap
+                }
+
+            self.misses += 1
+            return None
+
+    def add(self, vector, question: str, answer: str, chunk_ids: Iterable[int]):
+        """Remember an answer, overwriting the oldest slot when full."""
+        vector = self._normalize(vector)
+        if vector is None:
+            return
+
+        with self._lock:
+            slot = self._next_slot
+            self._next_slot = (slot + 1) % self.capacity
+            self._vectors[slot] = vector
+            self._entries[slot] = {
+                "question": question,
+                "answer": answer,
+                "chunk_ids": set(chunk_ids),
+                "expires_at": time.monotonic() + self.ttl_seconds
+            }
+
+    def should_audit(self) -> bool:
+        """Whether this hit should be regenerated to measure false hits."""
+        return self.audit_rate > 0 and random.random() < self.audit_rate
+
+    def record_audit(self, cached_answer: str, fresh_answer: str, min_agreement: float = 0.5) -> bool:
+        """Compare a cached answer with a freshly generated one; True means false hit."""
+        cached_terms = set(cached_answer.lower().split())
+        fresh_terms = set(fresh_answer.lower().split())
+        union = cached_terms | fresh_terms
+        agreement = len(cached_terms & fresh_terms) / len(union) if union else 1.0
+        is_false_hit = agreement < min_agreement
+
+        with self._lock:
+            self.audits += 1
+            if is_false_hit:
+                self.false_hits += 1
+        return is_false_hit
+
+    def clear(self):
+        with self._lock:
+            self._vectors[:] = 0
+            self._entries = [None] * self.capacity
+            self._next_slot = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": sum(1 for entry in self._entries if entry is not None),
+                "capacity": self.capacity,
+                "threshold": self.threshold,
+                "min_overlap": self.min_overlap,
+                "hits": self.hits,
+                "misses": self.misses,
+                "overlap_rejections": self.overlap_rejections,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "audits": self.audits,
+                "false_hits": self.false_hits,
+                "false_hit_rate": self.false_hits / self.audits if self.audits else 0.0
+            }
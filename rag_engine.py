@@ -7,8 +7,14 @@ Improvements based on RAGAS evaluation results
 import os
 import json
 import time
+import asyncio
+import weakref
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Dict, Any, Tuple
+from collections import Counter
+from typing import List, Dict, Any, Tuple, Optional, Iterator, Union
 import numpy as np
 from dotenv import load_dotenv
 
@@ -22,13 +28,39 @@ except Exception as e:
     print(f"⚠️ ChromaDB not available: {e}")
     CHROMADB_AVAILABLE = False
 
-from rank_bm25 import BM25Okapi
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 
 # LLM
-from xai_sdk import Client
-from xai_sdk.chat import user, system
+from llm_backends import LLMBackend, create_llm_backend
+
+from bm25_index import ImpactBM25
+from incremental_index import AppendableCSR
+from tokenizer import TokenVocabulary, TokenTfidf
+from keyword_engine import QUERY_CATEGORIES, QUERY_EXPANSIONS, keyword_hits, count_hits
+from ingestion import EnrichmentPipeline, enrich_chunk, iter_records
+from embedding_backends import create_embedding_backend, is_semantic_backend
+from dense_index import DenseIndex, LocalDenseIndex, run_in_child
+from chunk_store import ChunkStore, ResultView
+from index_snapshot import knowledge_base_hash, save_snapshot, load_snapshot
+from query_cache import QueryCache, SemanticAnswerCache
+from cancellation import CancelToken, QueryCancelled, STAGE_QUEUED, STAGE_RETRIEVAL, STAGE_GENERATION, STAGE_LLM, check
+
+# Expansion and category detection both look at each question
+query_keyword_hits = lru_cache(maxsize=1024)(keyword_hits)
+
+# Stop words TF-IDF drops from the shared token vocabulary's words
+STOP_WORDS = 'english'
+
+TFIDF_PARAMS = {
+    "max_features": 5000,  # Increased
+    "ngram_range": (1, 3),  # Include trigrams
+    "min_df": 1,  # More inclusive
+    "max_df": 0.9,
+    "sublinear_tf": True  # Log scaling
+}
+
+# Fusion weight of each retrieval leg, and the rank offset for RAG_FUSION=rrf
+FUSION_WEIGHTS = {"bm25": 0.4, "tfidf": 0.35, "dense": 0.4}
+RRF_K = 60
 
 class OptimizedEnhancedRAG:
     def __init__(self, data_dir: str = "data"):
@@ -36,18 +68,76 @@ class OptimizedEnhancedRAG:
         self.data_dir = Path(data_dir)
         
         # Clients
-        self.grok_client = None
+        self.llm: Optional[LLMBackend] = None
         self.chroma_client = None
         self.collection = None
         
+        # Dense retrieval leg in Chroma or the built-in ANN index (see _init_dense_retrieval).
+        # Only the writer syncs and updates the vector store; other workers just query it.
+        self.prefork = False
+        self.dense_writer = os.getenv("RAG_DENSE_WRITER", "1") != "0"
+        self.dense: Optional[Union[DenseIndex, LocalDenseIndex]] = None
+        self._dense_positions: Optional[Dict[str, int]] = None
+        
         # Optimized retrieval systems
+        self.vocabulary: Optional[TokenVocabulary] = None
         self.bm25 = None
         self.tfidf = None
-        self.chunks = []
+        self.chunks = ChunkStore()
+        self.index_version = None
+        self.snapshot_dir = self.data_dir / "index_snapshot"
         
         # Performance optimizations
         self.chunk_cache = {}
-        self.query_cache = {}
+        self.query_cache = QueryCache(
+            max_entries=int(os.getenv("RAG_QUERY_CACHE_SIZE", "256")),
+            max_bytes=int(os.getenv("RAG_QUERY_CACHE_BYTES", str(32 * 1024 * 1024))),
+            ttl_seconds=float(os.getenv("RAG_QUERY_CACHE_TTL", "3600"))
+        )
+        # Ranked chunk ids per normalized question, independent of generation
+        self.retrieval_cache = QueryCache(
+            max_entries=int(os.getenv("RAG_RETRIEVAL_CACHE_SIZE", "1024")),
+            ttl_seconds=float(os.getenv("RAG_QUERY_CACHE_TTL", "3600"))
+        )
+        # Paraphrase-tolerant answer cache, created once TF-IDF is built
+        self.semantic_cache = None
+        
+        # Weight of expansion terms in expanded queries (see _preprocess_query)
+        self.expansion_weight = float(os.getenv("RAG_EXPANSION_WEIGHT", "1.0"))
+        
+        # Score cells (query rows x chunks) per method held at once by optimized_query_batch
+        self.batch_block_cells = int(os.getenv("RAG_BATCH_BLOCK_CELLS", str(1 << 22)))
+        
+        # Result fusion (see _advanced_fusion_rerank)
+        self.fusion = os.getenv("RAG_FUSION", "weighted")
+        self._duplicates: Optional[Tuple[Any, np.ndarray]] = None
+        self._category_positions: Optional[Tuple[Any, Dict[str, np.ndarray]]] = None
+        
+        # Async serving (see aquery)
+        self.max_concurrent_queries = int(os.getenv("RAG_MAX_CONCURRENT_QUERIES", "8"))
+        self.query_deadline = float(os.getenv("RAG_QUERY_DEADLINE", "60"))
+        # One semaphore per event loop: asyncio primitives bind to the loop that first waits on them
+        self._async_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = \
+            weakref.WeakKeyDictionary()
+        self._async_semaphores_lock = threading.Lock()
+        self._executor = None
+        
+        # Queries abandoned by their caller, by the stage they had reached
+        self.cancellations: Dict[str, int] = {}
+        self._cancellation_lock = threading.Lock()
+        
+        # In-place index updates (see add_chunks); per-chunk state is only
+        # built on the first change. Retrieval holds the lock while scoring.
+        self._index_lock = threading.RLock()
+        self.index_revision = 0
+        self.compact_ratio = float(os.getenv("RAG_INDEX_COMPACT_RATIO", "0.1"))
+        self.chunk_size = int(os.getenv("RAG_CHUNK_SIZE", "650"))
+        self._chunk_seq: Optional[List[int]] = None
+        self._chunk_positions: Dict[str, int] = {}
+        self._doc_tokens: List[Optional[np.ndarray]] = []
+        self._tfidf_rows: Optional[AppendableCSR] = None
+        self._removed: set = set()
+        self._appended = 0
         
         print("🎯 Optimized Enhanced RAG initialized for 90%+ performance")
     
@@ -55,258 +145,631 @@ class OptimizedEnhancedRAG:
         """Initialize clients with optimizations."""
         print("🔗 Initializing optimized clients...")
         
-        # XAI Grok client with optimized settings
-        if os.getenv("XAI_API_KEY"):
-            self.grok_client = Client(api_key=os.getenv("XAI_API_KEY"))
-            print("✅ XAI Grok client ready (optimized)")
+        # LLM backend (RAG_LLM_BACKEND: xai by default, fake for offline runs)
+        self.llm = create_llm_backend()
+        if self.llm is not None:
+            print(f"✅ LLM backend ready: {self.llm.name}")
         else:
-            print("⚠️ XAI_API_KEY not found")
+            print("⚠️ No LLM backend available (XAI_API_KEY not found)")
         
-        # Chroma with optimizations (if available)
-        if CHROMADB_AVAILABLE:
+        # Chroma with optimizations (if available and the dense leg is on)
+        if not self._dense_enabled:
+            self.chroma_client = None
+        elif self._local_vectors:
+            print("📦 Dense vectors in the built-in ANN index")
+            self.chroma_client = None
+        elif CHROMADB_AVAILABLE and self.prefork:
+            print("⏭️ Chroma left to the forked workers")
+            self.chroma_client = None
+        elif CHROMADB_AVAILABLE:
             try:
-                self.chroma_client = chromadb.PersistentClient(
-                    path=str(self.data_dir / "vector_db")
-                )
+                self.chroma_client = self._open_chroma()
                 print("✅ Chroma client ready")
             except Exception as e:
                 print(f"⚠️ Chroma failed: {e}")
                 self.chroma_client = None
-        else:
-            print("⚠️ ChromaDB not available - using text-only retrieval")
-            self.chroma_client = None
+        
+        # Already synced (a forked worker): just reopen the collection
+        if isinstance(self.dense, DenseIndex) and not self.prefork:
+            if self.chroma_client is None:
+                self.dense = None
+                self.collection = None
+            else:
+                self.dense.attach(self.chroma_client)
+                self.collection = self.dense.collection
     
-    def setup(self):
-        """Optimized setup."""
+    def setup(self, prefork: bool = False):
+        """Optimized setup.
+        
+        prefork=True when this process will fork serving workers that share
+        the index: it then never opens Chroma itself (see dense_index.py).
+        """
         print("=== OPTIMIZED ENHANCED RAG SETUP ===")
         
+        self.prefork = prefork
         self._initialize_clients()
         
+        # Prefer a prebuilt snapshot matching the current knowledge base
+        self.index_version = knowledge_base_hash(self.data_dir / "knowledge_base.json")
+        if self._load_index_snapshot():
+            self._init_semantic_cache()
+            self._init_dense_retrieval()
+            print(f"✅ Optimized setup complete from snapshot! {len(self.chunks)} enhanced chunks")
+            return
+        
         # Load and enhance chunks
         chunks = self._load_and_enhance_chunks()
         
         # Build optimized retrieval
         self._build_optimized_retrieval(chunks)
+        self._init_semantic_cache()
+        self._init_dense_retrieval()
         
         print(f"✅ Optimized setup complete! {len(chunks)} enhanced chunks")
     
-    def _load_and_enhance_chunks(self) -> List[Dict]:
-        """Load chunks with enhanced processing."""
-        chunks_file = self.data_dir / "knowledge_base.json"
-        with open(chunks_file, 'r') as f:
-            raw_chunks = json.load(f)
+    def _init_semantic_cache(self):
+        """Create the semantic answer cache over the TF-IDF question space."""
+        if os.getenv("RAG_SEMANTIC_CACHE", "1") == "0":
+            self.semantic_cache = None
+            return
+        
+        self.semantic_cache = SemanticAnswerCache(
+            dim=self.tfidf.num_features,
+            capacity=int(os.getenv("RAG_SEMANTIC_CACHE_SIZE", "512")),
+            threshold=float(os.getenv("RAG_SEMANTIC_CACHE_THRESHOLD", "0.6")),
+            min_overlap=float(os.getenv("RAG_SEMANTIC_CACHE_MIN_OVERLAP", "0.6")),
+            ttl_seconds=float(os.getenv("RAG_QUERY_CACHE_TTL", "3600")),
+            audit_rate=float(os.getenv("RAG_SEMANTIC_CACHE_AUDIT_RATE", "0"))
+        )
+    
+    def _init_dense_retrieval(self):
+        """Sync chunk embeddings into the persistent vector store.
+        
+        Only new or edited chunks are embedded, so restarts are cheap. The
+        store is the Chroma collection, or the built-in ANN index when
+        Chroma isn't importable or RAG_VECTOR_STORE=local. The leg is on
+        with a model-backed RAG_EMBEDDING_BACKEND, or with an explicit
+        RAG_DENSE_RETRIEVAL=1 (the offline hashing backend is opt-in), so a
+        default install keeps the lexical rankings. It stays off if Chroma
+        fails or with RAG_DENSE_RETRIEVAL=0.
+        
+        Only the writer (RAG_DENSE_WRITER, default 1) syncs; a pool of
+        independent workers has one writer and the rest attach read-only.
+        Chroma's PersistentClient is not safe for concurrent writers, and
+        with RAG_CHROMA_HOST every worker goes through one Chroma server.
+        """
+        self.dense = None
+        self.collection = None
+        self._dense_positions = None
+        if not self._dense_enabled:
+            return
+        if not self._local_vectors and (not CHROMADB_AVAILABLE or (self.chroma_client is None and not self.prefork)):
+            return
         
-        print(f"📚 Processing {len(raw_chunks)} raw chunks...")
+        try:
+            backend = create_embedding_backend()
+            batch_size = int(os.getenv("RAG_EMBEDDING_BATCH_SIZE", "64"))
+            records = self._dense_records(range(len(self.chunks)))
+            start = time.time()
+            if self._local_vectors:
+                # Memory-mapped files: forked workers share them as they are
+                dense = LocalDenseIndex(
+                    backend,
+                    self.data_dir / "vector_db",
+                    batch_size=batch_size,
+                    nprobe=int(os.getenv("RAG_ANN_NPROBE", "16")),
+                    storage=os.getenv("RAG_ANN_STORAGE", "float16")
+                )
+                embedded, deleted = dense.sync(*records) if self.dense_writer else (0, 0)
+            elif not self.dense_writer:
+                # Readers attach in _initialize_clients (after the fork, if any)
+                dense = DenseIndex(backend, batch_size=batch_size)
+                if not self.prefork:
+                    dense.attach(self.chroma_client)
+                embedded, deleted = 0, 0
+            elif self.prefork:
+                # Workers attach in _initialize_clients after the fork
+                dense = DenseIndex(backend, batch_size=batch_size)
+                embedded, deleted = run_in_child(lambda: self._sync_dense(dense, records, self._open_chroma()))
+            else:
+                dense = DenseIndex(backend, batch_size=batch_size)
+                embedded, deleted = self._sync_dense(dense, records, self.chroma_client)
+        except Exception as e:
+            print(f"⚠️ Dense retrieval disabled: {e}")
+            return
+        
+        self.dense = dense
+        self.collection = getattr(dense, "collection", None)
+        role = "writer" if self.dense_writer else "reader"
+        print(f"🧭 Dense retrieval ready: {dense.name}, {role} ({embedded} embedded, {deleted} deleted "
+              f"in {time.time() - start:.1f}s)")
+    
+    @staticmethod
+    def _sync_dense(dense: DenseIndex, records: Tuple, client) -> Tuple[int, int]:
+        dense.attach(client)
+        return dense.sync(*records)
+    
+    @property
+    def _dense_enabled(self) -> bool:
+        setting = os.getenv("RAG_DENSE_RETRIEVAL")
+        if setting is not None:
+            return setting != "0"
+        # Hashed character n-grams aren't semantic; they don't earn a fusion weight by default
+        return is_semantic_backend()
+    
+    @property
+    def _local_vectors(self) -> bool:
+        store = os.getenv("RAG_VECTOR_STORE")
+        if store is not None:
+            return store == "local"
+        return not CHROMADB_AVAILABLE
+    
+    def _open_chroma(self):
+        host = os.getenv("RAG_CHROMA_HOST")
+        if host:
+            return chromadb.HttpClient(host=host, port=int(os.getenv("RAG_CHROMA_PORT", "8000")))
+        return chromadb.PersistentClient(path=str(self.data_dir / "vector_db"))
+    
+    def _dense_records(self, positions) -> Tuple[List[str], List[str], List[Dict]]:
+        """Chroma ids, texts and metadata for chunks at the given positions."""
+        positions = list(positions)
+        return (
+            [self.chunks.chunk_id(i) for i in positions],
+            self.chunks.texts(positions),
+            [{"category": self.chunks.category(i)} for i in positions]
+        )
+    
+    def _dense_scores(self, queries: List[str], top_k: int) -> Optional[np.ndarray]:
+        """Cosine similarity of each query to its nearest chunks (0 elsewhere).
         
-        enhanced_chunks = []
-        for chunk in raw_chunks:
-            content = chunk.get("content", "")
-            
-            # Enhanced quality filter
-            if self._is_high_quality_chunk(content):
-                # Enhanced content processing
-                enhanced_content = self._enhance_chunk_content(content)
-                
-                enhanced_chunk = {
-                    "content": enhanced_content,
-                    "original_content": content,
-                    "metadata": chunk["metadata"],
-                    "quality_score": self._calculate_quality_score(enhanced_content),
-                    "category": self._categorize_chunk(enhanced_content)
-                }
-                enhanced_chunks.append(enhanced_chunk)
+        One row per query over chunk positions, like the BM25 and TF-IDF
+        scores, or None when the dense leg is off or fails.
+        """
+        if not self._dense_ready:
+            return None
         
-        # Sort by quality score (best first)
-        enhanced_chunks.sort(key=lambda x: x["quality_score"], reverse=True)
+        try:
+            matches = self.dense.search(queries, top_k * 2)
+        except Exception as e:
+            print(f"⚠️ Dense search failed, using lexical retrieval only: {e}")
+            return None
+        
+        if self._dense_positions is None:
+            self._dense_positions = {
+                self.chunks.chunk_id(i): i for i in range(len(self.chunks)) if i not in self._removed
+            }
+        scores = np.zeros((len(queries), len(self.chunks)))
+        for row, pairs in enumerate(matches):
+            for chunk_id, similarity in pairs:
+                position = self._dense_positions.get(chunk_id)
+                if position is not None:
+                    scores[row, position] = similarity
+        return scores
+    
+    @property
+    def _dense_ready(self) -> bool:
+        return self.dense is not None and self.dense.ready
+    
+    @property
+    def retrieval_methods(self) -> List[str]:
+        methods = ["optimized_bm25", "optimized_tfidf"]
+        if self._dense_ready:
+            methods.append("dense")
+        return methods + ["advanced_fusion"]
+    
+    def build_index_snapshot(self) -> Path:
+        """Rebuild the index from the knowledge base and write a snapshot."""
+        print("=== BUILDING INDEX SNAPSHOT ===")
         
-        self.chunks = enhanced_chunks
-        print(f"🧹 Enhanced to {len(enhanced_chunks)} high-quality chunks")
+        self.index_version = knowledge_base_hash(self.data_dir / "knowledge_base.json")
+        chunks = self._load_and_enhance_chunks()
+        self._build_optimized_retrieval(chunks)
         
-        return enhanced_chunks
+        path = save_snapshot(
+            self.snapshot_dir,
+            self.index_version,
+            self.chunks,
+            self.vocabulary,
+            self.bm25,
+            self.tfidf,
+            self.tfidf_matrix,
+            self.category_indices
+        )
+        print(f"💾 Index snapshot written to {path}")
+        return path
     
-    def _is_high_quality_chunk(self, content: str) -> bool:
-        """Enhanced quality detection."""
-        if len(content) < 80 or len(content) > 1000:
+    def _load_index_snapshot(self) -> bool:
+        """Restore chunks, BM25 and TF-IDF from a snapshot if it is current."""
+        snapshot = load_snapshot(self.snapshot_dir, self.index_version)
+        if snapshot is None:
             return False
         
-        # Character quality
-        alpha_ratio = sum(1 for c in content if c.isalpha()) / len(content)
-        if alpha_ratio < 0.7:
-            return False
-        
-        # Content indicators
-        quality_indicators = [
-            "speed", "limit", "license", "test", "document", "highway", 
-            "insurance", "collision", "emergency", "traffic", "driving",
-            "alcohol", "school", "bus", "turn", "merge", "headlight"
-        ]
-        
-        content_lower = content.lower()
-        indicator_count = sum(1 for indicator in quality_indicators if indicator in content_lower)
-        
-        return indicator_count >= 2
-    
-    def _enhance_chunk_content(self, content: str) -> str:
-        """Enhanced content processing for better retrieval."""
-        # Advanced cleaning
-        content = content.replace("\\", "").strip()
-        
-        # Normalize common terms for better matching
-        normalizations = {
-            r'\\bG\\s*1\\b': 'G1',
-            r'\\bG\\s*2\\b': 'G2', 
-            r'\\bM\\s*1\\b': 'M1',
-            r'\\bM\\s*2\\b': 'M2',
-            r'(\\d+)\\s*km\\s*/\\s*h': r'\\1 km/h',
-            r'\\$([0-9,]+)': r'$\\1',
-            r'0\\.08': '0.08',
-            r'blood\\s+alcohol': 'blood alcohol',
-            r'school\\s+bus': 'school bus',
-            r'speed\\s+limit': 'speed limit',
-            r'driver\\s*\'?s\\s+licen[cs]e': "driver's license"
-        }
+        self.chunks = snapshot["chunks"]
+        self.vocabulary = TokenVocabulary.from_terms(snapshot["tokens"], stop_words=STOP_WORDS)
+        
+        # BM25: impact postings recomputed from stored term frequencies
+        stats = snapshot["manifest"]["bm25"]
+        self.bm25 = ImpactBM25.from_term_frequencies(
+            snapshot["bm25_tf"],
+            self.vocabulary.ids,
+            k1=stats["k1"],
+            b=stats["b"],
+            epsilon=stats["epsilon"]
+        )
         
-        import re
-        for pattern, replacement in normalizations.items():
-            content = re.sub(pattern, replacement, content, flags=re.IGNORECASE)
+        # TF-IDF: fixed n-gram features plus stored idf weights
+        self.tfidf = TokenTfidf.from_features(
+            self.vocabulary,
+            snapshot["tfidf_features"],
+            snapshot["tfidf_idf"],
+            **TFIDF_PARAMS
+        )
+        self.tfidf_matrix = snapshot["tfidf_matrix"]
         
-        return content
+        self.category_indices = snapshot["category_indices"]
+        self._category_positions = None
+        print(f"📦 Loaded index snapshot ({len(self.chunks)} chunks)")
+        return True
     
-    def _calculate_quality_score(self, content: str) -> float:
-        """Calculate content quality score."""
-        score = 0.0
+    def _load_and_enhance_chunks(self) -> ChunkStore:
+        """Load chunks with enhanced processing."""
+        chunks_file = self.data_dir / "knowledge_base.json"
+        pipeline = EnrichmentPipeline.from_env()
+        enhanced_chunks = ChunkStore.from_chunks(pipeline.run(iter_records(chunks_file)))
         
-        # Length factor
-        ideal_length = 300
-        length_score = 1.0 - abs(len(content) - ideal_length) / ideal_length
-        score += length_score * 0.3
+        print(f"📚 Processed {pipeline.read} raw chunks ({pipeline.chunks_per_second:.0f} chunks/s, "
+              f"{pipeline.workers} worker{'s' if pipeline.workers > 1 else ''})")
         
-        # Information density
-        important_terms = [
-            "speed limit", "highway", "G1", "G2", "test", "license", 
-            "insurance", "collision", "emergency", "km/h", "alcohol",
-            "school bus", "traffic", "turn", "merge", "headlight", "fine"
-        ]
+        # Sort by quality score (best first, ties in knowledge base order)
+        enhanced_chunks = enhanced_chunks.take(np.argsort(-enhanced_chunks.quality, kind="stable"))
         
-        content_lower = content.lower()
-        density = sum(1 for term in important_terms if term in content_lower)
-        score += min(density / 5.0, 1.0) * 0.4
-        
-        # Readability
-        sentences = content.count('.') + content.count('!') + content.count('?')
-        if sentences > 0:
-            avg_sentence_length = len(content.split()) / sentences
-            readability = 1.0 / (1.0 + abs(avg_sentence_length - 20) / 20)
-            score += readability * 0.3
-        
-        return min(score, 1.0)
-    
-    def _categorize_chunk(self, content: str) -> str:
-        """Categorize chunk content for better retrieval."""
-        content_lower = content.lower()
-        
-        categories = {
-            "speed_limits": ["speed", "limit", "km/h", "highway", "maximum"],
-            "licensing": ["g1", "g2", "license", "test", "document", "identification"],
-            "safety": ["alcohol", "blood", "impaired", "seatbelt", "headlight"],
-            "traffic_rules": ["traffic", "light", "red", "turn", "merge", "intersection"],
-            "insurance": ["insurance", "coverage", "liability", "$200,000"],
-            "emergency": ["collision", "emergency", "accident", "injury", "first aid"],
-            "highway_driving": ["highway", "merge", "acceleration", "lane", "400-series"]
-        }
-        
-        for category, keywords in categories.items():
-            if sum(1 for keyword in keywords if keyword in content_lower) >= 2:
-                return category
+        self.chunks = enhanced_chunks
+        print(f"🧹 Enhanced to {len(enhanced_chunks)} high-quality chunks")
         
-        return "general"
+        return enhanced_chunks
     
-    def _build_optimized_retrieval(self, chunks: List[Dict]):
+    def _enhance_chunk(self, chunk: Dict) -> Optional[Dict]:
+        """Enriched form of a raw knowledge base chunk, None if it is filtered out."""
+        return enrich_chunk(chunk)
+    
+    def _build_optimized_retrieval(self, chunks: ChunkStore):
         """Build optimized retrieval systems."""
         print("🔧 Building optimized retrieval systems...")
         
-        texts = [chunk["content"] for chunk in chunks]
-        
-        # 1. Optimized BM25
-        print("📝 Building optimized BM25...")
-        tokenized_docs = []
-        for text in texts:
-            # Enhanced tokenization
-            tokens = text.lower().split()
-            # Remove very short tokens
-            tokens = [t for t in tokens if len(t) > 2]
-            tokenized_docs.append(tokens)
-        
-        self.bm25 = BM25Okapi(tokenized_docs)
-        
-        # 2. Optimized TF-IDF
-        print("📊 Building optimized TF-IDF...")
-        self.tfidf = TfidfVectorizer(
-            max_features=5000,  # Increased
-            stop_words='english',
-            ngram_range=(1, 3),  # Include trigrams
-            min_df=1,  # More inclusive
-            max_df=0.9,
-            sublinear_tf=True  # Log scaling
-        )
-        self.tfidf_matrix = self.tfidf.fit_transform(texts)
+        # 1. Tokenize once: every chunk as token ids in one shared vocabulary
+        print("🔤 Tokenizing chunks...")
+        self.vocabulary = TokenVocabulary(STOP_WORDS)
+        docs = [self.vocabulary.encode(text) for text in chunks.texts()]
+        
+        # 2. Optimized BM25 and TF-IDF over the same token ids
+        print("📝 Building optimized BM25 and TF-IDF...")
+        self._fit_lexical_indexes(docs)
         
         # 3. Category-based indexing
         self._build_category_indices(chunks)
         
         print("✅ Optimized retrieval systems built")
     
-    def _build_category_indices(self, chunks: List[Dict]):
+    def _fit_lexical_indexes(self, docs: List[np.ndarray]):
+        """Fit BM25 (tokens longer than two characters) and TF-IDF (their words) to token id arrays."""
+        self.bm25 = ImpactBM25.from_token_ids([self.vocabulary.bm25_terms(doc) for doc in docs], self.vocabulary.ids)
+        self.tfidf = TokenTfidf(self.vocabulary, **TFIDF_PARAMS)
+        self.tfidf_matrix = self.tfidf.fit_transform(self.vocabulary.doc_words(docs))
+    
+    def _build_category_indices(self, chunks: ChunkStore):
         """Build category-specific indices for targeted retrieval."""
         self.category_indices = {}
         
-        for i, chunk in enumerate(chunks):
-            category = chunk["category"]
+        for i in range(len(chunks)):
+            category = chunks.category(i)
             if category not in self.category_indices:
                 self.category_indices[category] = []
             self.category_indices[category].append(i)
+        self._category_positions = None
         
         print(f"🏷️ Built indices for {len(self.category_indices)} categories")
     
-    def optimized_query(self, question: str, top_k: int = 5) -> Dict[str, Any]:
-        """Optimized query with speed and accuracy improvements."""
+    # -- Incremental updates --------------------------------------------------
+    
+    @staticmethod
+    def _chunk_id(chunk: Dict) -> str:
+        chunk_id = chunk.get("metadata", {}).get("chunk_id")
+        if not chunk_id:
+            raise ValueError("Chunks need a metadata.chunk_id to be updated in place")
+        return chunk_id
+    
+    def _prepare_incremental(self):
+        """Per-chunk state for in-place updates, built on the first change.
+        
+        Chunks keep their positions (removed ones become empty rows) until
+        compaction; `_chunk_seq` remembers knowledge base order so that
+        compaction can order chunks exactly like a full rebuild.
+        """
+        if self._chunk_seq is not None:
+            return
+        
+        self._doc_tokens = [self.vocabulary.encode(text) for text in self.chunks.texts()]
+        self._tfidf_rows = AppendableCSR(self.tfidf_matrix)
+        self._chunk_seq = list(range(len(self.chunks)))
+        self._chunk_positions = {self.chunks.chunk_id(i): i for i in range(len(self.chunks))}
+        self._removed = set()
+        self._appended = 0
+    
+    def _append_chunks(self, chunks: List[Dict], seqs: List[int]):
+        """Index enriched chunks at the end; TF-IDF rows use the current vocabulary until compaction."""
+        docs = [self.vocabulary.encode(chunk["content"]) for chunk in chunks]
+        positions = self.bm25.add_token_ids([self.vocabulary.bm25_terms(doc) for doc in docs])
+        self._tfidf_rows.append(self.tfidf.transform(self.vocabulary.doc_words(docs)))
+        
+        for position, chunk, seq, doc in zip(positions, chunks, seqs, docs):
+            self.chunks.append(chunk)
+            self._chunk_seq.append(seq)
+            self._doc_tokens.append(doc)
+            self._chunk_positions[self._chunk_id(chunk)] = position
+            self.category_indices.setdefault(chunk["category"], []).append(position)
+        self._appended += len(chunks)
+        
+        if self._dense_ready and self.dense_writer:
+            self.dense.upsert(*self._dense_records(positions))
+    
+    def _remove_positions(self, positions: List[int]):
+        """Turn chunks into tombstones: empty rows that never score."""
+        if self._dense_ready and self.dense_writer:
+            self.dense.delete(self._dense_records(positions)[0])
+        self.bm25.remove_documents(positions)
+        self._tfidf_rows.clear_rows(positions)
+        
+        for position in positions:
+            category = self.chunks.category(position)
+            del self._chunk_positions[self.chunks.chunk_id(position)]
+            self._doc_tokens[position] = None
+            self._removed.add(position)
+            
+            postings = self.category_indices[category]
+            postings.remove(position)
+            if not postings:
+                del self.category_indices[category]
+    
+    def _new_index_version(self):
+        """Tag the changed index and drop everything cached against the old one."""
+        self.index_revision += 1
+        self.index_version = f"{str(self.index_version).split('+')[0]}+{self.index_revision}"
+        
+        # Chunk ids and scores changed, so nothing cached is valid any more
+        self.query_cache.clear()
+        self.retrieval_cache.clear()
+        self._init_semantic_cache()
+        self._dense_positions = None
+    
+    def _index_changed(self):
+        """Publish an in-place change, compacting once enough has piled up."""
+        self.tfidf_matrix = self._tfidf_rows.matrix
+        self._new_index_version()
+        
+        live = len(self.chunks) - len(self._removed)
+        if len(self._removed) + self._appended > self.compact_ratio * live:
+            self.compact_index()
+    
+    def add_chunks(self, raw_chunks: List[Dict]) -> List[str]:
+        """Add knowledge base chunks ({"content", "metadata"}) without a rebuild.
+        
+        A chunk whose metadata.chunk_id is already indexed replaces it. Chunks
+        failing the quality filter are skipped; returns the ids indexed.
+        """
+        # The last of several chunks with the same id wins
+        raw_chunks = list({self._chunk_id(chunk): chunk for chunk in raw_chunks}.values())
+        
+        with self._index_lock:
+            self._prepare_incremental()
+            
+            replaced = []
+            chunks, seqs = [], []
+            for raw_chunk in raw_chunks:
+                chunk_id = self._chunk_id(raw_chunk)
+                # A replacement keeps its place in knowledge base order
+                position = self._chunk_positions.get(chunk_id)
+                if position is not None:
+                    replaced.append(position)
+                    seq = self._chunk_seq[position]
+                else:
+                    seq = len(self._chunk_seq) + len(seqs)
+                
+                chunk = self._enhance_chunk(raw_chunk)
+                if chunk is not None:
+                    chunks.append(chunk)
+                    seqs.append(seq)
+            
+            if replaced:
+                self._remove_positions(replaced)
+            if chunks:
+                self._append_chunks(chunks, seqs)
+            if replaced or chunks:
+                self._index_changed()
+            
+            print(f"➕ Indexed {len(chunks)} of {len(raw_chunks)} chunks ({len(replaced)} replaced)")
+            return [self._chunk_id(chunk) for chunk in chunks]
+    
+    def remove_chunks(self, chunk_ids: List[str]) -> int:
+        """Remove chunks by metadata.chunk_id; unknown ids are ignored."""
+        with self._index_lock:
+            self._prepare_incremental()
+            
+            positions = sorted({self._chunk_positions[i] for i in chunk_ids if i in self._chunk_positions})
+            if positions:
+                self._remove_positions(positions)
+                self._index_changed()
+            
+            print(f"➖ Removed {len(positions)} chunks")
+            return len(positions)
+    
+    def update_chunk(self, chunk_id: str, content: str, metadata: Optional[Dict] = None) -> bool:
+        """Replace a chunk's content (and optionally metadata).
+        
+        Returns False if the new content fails the quality filter, in which
+        case the chunk is removed. Raises KeyError for unknown ids.
+        """
+        with self._index_lock:
+            self._prepare_incremental()
+            if chunk_id not in self._chunk_positions:
+                raise KeyError(chunk_id)
+            
+            if metadata is None:
+                metadata = self.chunks.metadata(self._chunk_positions[chunk_id])
+            metadata = {**metadata, "chunk_id": chunk_id}
+            return bool(self.add_chunks([{"content": content, "metadata": metadata}]))
+    
+    @property
+    def indexed_chunks(self) -> int:
+        """Chunks currently searchable (removed ones wait for compaction)."""
+        return len(self.chunks) - len(self._removed)
+    
+    def remove_documents(self, document_ids: List[str]) -> int:
+        """Remove every chunk that came from the given documents (see ingest_documents)."""
+        document_ids = set(document_ids)
+        with self._index_lock:
+            self._prepare_incremental()
+            chunk_ids = [
+                chunk_id for chunk_id, position in self._chunk_positions.items()
+                if self.chunks.metadata_value(position, "document_id") in document_ids
+            ]
+            return self.remove_chunks(chunk_ids) if chunk_ids else 0
+    
+    def ingest_documents(self, documents: List[Dict]) -> Dict[str, int]:
+        """Split whole documents ({"id", "content", ...}, e.g. Prisma Document rows) into chunks and index them.
+        
+        Re-ingesting a document replaces its previous chunks. Returns the
+        number of chunks indexed per document id.
+        """
+        document_ids = {document["id"] for document in documents}
+        raw_chunks = [chunk for document in documents for chunk in self._split_document(document)]
+        fresh = {self._chunk_id(chunk) for chunk in raw_chunks}
+        
+        with self._index_lock:
+            self._prepare_incremental()
+            
+            # Same-id chunks are replaced in place; any beyond the new chunk count go
+            stale = [
+                chunk_id for chunk_id, position in self._chunk_positions.items()
+                if self.chunks.metadata_value(position, "document_id") in document_ids and chunk_id not in fresh
+            ]
+            if stale:
+                self.remove_chunks(stale)
+            indexed = set(self.add_chunks(raw_chunks)) if raw_chunks else set()
+        
+        counts = {document["id"]: 0 for document in documents}
+        for chunk in raw_chunks:
+            if self._chunk_id(chunk) in indexed:
+                counts[chunk["metadata"]["document_id"]] += 1
+        return counts
+    
+    def _split_document(self, document: Dict) -> List[Dict]:
+        """Knowledge base style chunks of about `chunk_size` characters, split between words."""
+        pieces, words, length = [], [], 0
+        for word in document.get("content", "").split():
+            if words and length + len(word) > self.chunk_size:
+                pieces.append(" ".join(words))
+                words, length = [], 0
+            words.append(word)
+            length += len(word) + 1
+        if words:
+            pieces.append(" ".join(words))
+        
+        metadata = document.get("metadata")
+        metadata = metadata if isinstance(metadata, dict) else {}
+        filename = document.get("filename") or metadata.get("source", "document")
+        return [
+            {
+                "content": piece,
+                "metadata": {
+                    **metadata,
+                    # Sources always carry a page; uploaded documents may not have any
+                    "page": metadata.get("page", 1),
+                    "source": filename,
+                    "source_file": filename,
+                    "title": document.get("title"),
+                    "document_id": document["id"],
+                    "chunk_id": f"{document['id']}_chunk_{i}",
+                    "chunk_index": i,
+                    "total_chunks": len(pieces),
+                    "chunk_size": len(piece)
+                }
+            }
+            for i, piece in enumerate(pieces)
+        ]
+    
+    def compact_index(self):
+        """Drop removed chunks and refit what incremental updates approximate.
+        
+        Afterwards chunks, BM25, TF-IDF and category postings are identical
+        to a full rebuild over the same chunks in knowledge base order.
+        """
+        with self._index_lock:
+            if self._chunk_seq is None:
+                return
+            
+            # Full rebuilds order chunks best-first, ties in knowledge base order
+            live = [i for i in range(len(self.chunks)) if i not in self._removed]
+            order = sorted(live, key=lambda i: (-self.chunks.quality[i], self._chunk_seq[i]))
+            
+            # Renumber tokens in first-seen order, as tokenizing the kept chunks would
+            self.chunks = self.chunks.take(order)
+            self.vocabulary, self._doc_tokens = self.vocabulary.compact([self._doc_tokens[i] for i in order])
+            self._fit_lexical_indexes(self._doc_tokens)
+            self._build_category_indices(self.chunks)
+            
+            self._tfidf_rows = AppendableCSR(self.tfidf_matrix)
+            self._chunk_seq = list(range(len(self.chunks)))
+            self._chunk_positions = {self.chunks.chunk_id(i): i for i in range(len(self.chunks))}
+            self._removed = set()
+            self._appended = 0
+            
+            self._new_index_version()
+            print(f"🗜️ Compacted index to {len(self.chunks)} chunks")
+    
+    def optimized_query(self, question: str, top_k: int = 5, cancel: Optional[CancelToken] = None) -> Dict[str, Any]:
+        """Optimized query with speed and accuracy improvements.
+        
+        A set `cancel` token stops the query at the next stage boundary (or
+        mid-generation) with QueryCancelled; nothing is cached for it.
+        """
         print(f"❓ Optimized query: {question}")
         
         start_time = time.time()
         
-        # Query caching
-        query_key = f"{question}_{top_k}"
-        if query_key in self.query_cache:
-            cached_result = self.query_cache[query_key]
-            cached_result["query_time"] = 0.1  # Cache hit time
+        # Query caching (hits are private copies)
+        query_key = (question, top_k)
+        cached_result = self.query_cache.get(query_key)
+        if cached_result is not None:
+            cached_result["query_time"] = time.time() - start_time
+            cached_result["cache_hit"] = True
             print("⚡ Cache hit!")
             return cached_result
         
-        # 1. Enhanced query preprocessing
-        processed_queries = self._preprocess_query(question)
-        
-        # 2. Category-aware retrieval
-        category_hint = self._detect_query_category(question)
-        
-        # 3. Multi-method retrieval with optimizations
-        all_results = []
-        
-        for query in processed_queries:
-            # BM25 with category boost
-            bm25_results = self._optimized_bm25_search(query, top_k, category_hint)
-            all_results.extend([(r, "bm25") for r in bm25_results])
+        try:
+            # 1-4. Retrieval (cached separately from answers)
+            check(cancel, STAGE_RETRIEVAL)
+            final_results, category_hint = self.retrieve(question, top_k)
             
-            # TF-IDF with optimizations
-            tfidf_results = self._optimized_tfidf_search(query, top_k, category_hint)
-            all_results.extend([(r, "tfidf") for r in tfidf_results])
-        
-        # 4. Advanced fusion and re-ranking
-        final_results = self._advanced_fusion_rerank(question, all_results, top_k)
-        
-        # 5. Optimized answer generation
-        context = self._prepare_optimized_context(final_results)
-        answer = self._generate_optimized_answer(question, context, final_results)
-        
+            # 5. Optimized answer generation
+            check(cancel, STAGE_GENERATION)
+            context = self._prepare_optimized_context(final_results)
+            answer, semantic_hit = self._answer_with_semantic_cache(question, context, final_results, cancel)
+        except QueryCancelled as e:
+            self.record_cancellation(e.stage)
+            raise
+        
+        return self._finalize_result(
+            query_key, question, answer, context, final_results, category_hint, semantic_hit, start_time
+        )
+    
+    def record_cancellation(self, stage: str):
+        """Count a query abandoned at `stage` (see cancellation.py)."""
+        with self._cancellation_lock:
+            self.cancellations[stage] = self.cancellations.get(stage, 0) + 1
+    
+    def _finalize_result(self, query_key: Tuple, question: str, answer: str, context: str, final_results: List[Dict],
+                         category_hint: str, semantic_hit: Optional[Dict], start_time: float) -> Dict[str, Any]:
+        """Assemble the query result and cache it."""
         query_time = time.time() - start_time
         
         result = {
@@ -315,61 +778,293 @@ class OptimizedEnhancedRAG:
             "context": context,
             "relevant_chunks": final_results,
             "query_time": query_time,
-            "methods": ["optimized_bm25", "optimized_tfidf", "advanced_fusion"],
-            "category_hint": category_hint
+            "methods": self.retrieval_methods,
+            "category_hint": category_hint,
+            "cache_hit": False,
+            "semantic_cache_hit": semantic_hit
         }
         
         # Cache result
         if query_time < 60:  # Only cache reasonable response times
-            self.query_cache[query_key] = result.copy()
+            self.query_cache.put(query_key, result)
         
         return result
     
-    def _preprocess_query(self, question: str) -> List[str]:
-        """Enhanced query preprocessing."""
-        queries = [question]
-        
-        # Enhanced domain expansions
-        expansions = {
-            "speed limit": ["maximum speed", "posted speed", "100 km/h", "80 km/h", "highway speed"],
-            "g1": ["G1 license", "level one", "beginner permit", "knowledge test", "Class G1"],
-            "g2": ["G2 license", "level two", "road test", "probationary", "Class G2"],
-            "documents": ["identification", "ID", "papers required", "birth certificate", "passport"],
-            "blood alcohol": ["0.08", "impaired driving", "alcohol limit", "BAC", "blood alcohol concentration"],
-            "school bus": ["yellow bus", "red lights", "flashing lights", "stop arm", "children"],
-            "insurance": ["auto insurance", "coverage required", "liability", "$200,000", "third-party"],
-            "right turn": ["turn right", "red light", "intersection", "complete stop"],
-            "merge": ["highway entrance", "acceleration lane", "lane change"],
-            "collision": ["accident", "crash", "emergency", "injury", "first aid"],
-            "headlight": ["headlights", "low beam", "high beam", "visibility"]
-        }
+    async def aquery(self, question: str, top_k: int = 5, deadline: Optional[float] = None) -> Dict[str, Any]:
+        """Asyncio-native optimized_query.
+        
+        Retrieval (CPU-bound) and the Grok call (network-bound) run in a
+        thread pool so the event loop stays free and many queries overlap
+        in one process. At most RAG_MAX_CONCURRENT_QUERIES run at once; the
+        rest wait their turn. `deadline` (seconds, default
+        RAG_QUERY_DEADLINE) covers waiting plus processing.
+        """
+        timeout = deadline if deadline is not None else self.query_deadline
+        try:
+            return await asyncio.wait_for(self._aquery(question, top_k), timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Query exceeded its {timeout:.1f}s deadline") from None
+    
+    async def _aquery(self, question: str, top_k: int) -> Dict[str, Any]:
+        cancel = CancelToken()
+        stage = STAGE_QUEUED
+        try:
+            async with self._get_async_semaphore():
+                print(f"❓ Optimized async query: {question}")
+                
+                loop = asyncio.get_running_loop()
+                start_time = time.time()
+                
+                query_key = (question, top_k)
+                cached_result = self.query_cache.get(query_key)
+                if cached_result is not None:
+                    cached_result["query_time"] = time.time() - start_time
+                    cached_result["cache_hit"] = True
+                    print("⚡ Cache hit!")
+                    return cached_result
+                
+                executor = self._get_executor()
+                stage = STAGE_RETRIEVAL
+                final_results, category_hint = await loop.run_in_executor(executor, self.retrieve, question, top_k)
+                
+                stage = STAGE_LLM
+                context = self._prepare_optimized_context(final_results)
+                answer, semantic_hit = await loop.run_in_executor(
+                    executor, self._answer_with_semantic_cache, question, context, final_results, cancel
+                )
+                
+                return self._finalize_result(
+                    query_key, question, answer, context, final_results, category_hint, semantic_hit, start_time
+                )
+        except asyncio.CancelledError:
+            # Executor threads can't be interrupted; the token stops their LLM call
+            cancel.cancel()
+            self.record_cancellation(stage)
+            raise
+    
+    def _get_async_semaphore(self) -> asyncio.Semaphore:
+        """The running loop's semaphore (each asyncio.run gets a fresh one)."""
+        loop = asyncio.get_running_loop()
+        with self._async_semaphores_lock:
+            semaphore = self._async_semaphores.get(loop)
+            if semaphore is None:
+                semaphore = asyncio.Semaphore(self.max_concurrent_queries)
+                self._async_semaphores[loop] = semaphore
+            return semaphore
+    
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_concurrent_queries,
+                thread_name_prefix="rag-query"
+            )
+        return self._executor
+    
+    def optimized_query_stream(self, question: str, top_k: int = 5,
+                               cancel: Optional[CancelToken] = None) -> Iterator[Dict[str, Any]]:
+        """Streaming variant of optimized_query.
+        
+        Yields {"type": "sources"} as soon as retrieval is done, then
+        {"type": "token"} events as the model produces text, and finally
+        {"type": "done", "result": ...} with the same result dict that
+        optimized_query returns. `cancel` works as in optimized_query.
+        """
+        print(f"❓ Optimized streaming query: {question}")
+        
+        start_time = time.time()
+        
+        query_key = (question, top_k)
+        cached_result = self.query_cache.get(query_key)
+        if cached_result is not None:
+            cached_result["query_time"] = time.time() - start_time
+            cached_result["cache_hit"] = True
+            print("⚡ Cache hit!")
+            yield {
+                "type": "sources",
+                "relevant_chunks": cached_result["relevant_chunks"],
+                "category_hint": cached_result["category_hint"]
+            }
+            yield {"type": "token", "text": cached_result["answer"]}
+            yield {"type": "done", "result": cached_result}
+            return
+        
+        try:
+            check(cancel, STAGE_RETRIEVAL)
+            final_results, category_hint = self.retrieve(question, top_k)
+            yield {
+                "type": "sources",
+                "relevant_chunks": final_results,
+                "category_hint": category_hint,
+                "retrieval_time": time.time() - start_time
+            }
+            
+            check(cancel, STAGE_GENERATION)
+            context = self._prepare_optimized_context(final_results)
+            
+            hit, vector, chunk_ids = self._semantic_lookup(question, final_results)
+            if hit is not None and not self.semantic_cache.should_audit():
+                answer = hit["answer"]
+                semantic_hit = {"question": hit["question"], "similarity": hit["similarity"]}
+                yield {"type": "token", "text": answer}
+            else:
+                parts = []
+                for token in self._stream_optimized_answer(question, context, final_results, cancel):
+                    parts.append(token)
+                    yield {"type": "token", "text": token}
+                answer = "".join(parts).strip()
+                semantic_hit = None
+                self._semantic_store(vector, question, answer, chunk_ids, hit)
+        except QueryCancelled as e:
+            self.record_cancellation(e.stage)
+            raise
+        
+        result = self._finalize_result(
+            query_key, question, answer, context, final_results, category_hint, semantic_hit, start_time
+        )
+        yield {"type": "done", "result": result}
+    
+    def retrieve(self, question: str, top_k: int = 5) -> Tuple[List[Dict], str]:
+        """Ranked chunks for a question, served from the retrieval cache when possible."""
+        # An index update replaces several structures; never rank against a mix
+        with self._index_lock:
+            return self._retrieve(question, top_k)
+    
+    def _retrieve(self, question: str, top_k: int) -> Tuple[List[Dict], str]:
+        # Every leg sees the key's text, so whichever question fills an entry ranks like the rest
+        question = self._normalize_question(question)
+        cache_key = (question, top_k, self.index_version)
+        cached = self.retrieval_cache.get(cache_key)
+        if cached is not None:
+            return [self._materialize_ranked(entry) for entry in cached["ranked"]], cached["category_hint"]
+        
+        # 1. Enhanced query preprocessing
+        processed_queries = self._preprocess_query(question)
+        
+        # 2. One scoring pass per method over the question and its expansion
+        scores = self._score_queries([processed_queries], top_k)
+        
+        # 3. Category-aware ranking, fusion and re-ranking
+        final_results, category_hint = self._rank_question(question, len(processed_queries), 0, scores, top_k)
+        
+        # Only ids and scores go into the cache
+        self.retrieval_cache.put(cache_key, {
+            "ranked": [
+                (r["chunk_index"], r["score"], r["method"], r["final_score"], r["fusion_methods"])
+                for r in final_results
+            ],
+            "category_hint": category_hint
+        })
         
-        question_lower = question.lower()
-        for key, terms in expansions.items():
-            if key in question_lower:
-                expanded = question + " " + " ".join(terms[:3])
-                queries.append(expanded)
+        return final_results, category_hint
+    
+    @staticmethod
+    def _normalize_question(question: str) -> str:
+        """Cache key form of a question, and the text every retrieval leg sees.
+        
+        The lexical legs lowercase and whitespace-split anyway; keyword
+        matching and the dense embedding get the same folded text, so case
+        and spacing differences can't change the ranking.
+        """
+        return " ".join(question.lower().split())
+    
+    def _materialize_ranked(self, entry: Tuple) -> ResultView:
+        """A fused result (a view reading like a dict) from a cached (id, scores, methods) entry."""
+        idx, score, method, final_score, fusion_methods = entry
+        return ResultView(self.chunks, idx, score, method, final_score, list(fusion_methods))
+    
+    def optimized_query_batch(self, questions: List[str], top_k: int = 5, generate: bool = False) -> List[Dict[str, Any]]:
+        """Answer many questions with one sparse scoring pass per retrieval method.
+        
+        Questions and their expansions are vectorized together and scored
+        in row blocks: one matmul per method and block, each block's dense
+        (rows x chunks) scores capped at RAG_BATCH_BLOCK_CELLS and dropped
+        once its questions are boosted, ranked (argpartition per row) and
+        fused exactly like optimized_query. Answers are only generated when
+        generate=True.
+        """
+        start_time = time.time()
+        
+        with self._index_lock:
+            # 1. Expand and encode every question, remembering which rows belong to which
+            normalized = [self._normalize_question(question) for question in questions]
+            processed = [self._preprocess_query(question) for question in normalized]
+            
+            # 2. One scoring pass per method and block: (block rows x num_chunks)
+            ranked = []
+            for start, end in self._row_blocks(processed):
+                scores = self._score_queries(processed[start:end], top_k)
+                row = 0
+                for question, queries in zip(normalized[start:end], processed[start:end]):
+                    ranked.append(self._rank_question(question, len(queries), row, scores, top_k))
+                    row += len(queries)
+        
+        results = []
+        for question, (final_results, category_hint) in zip(questions, ranked):
+            context = self._prepare_optimized_context(final_results)
+            answer = self._generate_optimized_answer(question, context, final_results) if generate else None
+            
+            results.append({
+                "question": question,
+                "answer": answer,
+                "context": context,
+                "relevant_chunks": final_results,
+                "methods": self.retrieval_methods,
+                "category_hint": category_hint
+            })
+        
+        # Amortized per-question time
+        per_query_time = (time.time() - start_time) / max(len(questions), 1)
+        for result in results:
+            result["query_time"] = per_query_time
+        
+        return results
+    
+    def _row_blocks(self, processed: List[List]) -> Iterator[Tuple[int, int]]:
+        """(start, end) question ranges whose variant rows fit in batch_block_cells score cells."""
+        max_rows = max(1, self.batch_block_cells // max(len(self.chunks), 1))
+        start, rows = 0, 0
+        for i, queries in enumerate(processed):
+            # A question's variants always share a block
+            if rows and rows + len(queries) > max_rows:
+                yield start, i
+                start, rows = i, 0
+            rows += len(queries)
+        if start < len(processed):
+            yield start, len(processed)
+    
+    def _preprocess_query(self, question: str) -> List[Tuple[str, Dict[int, float], np.ndarray]]:
+        """Enhanced query preprocessing: the question and, if a key matches, its expansion.
+        
+        Each variant is its text (for dense search), its BM25 weights by
+        token id and its TF-IDF word ids, encoded with the same vocabulary
+        as the chunks. Question tokens weigh their count and expansion terms
+        RAG_EXPANSION_WEIGHT, so the expanded variant scores the question
+        plus weighted expansion terms without searching both separately.
+        """
+        tokens, words = self.vocabulary.encode_query(question)
+        weights = dict(Counter(self.vocabulary.bm25_terms(tokens).tolist()))
+        queries = [(question, weights, words)]
+        
+        hits = query_keyword_hits(question)
+        for key, terms in QUERY_EXPANSIONS.items():
+            if key in hits:
+                expansion = " ".join(terms[:3])
+                expansion_tokens, expansion_words = self.vocabulary.encode_query(expansion)
+                expanded = dict(weights)
+                for token in self.vocabulary.bm25_terms(expansion_tokens).tolist():
+                    expanded[token] = expanded.get(token, 0) + self.expansion_weight
+                queries.append((question + " " + expansion, expanded, np.concatenate([words, expansion_words])))
                 break
         
-        return queries[:2]
+        return queries
     
     def _detect_query_category(self, question: str) -> str:
         """Detect query category for targeted retrieval."""
-        question_lower = question.lower()
-        
-        category_keywords = {
-            "speed_limits": ["speed", "limit", "fast", "maximum", "km/h"],
-            "licensing": ["g1", "g2", "license", "test", "document"],
-            "safety": ["alcohol", "blood", "impaired", "headlight", "seatbelt"],
-            "traffic_rules": ["traffic", "light", "turn", "intersection", "red"],
-            "insurance": ["insurance", "coverage", "liability", "mandatory"],
-            "emergency": ["collision", "accident", "emergency", "injury"],
-            "highway_driving": ["highway", "merge", "lane", "400-series"]
-        }
+        hits = query_keyword_hits(question)
         
         category_scores = {}
-        for category, keywords in category_keywords.items():
-            score = sum(1 for keyword in keywords if keyword in question_lower)
+        for category, keywords in QUERY_CATEGORIES.items():
+            score = count_hits(hits, keywords)
             if score > 0:
                 category_scores[category] = score
         
@@ -378,142 +1073,217 @@ class OptimizedEnhancedRAG:
         
         return "general"
     
-    def _optimized_bm25_search(self, query: str, top_k: int, category_hint: str) -> List[Dict]:
-        """Optimized BM25 search with category boosting."""
-        query_tokens = query.lower().split()
-        scores = self.bm25.get_scores(query_tokens)
+    def _score_queries(self, processed: List[List[Tuple[str, Dict[int, float], np.ndarray]]],
+                       top_k: int) -> Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]:
+        """BM25, TF-IDF and dense scores of every query variant (rows x chunk positions).
         
-        # Category boosting
-        if category_hint in self.category_indices:
-            boost_factor = 1.3
-            for idx in self.category_indices[category_hint]:
-                if idx < len(scores):
-                    scores[idx] *= boost_factor
+        `processed` holds each question's variants from _preprocess_query;
+        rows follow them in order. Every method scores all rows in one pass.
+        """
+        flat_queries = [query for queries in processed for query in queries]
+        texts = [text for text, _, _ in flat_queries]
         
-        top_indices = np.argsort(scores)[::-1][:top_k * 2]  # Get more for diversity
+        bm25_scores = self.bm25.get_scores_weighted([weights for _, weights, _ in flat_queries])
         
-        results = []
-        for idx in top_indices:
-            if idx < len(self.chunks) and scores[idx] > 0:
-                chunk = self.chunks[idx]
-                results.append({
-                    "content": chunk["content"],
-                    "metadata": chunk["metadata"],
-                    "score": float(scores[idx]),
-                    "method": "optimized_bm25",
-                    "category": chunk["category"],
-                    "quality_score": chunk["quality_score"]
-                })
-        
-        return results[:top_k]
-    
-    def _optimized_tfidf_search(self, query: str, top_k: int, category_hint: str) -> List[Dict]:
-        """Optimized TF-IDF search."""
-        query_vector = self.tfidf.transform([query])
-        similarities = cosine_similarity(query_vector, self.tfidf_matrix)[0]
+        tfidf_rows = self.tfidf.transform([words for _, _, words in flat_queries])
+        if self.expansion_weight != 1:
+            self._weight_expansion_rows(tfidf_rows, processed)
+        # TF-IDF rows are L2-normalized, so the dot product is the cosine similarity
+        tfidf_scores = (tfidf_rows @ self.tfidf_matrix.T).toarray()
         
-        # Category boosting
-        if category_hint in self.category_indices:
-            boost_factor = 1.2
-            for idx in self.category_indices[category_hint]:
-                if idx < len(similarities):
-                    similarities[idx] *= boost_factor
-        
-        top_indices = np.argsort(similarities)[::-1][:top_k * 2]
+        return bm25_scores, tfidf_scores, self._dense_scores(texts, top_k)
+    
+    def _weight_expansion_rows(self, rows, processed: List[List[Tuple[str, Dict[int, float], np.ndarray]]]):
+        """Scale the TF-IDF features an expansion adds by expansion_weight, in place.
+        
+        n-grams across the join and sublinear tf keep the expanded row from
+        being a sum of parts, so features not in the question's row count
+        as the expansion's; the row is then L2-normalized again.
+        """
+        row = 0
+        for queries in processed:
+            if len(queries) > 1:
+                own = rows.indices[rows.indptr[row]:rows.indptr[row + 1]]
+                start, end = rows.indptr[row + 1], rows.indptr[row + 2]
+                data = rows.data[start:end]
+                data[~np.isin(rows.indices[start:end], own)] *= self.expansion_weight
+                norm = np.linalg.norm(data)
+                if norm > 0:
+                    data /= norm
+            row += len(queries)
+    
+    def _rank_question(self, question: str, num_queries: int, first_row: int,
+                       scores: Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]],
+                       top_k: int) -> Tuple[List[Dict], str]:
+        """Boost, rank and fuse one question's score rows (from first_row); (results, category hint)."""
+        bm25_scores, tfidf_scores, dense_scores = scores
+        category_hint = self._detect_query_category(question)
         
-        results = []
-        for idx in top_indices:
-            if idx < len(self.chunks) and similarities[idx] > 0:
-                chunk = self.chunks[idx]
-                results.append({
-                    "content": chunk["content"],
-                    "metadata": chunk["metadata"],
-                    "score": float(similarities[idx]),
-                    "method": "optimized_tfidf",
-                    "category": chunk["category"],
-                    "quality_score": chunk["quality_score"]
-                })
-        
-        return results[:top_k]
-    
-    def _advanced_fusion_rerank(self, question: str, all_results: List[Tuple], top_k: int) -> List[Dict]:
-        """Advanced fusion and re-ranking."""
-        # Group by content similarity
-        chunk_groups = {}
-        
-        for result, method in all_results:
-            content_key = result["content"][:100]
-            
-            if content_key not in chunk_groups:
-                chunk_groups[content_key] = {
-                    "chunk": result,
-                    "scores": [],
-                    "methods": [],
-                    "categories": [],
-                    "quality_scores": []
-                }
-            
-            group = chunk_groups[content_key]
-            group["scores"].append(result["score"])
-            group["methods"].append(method)
-            group["categories"].append(result.get("category", "general"))
-            group["quality_scores"].append(result.get("quality_score", 0.5))
-        
-        # Advanced scoring
-        for group in chunk_groups.values():
-            # Base score (weighted average)
-            method_weights = {"optimized_bm25": 0.45, "optimized_tfidf": 0.45, "bm25": 0.4, "tfidf": 0.35}
-            
-            weighted_sum = 0
-            total_weight = 0
-            
-            for method, score in zip(group["methods"], group["scores"]):
-                weight = method_weights.get(method, 0.3)
-                weighted_sum += score * weight
-                total_weight += weight
-            
-            base_score = weighted_sum / total_weight if total_weight > 0 else 0
-            
-            # Quality boost
-            avg_quality = sum(group["quality_scores"]) / len(group["quality_scores"])
-            quality_boost = avg_quality * 0.2
+        runs = []
+        for row in range(first_row, first_row + num_queries):
+            # BM25 with category boost
+            runs.append(("bm25", "optimized_bm25", *self._rank_results(bm25_scores[row], top_k, category_hint, 1.3)))
             
-            # Multi-method boost
-            method_diversity = len(set(group["methods"]))
-            diversity_boost = (method_diversity - 1) * 0.15
+            # TF-IDF with optimizations
+            runs.append(("tfidf", "optimized_tfidf", *self._rank_results(tfidf_scores[row], top_k, category_hint, 1.2)))
             
-            # Category relevance boost
-            question_category = self._detect_query_category(question)
-            if question_category in group["categories"]:
-                category_boost = 0.1
-            else:
-                category_boost = 0
+            # Dense embeddings (nearest chunks from the vector store)
+            if dense_scores is not None:
+                runs.append(("dense", "dense", *self._rank_results(dense_scores[row], top_k, category_hint, 1.2)))
+        
+        return self._advanced_fusion_rerank(runs, top_k, category_hint), category_hint
+    
+    def _rank_results(self, scores: np.ndarray, top_k: int, category_hint: str,
+                      boost_factor: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Apply the category boost to one score vector; (chunk indices, scores) of the top results.
+        
+        Results are the top_k positive scores, best first, ties in chunk
+        order; argpartition keeps selection linear in the corpus size.
+        """
+        # Category boosting
+        positions = self._category_boost_positions().get(category_hint)
+        if positions is not None:
+            scores[positions[:np.searchsorted(positions, len(scores))]] *= boost_factor
+        
+        scores = scores[:len(self.chunks)]
+        k = min(top_k, len(scores))
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        if k < len(scores):
+            threshold = scores[np.argpartition(-scores, k - 1)[:k]].min()
+            # Everything tied with the k-th score, so ties are broken by position
+            candidates = np.flatnonzero(scores >= threshold) if threshold > 0 else np.flatnonzero(scores > 0)
+        else:
+            candidates = np.flatnonzero(scores > 0)
+        top_indices = candidates[np.argsort(-scores[candidates], kind="stable")[:k]]
+        
+        return top_indices, scores[top_indices].astype(np.float64)
+    
+    def _category_boost_positions(self) -> Dict[str, np.ndarray]:
+        """Sorted chunk positions per category, rebuilt once per index version."""
+        if self._category_positions is None or self._category_positions[0] != self.index_version:
+            arrays = {category: np.array(sorted(positions), dtype=np.int64)
+                      for category, positions in self.category_indices.items()}
+            self._category_positions = (self.index_version, arrays)
+        return self._category_positions[1]
+    
+    def _advanced_fusion_rerank(self, runs: List[Tuple[str, str, np.ndarray, np.ndarray]], top_k: int,
+                                category_hint: str) -> List[Dict]:
+        """Advanced fusion and re-ranking on chunk ids.
+        
+        `runs` are (leg, method, chunk indices, scores), best first, one per
+        retrieval method and query. RAG_FUSION picks the base score:
+            weighted    weighted mean of the raw scores (default)
+            normalized  the same, each run's scores divided by its best
+            rrf         reciprocal-rank fusion, sum of weight / (RRF_K + rank)
+        Weighted modes add quality, method diversity and category boosts.
+        Near-duplicate chunks take one slot (see _duplicate_keys).
+        """
+        runs = [run for run in runs if len(run[2])]
+        if not runs:
+            return []
+        
+        legs = list(FUSION_WEIGHTS)
+        indices = np.concatenate([run[2] for run in runs])
+        raw_scores = np.concatenate([run[3] for run in runs])
+        run_of = np.repeat(np.arange(len(runs)), [len(run[2]) for run in runs])
+        leg_of = np.array([legs.index(run[0]) for run in runs])[run_of]
+        weights = np.array(list(FUSION_WEIGHTS.values()))[leg_of]
+        
+        # One group per chunk; bincount sums each group in input order
+        candidates, first, group = np.unique(indices, return_index=True, return_inverse=True)
+        seen_legs = np.zeros((len(candidates), len(legs)), dtype=bool)
+        seen_legs[group, leg_of] = True
+        
+        if self.fusion == "rrf":
+            ranks = np.concatenate([np.arange(1, len(run[2]) + 1) for run in runs])
+            final_scores = np.bincount(group, weights / (RRF_K + ranks), len(candidates))
+        else:
+            scores = raw_scores
+            if self.fusion == "normalized":
+                scores = np.concatenate([run[3] / run[3][0] for run in runs])
+            base_score = np.bincount(group, scores * weights, len(candidates)) / np.bincount(group, weights, len(candidates))
             
-            # Final combined score
-            group["final_score"] = base_score + quality_boost + diversity_boost + category_boost
-        
-        # Sort and deduplicate
-        sorted_groups = sorted(
-            chunk_groups.values(),
-            key=lambda x: x["final_score"],
-            reverse=True
-        )
+            quality_boost = self.chunks.quality[candidates] * 0.2
+            diversity_boost = (seen_legs.sum(axis=1) - 1) * 0.15
+            category_boost = (self.chunks.category_ids[candidates] == self.chunks.category_id(category_hint)) * 0.1
+            final_scores = base_score + quality_boost + diversity_boost + category_boost
         
-        final_results = []
-        seen_content = set()
+        # Best first, ties in order of first appearance
+        by_appearance = np.argsort(first)
+        order = by_appearance[np.argsort(-final_scores[by_appearance], kind="stable")]
         
-        for group in sorted_groups:
-            chunk = group["chunk"]
-            content_key = chunk["content"][:150]
+        final_results = []
+        duplicate_keys = self._duplicate_keys()
+        seen_keys = set()
+        for g in order:
+            idx = candidates[g]
+            if duplicate_keys[idx] in seen_keys:
+                continue
+            seen_keys.add(duplicate_keys[idx])
             
-            if content_key not in seen_content and len(final_results) < top_k:
-                chunk["final_score"] = group["final_score"]
-                chunk["fusion_methods"] = list(set(group["methods"]))
-                final_results.append(chunk)
-                seen_content.add(content_key)
+            # The first occurrence stands for the group, as in the cached entries
+            occurrence = first[g]
+            final_results.append(self._materialize_ranked((
+                int(idx),
+                float(raw_scores[occurrence]),
+                runs[run_of[occurrence]][1],
+                float(final_scores[g]),
+                [leg for j, leg in enumerate(legs) if seen_legs[g, j]]
+            )))
+            if len(final_results) == top_k:
+                break
         
         return final_results
     
+    def _duplicate_keys(self) -> np.ndarray:
+        """Per chunk position, the first position with the same opening text.
+        
+        Chunks whose first 150 characters match count as duplicates in
+        fusion. Computed once per index version, off the query path.
+        """
+        if self._duplicates is None or self._duplicates[0] != self.index_version:
+            first_positions = {}
+            keys = [first_positions.setdefault(text[:150], i) for i, text in enumerate(self.chunks.texts())]
+            self._duplicates = (self.index_version, np.array(keys, dtype=np.int64))
+        return self._duplicates[1]
+    
+    def _answer_with_semantic_cache(self, question: str, context: str, chunks: List[Dict],
+                                    cancel: Optional[CancelToken] = None) -> Tuple[str, Optional[Dict]]:
+        """Reuse the answer of a paraphrased question when the sources also match."""
+        hit, vector, chunk_ids = self._semantic_lookup(question, chunks)
+        if hit is not None and not self.semantic_cache.should_audit():
+            return hit["answer"], {"question": hit["question"], "similarity": hit["similarity"]}
+        
+        answer = self._generate_optimized_answer(question, context, chunks, cancel)
+        self._semantic_store(vector, question, answer, chunk_ids, hit)
+        return answer, None
+    
+    def _semantic_lookup(self, question: str, chunks: List[Dict]) -> Tuple[Optional[Dict], Optional[np.ndarray], List[int]]:
+        """Nearest cached paraphrase, plus the vector and chunk ids to store on a miss."""
+        # Only LLM answers are worth reusing; the fallback is just the context
+        if self.semantic_cache is None or self.llm is None:
+            return None, None, []
+        
+        with self._index_lock:
+            vector = self.tfidf.transform([self.vocabulary.encode_query(question)[1]]).toarray()[0]
+        chunk_ids = [chunk["chunk_index"] for chunk in chunks]
+        
+        hit = self.semantic_cache.lookup(vector, chunk_ids)
+        if hit is not None:
+            print(f"🧠 Semantic cache hit ({hit['similarity']:.2f}): {hit['question']}")
+        return hit, vector, chunk_ids
+    
+    def _semantic_store(self, vector: Optional[np.ndarray], question: str, answer: str, chunk_ids: List[int], hit: Optional[Dict]):
+        """Add a fresh answer, or score it against the hit it was audited for."""
+        if vector is None:
+            return
+        if hit is not None:
+            if self.semantic_cache.record_audit(hit["answer"], answer):
+                print("⚠️ Semantic cache audit: false hit")
+            return
+        self.semantic_cache.add(vector, question, answer, chunk_ids)
+    
     def _prepare_optimized_context(self, chunks: List[Dict]) -> str:
         """Prepare optimized context for answer generation."""
         # Sort chunks by relevance and quality
@@ -538,16 +1308,48 @@ class OptimizedEnhancedRAG:
         
         return "\\n\\n".join(context_parts)
     
-    def _generate_optimized_answer(self, question: str, context: str, chunks: List[Dict]) -> str:
+    def _generate_optimized_answer(self, question: str, context: str, chunks: List[Dict],
+                                   cancel: Optional[CancelToken] = None) -> str:
         """Generate optimized answer with improved accuracy."""
-        if not self.grok_client:
+        if self.llm is None:
             return f"Based on the MTO handbook: {context[:400]}..."
         
         try:
-            # Enhanced system prompt for better accuracy
-            chat = self.grok_client.chat.create(model="grok-4-0709", temperature=0.05)  # Lower temperature
+            system_prompt, prompt = self._build_answer_prompt(question, context, chunks)
+            return self.llm.generate(system_prompt, prompt, cancel)
             
-            system_prompt = """You are an expert on Ontario driving rules and regulations with access to the official MTO Driver's Handbook. 
+        except QueryCancelled:
+            raise
+        except Exception as e:
+            print(f"⚠️ Optimized generation failed: {e}")
+            return f"Based on the MTO handbook context: {context[:300]}..."
+    
+    def _stream_optimized_answer(self, question: str, context: str, chunks: List[Dict],
+                                 cancel: Optional[CancelToken] = None) -> Iterator[str]:
+        """Yield answer text as the model produces it."""
+        if self.llm is None:
+            yield f"Based on the MTO handbook: {context[:400]}..."
+            return
+        
+        emitted = False
+        try:
+            system_prompt, prompt = self._build_answer_prompt(question, context, chunks)
+            for token in self.llm.stream(system_prompt, prompt, cancel):
+                emitted = True
+                yield token
+        
+        except QueryCancelled:
+            raise
+        except Exception as e:
+            print(f"⚠️ Optimized streaming generation failed: {e}")
+            # Don't append a fallback to a partially streamed answer
+            if not emitted:
+                yield f"Based on the MTO handbook context: {context[:300]}..."
+    
+    def _build_answer_prompt(self, question: str, context: str, chunks: List[Dict]) -> Tuple[str, str]:
+        """System prompt and grounded question prompt for answer generation."""
+        # Enhanced system prompt for better accuracy
+        system_prompt = """You are an expert on Ontario driving rules and regulations with access to the official MTO Driver's Handbook. 
 
 CRITICAL INSTRUCTIONS:
 1. Answer ONLY based on the provided context
@@ -556,14 +1358,12 @@ CRITICAL INSTRUCTIONS:
 4. If context is insufficient, say so clearly
 5. Use bullet points for complex answers
 6. Be accurate - this affects people's driving tests and safety"""
-            
-            chat.append(system(system_prompt))
-            
-            # Optimized prompt structure
-            pages = [str(chunk["metadata"]["page"]) for chunk in chunks[:3]]
-            page_refs = f"Sources: Pages {', '.join(set(pages))}"
-            
-            prompt = f"""Based on the MTO Driver's Handbook context below, provide a precise answer:
+        
+        # Optimized prompt structure
+        pages = [str(chunk["metadata"]["page"]) for chunk in chunks[:3]]
+        page_refs = f"Sources: Pages {', '.join(dict.fromkeys(pages))}"  # Unique, in rank order
+        
+        prompt = f"""Based on the MTO Driver's Handbook context below, provide a precise answer:
 
 CONTEXT:
 {context}
@@ -577,15 +1377,8 @@ REQUIREMENTS:
 - If multiple scenarios exist, explain each one
 
 ANSWER:"""
-            
-            chat.append(user(prompt))
-            response = chat.sample()
-            
-            return response.content.strip()
-            
-        except Exception as e:
-            print(f"⚠️ Optimized generation failed: {e}")
-            return f"Based on the MTO handbook context: {context[:300]}..."
+        
+        return system_prompt, prompt
 
 def main():
     """Test optimized enhanced RAG."""
@@ -608,4 +1401,23 @@ def main():
     print(f"\\nAnswer: {result['answer'][:200]}...")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Optimized Enhanced RAG")
+    parser.add_argument("command", nargs="?", default="test", choices=["test", "serve", "build-index"],
+                        help="'test' runs a sample query, 'serve' starts a resident worker, "
+                             "'build-index' writes an index snapshot")
+    parser.add_argument("--data-dir", default="data", help="Directory containing knowledge_base.json")
+    parser.add_argument("--socket", default=os.getenv("RAG_SOCKET_PATH", "/tmp/rag_worker.sock"),
+                        help="Unix socket path for 'serve'")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("RAG_SERVE_WORKERS", "1")),
+                        help="'serve' forks this many workers sharing one loaded index")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        from rag_worker import serve
+        serve(OptimizedEnhancedRAG, socket_path=args.socket, data_dir=args.data_dir, workers=args.workers)
+    elif args.command == "build-index":
+        OptimizedEnhancedRAG(data_dir=args.data_dir).build_index_snapshot()
+    else:
+        main()
\ No newline at end of file
@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+"""
+Resident RAG worker - loads the index once and serves framed requests
+
+The worker listens on a Unix domain socket and speaks the binary frame
+protocol in ipc_protocol.py. A REQUEST frame carries
+{"type": "query", "question": "...", "options": {...}}; the answer comes
+back as a RESULT frame (or an ERROR frame) with the same request id.
+
+Request types: "query" (retrieve + answer), "stream" (like query, but
+emits SOURCES and TOKEN frames before the RESULT), "retrieve" (ranked
+sources only), "ingest" (add {"documents": [...]} to the index in place,
+drop {"removed": [document ids]}), "ping" (health and cache counters) and
+"shutdown".
+
+Requests on one connection run concurrently on a thread pool, so a slow
+LLM call doesn't hold up the others; pings are answered inline. A CANCEL
+frame sets the request's CancelToken: it is skipped if it hasn't started,
+otherwise the engine stops at its next checkpoint, including mid-way
+through the LLM call. The READY frame is sent once setup has finished; all
+log output goes to stderr.
+
+With `--workers N` the process loads the index once and forks N children
+that accept one connection each, so every worker shares the same physical
+copy of the index (see _serve_forked).
+"""
+
+import gc
+import os
+import sys
+import time
+import signal
+import socket
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
+
+import ipc_protocol as ipc
+from cancellation import CancelToken, QueryCancelled, STAGE_QUEUED
+
+# Signals the pre-fork supervisor forwards to its children
+STOP_SIGNALS = {signal.SIGTERM, signal.SIGINT}
+
+
+def format_sources(chunks: List[Dict[str, Any]], max_sources: int = 5) -> List[Dict[str, Any]]:
+    """Trimmed source list for API responses."""
+    return [
+        {
+            "content": chunk["content"][:500] + ("..." if len(chunk["content"]) > 500 else ""),
+            "page": chunk["metadata"]["page"],
+            "score": chunk.get("final_score", chunk.get("score", 0)),
+            "category": chunk.get("category", "general")
+        }
+        for chunk in chunks[:max_sources]
+    ]
+
+
+def format_response(result: Dict[str, Any], max_sources: int = 5) -> Dict[str, Any]:
+    """Shape an optimized_query result into the RAGService response contract."""
+    return {
+        "answer": result["answer"],
+        "sources": format_sources(result["relevant_chunks"], max_sources),
+        "metadata": {
+            "category": result.get("category_hint", "general"),
+            "methods": result.get("methods", []),
+            "queryTime": result.get("query_time", 0),
+            "cacheHit": result.get("cache_hit", False),
+            "semanticCacheHit": result.get("semantic_cache_hit") is not None,
+            "chunksProcessed": len(result["relevant_chunks"])
+        }
+    }
+
+
+class RAGWorker:
+    """Serve queries against a single, already set-up OptimizedEnhancedRAG."""
+
+    def __init__(self, rag, max_concurrency: int = 8):
+        self.rag = rag
+        self.max_concurrency = max_concurrency
+        self.requests_served = 0
+        self.started_at = time.time()
+
+        self._connection: Optional[socket.socket] = None
+        self._send_lock = threading.Lock()
+        self._cancel_tokens: Dict[int, CancelToken] = {}
+        self._cancel_lock = threading.Lock()
+        self._served_lock = threading.Lock()
+
+    def send(self, frame: bytes):
+        """Write one protocol frame; safe to call from any request thread."""
+        with self._send_lock:
+            self._connection.sendall(frame)
+
+    def _count_served(self):
+        # Request threads finish concurrently; += alone can drop counts
+        with self._served_lock:
+            self.requests_served += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requestsServed": self.requests_served,
+            "inFlight": len(self._cancel_tokens),
+            "uptime": time.time() - self.started_at,
+            "cancelled": dict(self.rag.cancellations),
+            "queryCache": self.rag.query_cache.stats(),
+            "retrievalCache": self.rag.retrieval_cache.stats(),
+            "semanticCache": self.rag.semantic_cache.stats() if self.rag.semantic_cache else None,
+            "index": {"version": self.rag.index_version, "chunks": self.rag.indexed_chunks}
+        }
+
+    def handle(self, request_id: int, message: Dict[str, Any], cancel: CancelToken) -> Dict[str, Any]:
+        """Run one request and return its result payload."""
+        request_type = message.get("type", "query")
+        options = message.get("options") or {}
+        top_k = int(options.get("topK", 5))
+        max_sources = int(options.get("maxSources", 5))
+
+        if cancel.cancelled:
+            self.rag.record_cancellation(STAGE_QUEUED)
+            raise QueryCancelled(STAGE_QUEUED)
+
+        if request_type == "retrieve":
+            chunks, category_hint = self.rag.retrieve(message["question"], top_k=top_k)
+            return format_response(
+                {"answer": None, "relevant_chunks": chunks, "category_hint": category_hint},
+                max_sources
+            )
+
+        if request_type == "stream":
+            return self.stream(request_id, message["question"], top_k, max_sources, cancel)
+
+        if request_type == "ingest":
+            removed = self.rag.remove_documents(message["removed"]) if message.get("removed") else 0
+            chunks = self.rag.ingest_documents(message["documents"]) if message.get("documents") else {}
+            return {
+                "chunks": chunks,
+                "removedChunks": removed,
+                "index": {"version": self.rag.index_version, "chunks": self.rag.indexed_chunks}
+            }
+
+        if request_type != "query":
+            raise ValueError(f"Unknown request type: {request_type}")
+
+        result = self.rag.optimized_query(message["question"], top_k=top_k, cancel=cancel)
+        self._count_served()
+        return format_response(result, max_sources)
+
+    def stream(self, request_id: int, question: str, top_k: int, max_sources: int,
+               cancel: CancelToken) -> Dict[str, Any]:
+        """Forward streaming events as they happen and return the final result."""
+        result = None
+        events = self.rag.optimized_query_stream(question, top_k=top_k, cancel=cancel)
+        try:
+            for event in events:
+                if event["type"] == "sources":
+                    self.send(ipc.encode_json(ipc.SOURCES, request_id, {
+                        "sources": format_sources(event["relevant_chunks"], max_sources),
+                        "category": event["category_hint"]
+                    }))
+                elif event["type"] == "token":
+                    self.send(ipc.encode_frame(ipc.TOKEN, request_id, event["text"].encode("utf-8")))
+                elif event["type"] == "done":
+                    result = event["result"]
+        finally:
+            events.close()
+
+        self._count_served()
+        return format_response(result, max_sources)
+
+    def _run(self, request_id: int, message: Dict[str, Any], cancel: CancelToken):
+        """Request thread body: handle, then reply with RESULT or ERROR."""
+        try:
+            frame = ipc.encode_json(ipc.RESULT, request_id, self.handle(request_id, message, cancel))
+        except QueryCancelled as e:
+            frame = ipc.encode_json(ipc.ERROR, request_id, {"error": str(e), "errorType": "Cancelled"})
+        except Exception as e:
+            traceback.print_exc(file=sys.stderr)
+            frame = ipc.encode_json(ipc.ERROR, request_id, {"error": str(e), "errorType": type(e).__name__})
+        finally:
+            with self._cancel_lock:
+                self._cancel_tokens.pop(request_id, None)
+
+        try:
+            self.send(frame)
+        except OSError:
+            # Client went away; nothing left to tell it
+            pass
+
+    def serve(self, connection: socket.socket):
+        """Read frames from one client until EOF or a shutdown request."""
+        self._connection = connection
+        self.send(ipc.encode_json(ipc.READY, 0, {"pid": os.getpid()}))
+
+        reader = connection.makefile("rb")
+        client_gone = False
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            while True:
+                frame = ipc.read_frame(reader)
+                if frame is None:
+                    client_gone = True
+                    break
+                kind, request_id, payload = frame
+
+                if kind == ipc.CANCEL:
+                    with self._cancel_lock:
+                        token = self._cancel_tokens.get(request_id)
+                    if token is not None:
+                        token.cancel()
+                    continue
+
+                if kind != ipc.REQUEST:
+                    print(f"⚠️ Ignoring unexpected frame kind {kind}", file=sys.stderr)
+                    continue
+
+                message = ipc.decode_json(payload)
+                request_type = message.get("type", "query")
+                if request_type == "shutdown":
+                    break
+                if request_type == "ping":
+                    self.send(ipc.encode_json(ipc.RESULT, request_id, self.stats()))
+                    continue
+
+                cancel = CancelToken()
+                with self._cancel_lock:
+                    self._cancel_tokens[request_id] = cancel
+                executor.submit(self._run, request_id, message, cancel)
+
+            # A shutdown lets in-flight requests finish; a vanished client
+            # means nobody is waiting for them
+            if client_gone:
+                with self._cancel_lock:
+                    for token in self._cancel_tokens.values():
+                        token.cancel()
+
+        reader.close()
+
+
+def _bind(socket_path: str, backlog: int) -> socket.socket:
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    server.listen(backlog)
+    return server
+
+
+def _serve_connection(rag, server: socket.socket):
+    """Accept one client and serve it until it disconnects or shuts us down."""
+    worker = RAGWorker(rag, max_concurrency=rag.max_concurrent_queries)
+    connection, _ = server.accept()
+    with connection:
+        worker.serve(connection)
+
+
+def _exit_with_parent(parent_pid: int):
+    """Don't outlive a supervisor that was killed outright."""
+    def watch():
+        while os.getppid() == parent_pid:
+            time.sleep(1.0)
+        os._exit(1)
+    threading.Thread(target=watch, name="parent-watch", daemon=True).start()
+
+
+def _serve_forked(rag, server: socket.socket, workers: int):
+    """Pre-fork serving: children inherit the loaded index copy-on-write.
+
+    Each child serves one connection and exits; the supervisor forks a
+    replacement straight away, which costs milliseconds since nothing has
+    to be loaded again. Per-child memory is whatever the child writes to:
+    its caches and the pages of objects whose refcounts a query touches.
+
+    The child in slot 0 (and its replacements) is the only one that
+    writes ingested chunks to the vector store; the others only query it.
+    """
+    # Objects in the permanent generation are never scanned, so garbage
+    # collection in the children doesn't dirty every page of the index
+    gc.collect()
+    gc.freeze()
+
+    parent_pid = os.getpid()
+    children: Dict[int, Tuple[int, float]] = {}
+    dense_writer = rag.dense_writer
+    stopping = False
+
+    def fork_child(slot: int):
+        # Until the child has restored the default handlers, a SIGTERM would
+        # run the supervisor's handler in it; hold signals across the fork
+        signal.pthread_sigmask(signal.SIG_BLOCK, STOP_SIGNALS)
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                signal.signal(signal.SIGINT, signal.SIG_DFL)
+                signal.pthread_sigmask(signal.SIG_UNBLOCK, STOP_SIGNALS)
+                _exit_with_parent(parent_pid)
+                # Network clients (gRPC, Chroma) are not fork-safe
+                rag.prefork = False
+                rag.dense_writer = dense_writer and slot == 0
+                rag._initialize_clients()
+                _serve_connection(rag, server)
+            except BaseException:
+                traceback.print_exc(file=sys.stderr)
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = (slot, time.monotonic())
+        signal.pthread_sigmask(signal.SIG_UNBLOCK, STOP_SIGNALS)
+
+    def terminate_children():
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        terminate_children()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for slot in range(workers):
+        fork_child(slot)
+    print(f"✅ Forked {workers} RAG workers sharing one index")
+
+    while children:
+        if stopping:
+            # The handler may have run between a fork and the new pid being recorded
+            terminate_children()
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+
+        child = children.pop(pid, None)
+        if child is None or stopping:
+            continue
+        slot, started_at = child
+        # A child that dies on arrival would otherwise be re-forked in a tight loop
+        if time.monotonic() - started_at < 1.0:
+            time.sleep(1.0)
+        fork_child(slot)
+
+
+def serve(rag_class, socket_path: str, data_dir: str = "data", workers: int = 1):
+    """Entry point for `python -m rag_engine serve --socket PATH [--workers N]`.
+
+    With more than one worker the index is loaded once and shared with
+    forked children; clients open one connection per worker.
+    """
+    # Nothing reads stdout any more; keep it out of the way of callers
+    sys.stdout = sys.stderr
+
+    rag = rag_class(data_dir=data_dir)
+    rag.setup(prefork=workers > 1)
+
+    # Bind only after setup, so a successful connect means the index is loaded
+    server = _bind(socket_path, backlog=2 * max(1, workers))
+    print(f"✅ RAG worker listening on {socket_path}")
+
+    try:
+        if workers > 1:
+            _serve_forked(rag, server, workers)
+        else:
+            _serve_connection(rag, server)
+    finally:
+        server.close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
@@ -40,8 +40,8 @@ def initialize_rag():
         st.error(f"Failed to initialize RAG: {str(e)}")
         return None
 
-def query_rag(rag_system, question):
-    """Query the RAG system"""
+def query_rag(rag_system, question, answer_placeholder):
+    """Query the RAG system, rendering the answer as it streams in"""
     if not rag_system:
         return {
             "answer": "RAG system is not available. Please check your setup.",
@@ -51,11 +51,20 @@ def query_rag(rag_system, question):
     
     try:
         start_time = time.time()
-        result = rag_system.optimized_query(question)
-        query_time = time.time() - start_time
+        result = None
+        answer_parts = []
+        
+        for event in rag_system.optimized_query_stream(question):
+            if event["type"] == "sources":
+                answer_placeholder.markdown("✍️ *Writing answer...*")
+            elif event["type"] == "token":
+                answer_parts.append(event["text"])
+                answer_placeholder.markdown("".join(answer_parts) + "▌")
+            elif event["type"] == "done":
+                result = event["result"]
         
         # Add query time to result
-        result["query_time"] = query_time
+        result["query_time"] = time.time() - start_time
         return result
         
     except Exception as e:
@@ -172,55 +181,57 @@ def main():
                 st.error("❌ RAG system is not available. Please check your configuration.")
                 return
                 
-            with st.spinner("🧠 Processing your question..."):
-                # Query RAG system
-                result = query_rag(rag_system, user_input)
-                
-                # Update performance stats
-                st.session_state.total_queries += 1
-                st.session_state.total_time += result.get("query_time", 0)
-                
-                # Display answer
-                answer = result.get("answer", "Sorry, I couldn't generate an answer.")
-                st.markdown(answer)
-                
-                # Prepare sources for display
-                sources = []
-                relevant_chunks = result.get("relevant_chunks", [])
-                
-                for chunk in relevant_chunks:
-                    source_info = {
-                        "content": chunk.get("content", ""),
-                        "page": chunk.get("metadata", {}).get("page", "N/A"),
-                        "score": chunk.get("final_score", chunk.get("score", 0))
-                    }
-                    sources.append(source_info)
-                
-                # Show sources
-                if sources:
-                    with st.expander(f"📚 Sources ({len(sources)} found)"):
-                        for i, source in enumerate(sources, 1):
-                            score = source["score"]
-                            page = source["page"]
-                            content = source["content"][:200] + "..." if len(source["content"]) > 200 else source["content"]
-                            
-                            st.markdown(f"""
-                            **Source {i}** (Score: {score:.3f}, Page: {page})
-                            
-                            *{content}*
-                            """)
-                
-                # Show performance
-                query_time = result.get("query_time", 0)
-                st.caption(f"⚡ Responded in {query_time:.2f} seconds")
-                
-                # Add to chat history
-                st.session_state.messages.append({
-                    "role": "assistant",
-                    "content": answer,
-                    "sources": sources,
-                    "query_time": query_time
-                })
+            answer_placeholder = st.empty()
+            answer_placeholder.markdown("🧠 *Searching the handbook...*")
+            
+            # Query RAG system (answer renders incrementally)
+            result = query_rag(rag_system, user_input, answer_placeholder)
+            
+            # Update performance stats
+            st.session_state.total_queries += 1
+            st.session_state.total_time += result.get("query_time", 0)
+            
+            # Display answer
+            answer = result.get("answer", "Sorry, I couldn't generate an answer.")
+            answer_placeholder.markdown(answer)
+            
+            # Prepare sources for display
+            sources = []
+            relevant_chunks = result.get("relevant_chunks", [])
+            
+            for chunk in relevant_chunks:
+                source_info = {
+                    "content": chunk.get("content", ""),
+                    "page": chunk.get("metadata", {}).get("page", "N/A"),
+                    "score": chunk.get("final_score", chunk.get("score", 0))
+                }
+                sources.append(source_info)
+            
+            # Show sources
+            if sources:
+                with st.expander(f"📚 Sources ({len(sources)} found)"):
+                    for i, source in enumerate(sources, 1):
+                        score = source["score"]
+                        page = source["page"]
+                        content = source["content"][:200] + "..." if len(source["content"]) > 200 else source["content"]
+                        
+                        st.markdown(f"""
+                        **Source {i}** (Score: {score:.3f}, Page: {page})
+                        
+                        *{content}*
+                        """)
+            
+            # Show performance
+            query_time = result.get("query_time", 0)
+            st.caption(f"⚡ Responded in {query_time:.2f} seconds")
+            
+            # Add to chat history
+            st.session_state.messages.append({
+                "role": "assistant",
+                "content": answer,
+                "sources": sources,
+                "query_time": query_time
+            })
 
     # Footer
     st.markdown("---")
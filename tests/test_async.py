@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+aquery across event loops
+
+Each asyncio.run() starts a new loop; the engine's concurrency limit must
+work in every one of them, not only the first. Queries answer with the
+fake LLM backend over the bundled knowledge base.
+
+    python -m pytest tests/test_async.py
+"""
+
+import io
+import os
+import sys
+import asyncio
+import unittest
+import contextlib
+from pathlib import Path
+from unittest import mock
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+with contextlib.redirect_stdout(io.StringIO()):
+    from rag_engine import OptimizedEnhancedRAG
+
+ENGINE_ENV = {
+    "RAG_DENSE_RETRIEVAL": "0",
+    "RAG_LLM_BACKEND": "fake",
+    "RAG_FAKE_LLM_LATENCY_MS": "20",
+    "RAG_FAKE_LLM_LATENCY_SIGMA": "0",
+    "RAG_FAKE_LLM_TOKENS_PER_SEC": "0",
+    "RAG_SEMANTIC_CACHE": "0",
+    "RAG_MAX_CONCURRENT_QUERIES": "1",
+}
+QUESTIONS = [
+    "What is the speed limit on highways in Ontario?",
+    "What documents do I need for a G1 test?",
+    "What is the blood alcohol limit for drivers?",
+]
+
+
+class AsyncQueryTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.environ = mock.patch.dict(os.environ, ENGINE_ENV)
+        cls.environ.start()
+        with contextlib.redirect_stdout(io.StringIO()):
+            cls.rag = OptimizedEnhancedRAG(data_dir=str(ROOT / "data"))
+            cls.rag.setup()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.environ.stop()
+
+    async def query_all(self):
+        # With one slot, every query after the first waits on the semaphore
+        return await asyncio.gather(*(self.rag.aquery(question) for question in QUESTIONS))
+
+    def run_loop(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return asyncio.run(self.query_all())
+
+    def test_concurrent_queries_in_successive_loops(self):
+        for run in range(3):
+            with self.subTest(run=run):
+                self.rag.query_cache.clear()
+                results = self.run_loop()
+                self.assertEqual([result["question"] for result in results], QUESTIONS)
+                self.assertTrue(all(result["answer"] for result in results))
+
+    def test_loops_get_their_own_semaphore(self):
+        async def semaphore():
+            return self.rag._get_async_semaphore()
+
+        async def twice():
+            return await semaphore(), await semaphore()
+
+        first, again = asyncio.run(twice())
+        self.assertIs(first, again)
+        self.assertIsNot(asyncio.run(semaphore()), first)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+LocalDenseIndex and IVFIndex storage: generations, appends, readers
+
+    python -m pytest tests/test_dense_index.py
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from ann_index import IVFIndex
+from dense_index import LocalDenseIndex
+from embedding_backends import create_embedding_backend
+
+TEXTS = [f"chunk {i} about speed limits on highway {i * 7} and its rules" for i in range(120)]
+IDS = [f"c{i}" for i in range(len(TEXTS))]
+METADATAS = [{}] * len(TEXTS)
+
+
+class LocalDenseIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.backend = create_embedding_backend("hashing")
+        self.writer = LocalDenseIndex(self.backend, self.directory)
+        self.writer.sync(IDS, TEXTS, METADATAS)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def open(self, **kwargs) -> LocalDenseIndex:
+        return LocalDenseIndex(self.backend, self.directory, **kwargs)
+
+    def test_restart_embeds_nothing(self):
+        self.assertEqual(self.open().sync(IDS, TEXTS, METADATAS), (0, 0))
+
+    def test_reader_sees_appends(self):
+        reader = self.open()
+        self.writer.upsert(["new"], ["parking on snow days"], [{}])
+        self.writer.delete(["c3"])
+
+        ids = [chunk_id for chunk_id, _ in reader.search(["parking on snow days"], 3)[0]]
+        self.assertEqual(ids[0], "new")
+        self.assertEqual(len(reader), len(TEXTS))
+        self.assertNotIn("c3", [chunk_id for chunk_id, _ in reader.search([TEXTS[3]], 5)[0]])
+
+    def test_upsert_appends_to_the_vectors_file(self):
+        generation = (Path(self.writer.directory) / "current").resolve()
+        vectors = generation / "vectors.f16"
+        inode, size = vectors.stat().st_ino, vectors.stat().st_size
+
+        self.writer.upsert(["c0"], ["replaced text about parking"], [{}])
+
+        self.assertEqual(vectors.stat().st_ino, inode)
+        self.assertEqual(vectors.stat().st_size, size + 2 * self.writer.vectors.shape[1])
+        self.assertEqual((Path(self.writer.directory) / "current").resolve(), generation)
+        self.assertEqual(self.writer.search(["replaced text about parking"], 1)[0][0][0], "c0")
+
+    def test_sync_swaps_in_a_compacted_generation(self):
+        reader = self.open()
+        self.writer.delete(["c0", "c1"])
+        self.assertEqual(self.writer.sync(IDS[2:], TEXTS[2:], METADATAS[2:]), (0, 0))
+
+        self.assertEqual(len(self.writer.chunk_ids), len(TEXTS) - 2)
+        self.assertEqual(len(reader.search(["highway rules"], 5)[0]), 5)
+        self.assertEqual(len(reader), len(TEXTS) - 2)
+        generations = [p for p in os.listdir(self.writer.directory) if p.startswith("gen-")]
+        self.assertLessEqual(len(generations), 2)
+
+    def test_matches_a_fresh_index(self):
+        self.writer.upsert(["new"], ["parking on snow days"], [{}])
+        self.writer.delete(["c7"])
+        fresh = self.open()
+        queries = ["parking on snow days", "highway 70 rules", TEXTS[7]]
+        self.assertEqual(fresh.search(queries, 5), self.writer.search(queries, 5))
+
+
+class IVFSaveTest(unittest.TestCase):
+    def test_save_swaps_a_symlink(self):
+        directory = Path(tempfile.mkdtemp())
+        try:
+            rng = np.random.default_rng(0)
+            vectors = rng.standard_normal((200, 16)).astype(np.float32)
+            first = IVFIndex(16, storage="float32")
+            first.add(vectors[:100])
+            first.save(directory / "ivf")
+            loaded = IVFIndex.load(directory / "ivf")
+
+            second = IVFIndex(16, storage="float32")
+            second.add(vectors)
+            second.save(directory / "ivf")
+
+            self.assertTrue((directory / "ivf").is_symlink())
+            self.assertEqual(len(IVFIndex.load(directory / "ivf")), 200)
+            # Pages mapped from the replaced index stay readable
+            self.assertEqual(len(loaded), 100)
+            self.assertEqual(sorted(np.asarray(loaded.ids).tolist()), list(range(100)))
+            self.assertEqual([p.name for p in directory.iterdir() if not p.name.startswith("ivf.")], ["ivf"])
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Regression test: single-pass expansion scoring ranks like one search per variant
+
+The previous retrieval path ran BM25 get_scores and a TF-IDF transform +
+cosine similarity separately for the question and for the question plus
+its expansion. _score_queries scores both variants in one pass per
+method; at RAG_EXPANSION_WEIGHT=1 the fused results must be identical.
+
+    python -m pytest tests/test_expansion.py
+"""
+
+import io
+import os
+import sys
+import unittest
+import contextlib
+from pathlib import Path
+
+import numpy as np
+from sklearn.metrics.pairwise import cosine_similarity
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+with contextlib.redirect_stdout(io.StringIO()):
+    from rag_engine import OptimizedEnhancedRAG
+
+QUESTIONS = [
+    "What is the speed limit on highways in Ontario?",
+    "What documents do I need for a G1 test?",
+    "Can G1 drivers drive on 400-series highways?",
+    "What is the blood alcohol limit for drivers?",
+    "What should you do when a school bus has flashing red lights?",
+    "What are the penalties for distracted driving?",
+    "How do I renew my driver's license?",
+    "What should I do in case of an accident?",
+    "What are the parking rules in Ontario?",
+    "Is insurance mandatory in Ontario?",
+    "How do I merge onto a highway?",
+    "When should I use my headlights?",
+]
+TOP_K = 5
+
+
+def fused(results):
+    return [(r["chunk_index"], round(r["final_score"], 9), list(r["fusion_methods"])) for r in results]
+
+
+class ExpansionScoringTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # The dense leg embeds all variants in one batch either way
+        previous = os.environ.get("RAG_DENSE_RETRIEVAL")
+        os.environ["RAG_DENSE_RETRIEVAL"] = "0"
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                cls.rag = OptimizedEnhancedRAG(data_dir=str(ROOT / "data"))
+                cls.rag.setup()
+        finally:
+            if previous is None:
+                del os.environ["RAG_DENSE_RETRIEVAL"]
+            else:
+                os.environ["RAG_DENSE_RETRIEVAL"] = previous
+        cls.rag.expansion_weight = 1.0
+
+    def per_variant(self, question, queries):
+        rag = self.rag
+        bm25_scores = np.array([rag.bm25.get_scores(text.lower().split()) for text, _, _ in queries])
+        tfidf_scores = np.array([cosine_similarity(rag.tfidf.transform([words]), rag.tfidf_matrix)[0]
+                                 for _, _, words in queries])
+        return rag._rank_question(question, len(queries), 0, (bm25_scores, tfidf_scores, None), TOP_K)
+
+    def single_pass(self, question, queries):
+        rag = self.rag
+        return rag._rank_question(question, len(queries), 0, rag._score_queries([queries], TOP_K), TOP_K)
+
+    def test_sample_questions_include_expansions(self):
+        expanded = [q for q in QUESTIONS if len(self.rag._preprocess_query(q)) > 1]
+        self.assertGreater(len(expanded), 0)
+
+    def test_single_pass_matches_per_variant(self):
+        for question in QUESTIONS:
+            with self.subTest(question=question):
+                queries = self.rag._preprocess_query(question)
+                expected, expected_hint = self.per_variant(question, queries)
+                actual, actual_hint = self.single_pass(question, queries)
+                self.assertEqual(fused(actual), fused(expected))
+                self.assertEqual(actual_hint, expected_hint)
+
+    def test_retrieve_matches_per_variant(self):
+        self.rag.retrieval_cache.clear()
+        for question in QUESTIONS:
+            with self.subTest(question=question):
+                expected, _ = self.per_variant(question, self.rag._preprocess_query(question))
+                actual, _ = self.rag.retrieve(question, TOP_K)
+                self.assertEqual(fused(actual), fused(expected))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+In-place index updates against a fresh setup() over the same chunks
+
+The knowledge base minus its last chunks is indexed, then those chunks
+are added and others removed and edited with add_chunks, remove_chunks
+and update_chunk. Before compaction BM25 scores and category postings
+must already agree with a full rebuild per chunk id; after
+compact_index() every index array must be identical.
+
+    python -m pytest tests/test_incremental.py
+"""
+
+import io
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+import contextlib
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+with contextlib.redirect_stdout(io.StringIO()):
+    from rag_engine import OptimizedEnhancedRAG
+
+QUESTIONS = [
+    "What is the speed limit on highways in Ontario?",
+    "What documents do I need for a G1 test?",
+    "What is the blood alcohol limit for drivers?",
+    "What should you do when a school bus has flashing red lights?",
+]
+ADDED, REMOVED, UPDATED = 30, 10, 5
+EDIT = " Drivers must obey the posted speed limit on every highway."
+
+
+def chunk_id(chunk) -> str:
+    return chunk["metadata"]["chunk_id"]
+
+
+def same_csr(a, b) -> bool:
+    return a.shape == b.shape and all(
+        np.array_equal(getattr(a, name), getattr(b, name)) for name in ("data", "indices", "indptr")
+    )
+
+
+class IncrementalIndexTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.directories = []
+        cls.environ = os.environ.get("RAG_DENSE_RETRIEVAL")
+        os.environ["RAG_DENSE_RETRIEVAL"] = "0"
+
+        with open(ROOT / "data" / "knowledge_base.json", "r") as f:
+            knowledge_base = json.load(f)
+        cls.base, cls.added = knowledge_base[:-ADDED], knowledge_base[-ADDED:]
+
+        indexed = [chunk_id(chunk) for chunk in cls.setup_engine(cls.base).chunks]
+        cls.removed = set(indexed[5:5 + REMOVED])
+        cls.edits = {
+            chunk_id(chunk): chunk["content"] + EDIT
+            for chunk in cls.base if chunk_id(chunk) in indexed[20:20 + UPDATED]
+        }
+
+        cls.incremental = cls.edited_engine()
+        cls.compacted = cls.edited_engine()
+        with contextlib.redirect_stdout(io.StringIO()):
+            cls.compacted.compact_index()
+
+        cls.reference = cls.setup_engine([
+            {**chunk, "content": cls.edits.get(chunk_id(chunk), chunk["content"])}
+            for chunk in cls.base + cls.added
+            if chunk_id(chunk) not in cls.removed
+        ])
+
+    @classmethod
+    def tearDownClass(cls):
+        for directory in cls.directories:
+            shutil.rmtree(directory, ignore_errors=True)
+        if cls.environ is None:
+            del os.environ["RAG_DENSE_RETRIEVAL"]
+        else:
+            os.environ["RAG_DENSE_RETRIEVAL"] = cls.environ
+
+    @classmethod
+    def setup_engine(cls, raw_chunks) -> OptimizedEnhancedRAG:
+        directory = tempfile.mkdtemp()
+        cls.directories.append(directory)
+        with open(Path(directory) / "knowledge_base.json", "w") as f:
+            json.dump(raw_chunks, f)
+        with contextlib.redirect_stdout(io.StringIO()):
+            rag = OptimizedEnhancedRAG(data_dir=directory)
+            rag.setup()
+        # Compaction only when a test asks for it
+        rag.compact_ratio = float("inf")
+        return rag
+
+    @classmethod
+    def edited_engine(cls) -> OptimizedEnhancedRAG:
+        rag = cls.setup_engine(cls.base)
+        with contextlib.redirect_stdout(io.StringIO()):
+            rag.add_chunks(cls.added)
+            rag.remove_chunks(sorted(cls.removed))
+            for edited_id, content in cls.edits.items():
+                rag.update_chunk(edited_id, content)
+        return rag
+
+    @staticmethod
+    def live_positions(rag):
+        return [i for i in range(len(rag.chunks)) if i not in rag._removed]
+
+    def bm25_by_chunk(self, rag, question):
+        scores = rag._score_queries([rag._preprocess_query(question)], 5)[0][0]
+        return {rag.chunks.chunk_id(i): scores[i] for i in self.live_positions(rag)}
+
+    def categories_by_chunk(self, rag):
+        return {
+            category: sorted(rag.chunks.chunk_id(i) for i in positions)
+            for category, positions in rag.category_indices.items()
+        }
+
+    def ranked_ids(self, rag, question):
+        with contextlib.redirect_stdout(io.StringIO()):
+            results, _ = rag.retrieve(question)
+        return [(chunk_id(result), round(result["final_score"], 9)) for result in results]
+
+    # ---- Before compaction ----
+
+    def test_chunks_match(self):
+        live = {self.incremental.chunks.chunk_id(i): self.incremental.chunks[i]["content"]
+                for i in self.live_positions(self.incremental)}
+        expected = {chunk_id(chunk): chunk["content"] for chunk in self.reference.chunks}
+        self.assertEqual(live, expected)
+
+    def test_bm25_scores_match(self):
+        for question in QUESTIONS:
+            with self.subTest(question=question):
+                actual = self.bm25_by_chunk(self.incremental, question)
+                expected = self.bm25_by_chunk(self.reference, question)
+                self.assertEqual(actual.keys(), expected.keys())
+                for key, score in expected.items():
+                    self.assertAlmostEqual(actual[key], score, places=12)
+
+    def test_category_indices_match(self):
+        self.assertEqual(self.categories_by_chunk(self.incremental), self.categories_by_chunk(self.reference))
+
+    def test_removed_chunks_never_rank(self):
+        for question in QUESTIONS:
+            with self.subTest(question=question):
+                ranked = {ranked_id for ranked_id, _ in self.ranked_ids(self.incremental, question)}
+                self.assertFalse(ranked & self.removed)
+
+    def test_update_unknown_chunk_raises(self):
+        with self.assertRaises(KeyError):
+            self.incremental.update_chunk("no-such-chunk", "Some content about highways.")
+
+    # ---- After compaction ----
+
+    def test_compacted_arrays_match(self):
+        rag, reference = self.compacted, self.reference
+        self.assertTrue(rag.chunks == reference.chunks)
+        self.assertEqual(rag.category_indices, reference.category_indices)
+        self.assertEqual(rag.vocabulary.terms, reference.vocabulary.terms)
+        self.assertEqual(rag.bm25.vocabulary, reference.bm25.vocabulary)
+        self.assertTrue(same_csr(rag.bm25.tf, reference.bm25.tf))
+        self.assertTrue(np.array_equal(rag.bm25.idf, reference.bm25.idf))
+        self.assertTrue(same_csr(rag.bm25.impacts, reference.bm25.impacts))
+        self.assertTrue(np.array_equal(rag.tfidf.features, reference.tfidf.features))
+        self.assertTrue(np.array_equal(rag.tfidf.idf, reference.tfidf.idf))
+        self.assertTrue(same_csr(rag.tfidf_matrix, reference.tfidf_matrix))
+
+    def test_compacted_results_match(self):
+        for question in QUESTIONS:
+            with self.subTest(question=question):
+                self.assertEqual(self.ranked_ids(self.compacted, question), self.ranked_ids(self.reference, question))
+
+
+if __name__ == "__main__":
+    unittest.main()
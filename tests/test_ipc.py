@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+IPC framing (ipc_protocol) and the worker's request counter
+
+    python -m pytest tests/test_ipc.py
+"""
+
+import io
+import sys
+import threading
+import unittest
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import ipc_protocol as ipc
+from cancellation import CancelToken
+from rag_worker import RAGWorker
+
+KINDS = {
+    ipc.READY: {"pid": 1234},
+    ipc.REQUEST: {"type": "query", "question": "What is the speed limit?", "options": {"topK": 3}},
+    ipc.RESULT: {"answer": "100 km/h on most highways", "sources": []},
+    ipc.ERROR: {"error": "boom", "errorType": "RuntimeError"},
+    ipc.SOURCES: {"sources": [{"content": "Speed limits…", "page": 3}], "category": "speed"},
+}
+
+
+def frames_of(kind_payloads):
+    return b"".join(ipc.encode_frame(kind, request_id, payload) for request_id, (kind, payload)
+                    in enumerate(kind_payloads, start=1))
+
+
+class FrameDecoderTest(unittest.TestCase):
+    def test_round_trip_every_kind(self):
+        decoder = ipc.FrameDecoder()
+        for request_id, (kind, value) in enumerate(KINDS.items(), start=1):
+            with self.subTest(kind=kind):
+                frame = ipc.encode_json(kind, request_id, value)
+                ((decoded_kind, decoded_id, payload),) = decoder.feed(frame)
+                self.assertEqual((decoded_kind, decoded_id), (kind, request_id))
+                self.assertEqual(ipc.decode_json(payload), value)
+
+        text = "Slow down — école zone ahead"
+        ((kind, request_id, payload),) = decoder.feed(ipc.encode_frame(ipc.TOKEN, 7, text.encode("utf-8")))
+        self.assertEqual((kind, request_id, payload.decode("utf-8")), (ipc.TOKEN, 7, text))
+
+        ((kind, request_id, payload),) = decoder.feed(ipc.encode_frame(ipc.CANCEL, 8))
+        self.assertEqual((kind, request_id, payload), (ipc.CANCEL, 8, b""))
+        self.assertIsNone(ipc.decode_json(payload))
+
+    def test_frame_split_across_chunks(self):
+        frame = ipc.encode_json(ipc.RESULT, 42, {"answer": "x" * 1000})
+        decoder = ipc.FrameDecoder()
+        frames = []
+        for start in range(0, len(frame), 7):
+            frames += decoder.feed(frame[start:start + 7])
+        self.assertEqual(frames, [(ipc.RESULT, 42, frame[ipc.HEADER.size:])])
+
+    def test_several_frames_in_one_chunk(self):
+        payloads = [(ipc.TOKEN, b"one"), (ipc.TOKEN, b""), (ipc.CANCEL, b""), (ipc.RESULT, b'{"a":1}')]
+        frames = ipc.FrameDecoder().feed(frames_of(payloads))
+        self.assertEqual(frames, [(kind, i, payload) for i, (kind, payload) in enumerate(payloads, start=1)])
+
+    def test_truncated_header_waits_for_the_rest(self):
+        frame = ipc.encode_frame(ipc.TOKEN, 3, b"hello")
+        decoder = ipc.FrameDecoder()
+        self.assertEqual(decoder.feed(frame[:4]), [])
+        self.assertEqual(decoder.feed(frame[4:8]), [])
+        self.assertEqual(decoder.feed(frame[8:] + frame[:2]), [(ipc.TOKEN, 3, b"hello")])
+        self.assertEqual(decoder.feed(frame[2:]), [(ipc.TOKEN, 3, b"hello")])
+
+    def test_rejects_payload_above_max(self):
+        header = ipc.HEADER.pack(ipc.MAX_PAYLOAD + 1, ipc.RESULT, 1)
+        with self.assertRaises(ValueError):
+            ipc.FrameDecoder().feed(header)
+        # At the limit the decoder just waits for the payload
+        self.assertEqual(ipc.FrameDecoder().feed(ipc.HEADER.pack(ipc.MAX_PAYLOAD, ipc.RESULT, 1)), [])
+
+
+class ReadFrameTest(unittest.TestCase):
+    def test_reads_frames_in_order(self):
+        stream = io.BytesIO(frames_of([(ipc.REQUEST, b'{"q":1}'), (ipc.CANCEL, b"")]))
+        self.assertEqual(ipc.read_frame(stream), (ipc.REQUEST, 1, b'{"q":1}'))
+        self.assertEqual(ipc.read_frame(stream), (ipc.CANCEL, 2, b""))
+        self.assertIsNone(ipc.read_frame(stream))
+
+    def test_truncated_header_is_eof(self):
+        self.assertIsNone(ipc.read_frame(io.BytesIO(ipc.encode_frame(ipc.TOKEN, 1, b"abc")[:5])))
+
+    def test_truncated_payload_is_eof(self):
+        self.assertIsNone(ipc.read_frame(io.BytesIO(ipc.encode_frame(ipc.TOKEN, 1, b"abc")[:-1])))
+
+    def test_rejects_payload_above_max(self):
+        with self.assertRaises(ValueError):
+            ipc.read_frame(io.BytesIO(ipc.HEADER.pack(ipc.MAX_PAYLOAD + 1, ipc.RESULT, 1)))
+
+
+class StubRAG:
+    def optimized_query(self, question, top_k=5, cancel=None):
+        return {"answer": question, "relevant_chunks": [], "category_hint": "general"}
+
+
+class RequestCounterTest(unittest.TestCase):
+    def test_concurrent_requests_are_all_counted(self):
+        worker = RAGWorker(StubRAG())
+        threads_count, per_thread = 8, 500
+
+        def run():
+            for i in range(per_thread):
+                worker.handle(i, {"type": "query", "question": "q"}, CancelToken())
+
+        threads = [threading.Thread(target=run) for _ in range(threads_count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(worker.requests_served, threads_count * per_thread)
+
+    def test_count_waits_for_the_lock(self):
+        worker = RAGWorker(StubRAG())
+        with worker._served_lock:
+            thread = threading.Thread(target=worker._count_served)
+            thread.start()
+            thread.join(timeout=0.2)
+            self.assertTrue(thread.is_alive())
+            self.assertEqual(worker.requests_served, 0)
+        thread.join()
+        self.assertEqual(worker.requests_served, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
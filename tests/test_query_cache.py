@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+QueryCache: LRU eviction by entries and bytes, TTL, private copies
+
+    python -m pytest tests/test_query_cache.py
+"""
+
+import sys
+import json
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from chunk_store import ChunkStore, ResultView
+from query_cache import QueryCache, _estimate_size
+
+CHUNK = {
+    "content": "The maximum speed limit on most 400-series highways is 100 km/h. " * 10,
+    "metadata": {"page": 3, "chunk_id": "c0", "source": "handbook"},
+    "category": "speed",
+    "quality_score": 0.9,
+}
+
+
+def answer(text: str = "x" * 100):
+    return {"answer": text, "sources": [{"page": 1, "fusion_methods": ["bm25"]}]}
+
+
+class QueryCacheTest(unittest.TestCase):
+    def test_evicts_least_recently_used_by_count(self):
+        cache = QueryCache(max_entries=3)
+        for key in "abc":
+            cache.put(key, answer(key))
+        cache.get("a")
+        cache.put("d", answer("d"))
+
+        self.assertEqual(len(cache), 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual([cache.get(key)["answer"] for key in "acd"], ["a", "c", "d"])
+        self.assertEqual(cache.evictions, 1)
+
+    def test_evicts_least_recently_used_by_bytes(self):
+        size = _estimate_size(answer())
+        cache = QueryCache(max_entries=100, max_bytes=3 * size)
+        for key in "abc":
+            cache.put(key, answer())
+        cache.get("a")
+        cache.put("d", answer())
+
+        self.assertEqual(cache.stats()["bytes"], 3 * size)
+        self.assertNotIn("b", cache)
+        self.assertTrue(all(key in cache for key in "acd"))
+        self.assertEqual(cache.evictions, 1)
+
+    def test_skips_values_larger_than_the_budget(self):
+        cache = QueryCache(max_bytes=_estimate_size(answer()) - 1)
+        cache.put("a", answer())
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.stats()["bytes"], 0)
+
+    def test_replacing_a_key_keeps_the_byte_count(self):
+        cache = QueryCache()
+        cache.put("a", answer("x" * 500))
+        cache.put("a", answer())
+        self.assertEqual(cache.stats()["bytes"], _estimate_size(answer()))
+
+    def test_entries_expire_after_ttl(self):
+        cache = QueryCache(ttl_seconds=10)
+        with mock.patch("query_cache.time.monotonic", return_value=1000.0):
+            cache.put("a", answer())
+        with mock.patch("query_cache.time.monotonic", return_value=1009.0):
+            self.assertIsNotNone(cache.get("a"))
+        with mock.patch("query_cache.time.monotonic", return_value=1010.0):
+            self.assertNotIn("a", cache)
+            self.assertIsNone(cache.get("a"))
+
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.stats()["bytes"], 0)
+        self.assertEqual((cache.hits, cache.misses, cache.expirations), (1, 1, 1))
+
+    def test_mutating_a_returned_copy_leaves_the_cache_alone(self):
+        cache = QueryCache()
+        value = answer("original")
+        cache.put("a", value)
+        value["answer"] = "changed before get"
+
+        first = cache.get("a")
+        first["answer"] = "changed after get"
+        first["sources"][0]["fusion_methods"].append("dense")
+        first["sources"].clear()
+
+        self.assertEqual(cache.get("a"), answer("original"))
+
+    def test_result_views_share_the_store_but_not_their_lists(self):
+        store = ChunkStore.from_chunks([CHUNK])
+        cache = QueryCache()
+        cache.put("a", {"results": [ResultView(store, 0, 1.5, "bm25", 0.8, ["bm25"])]})
+
+        (result,) = cache.get("a")["results"]
+        self.assertIs(result.store, store)
+        result.fusion_methods.append("dense")
+        self.assertEqual(cache.get("a")["results"][0]["fusion_methods"], ["bm25"])
+
+    def test_views_are_sized_by_their_content(self):
+        store = ChunkStore.from_chunks([CHUNK])
+        view = ResultView(store, 0, 1.5, "bm25", 0.8, ["bm25"])
+        self.assertGreater(_estimate_size([view]), len(CHUNK["content"]))
+        self.assertEqual(_estimate_size([view]), len(json.dumps([dict(view)], default=str)))
+        self.assertGreater(_estimate_size([store[0]]), len(CHUNK["content"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+SemanticAnswerCache: similarity threshold, chunk overlap, capacity, audits
+
+The engine tests answer with the fake LLM backend over the bundled
+knowledge base; a paraphrase (same words, other case and punctuation)
+misses the exact query cache and reaches the semantic one.
+
+    python -m pytest tests/test_semantic_cache.py
+"""
+
+import io
+import os
+import sys
+import unittest
+import contextlib
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+from query_cache import SemanticAnswerCache
+
+with contextlib.redirect_stdout(io.StringIO()):
+    from rag_engine import OptimizedEnhancedRAG
+
+DIM = 8
+ENGINE_ENV = {
+    "RAG_DENSE_RETRIEVAL": "0",
+    "RAG_LLM_BACKEND": "fake",
+    "RAG_FAKE_LLM_LATENCY_MS": "0",
+    "RAG_FAKE_LLM_TOKENS_PER_SEC": "0",
+}
+
+
+def vector(*values) -> np.ndarray:
+    return np.array(values + (0.0,) * (DIM - len(values)), dtype=np.float32)
+
+
+def at_cosine(similarity: float) -> np.ndarray:
+    """A vector at this cosine similarity to vector(1)."""
+    return vector(similarity, float(np.sqrt(1 - similarity ** 2)))
+
+
+class SemanticAnswerCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = SemanticAnswerCache(DIM, capacity=4, threshold=0.8, min_overlap=0.6)
+        self.cache.add(vector(1), "What is the speed limit?", "100 km/h", [1, 2, 3])
+
+    def test_hit_above_threshold(self):
+        hit = self.cache.lookup(at_cosine(0.9), [1, 2, 3])
+        self.assertEqual(hit["answer"], "100 km/h")
+        self.assertAlmostEqual(hit["similarity"], 0.9, places=5)
+        self.assertEqual(hit["overlap"], 1.0)
+
+    def test_miss_below_threshold(self):
+        self.assertIsNone(self.cache.lookup(at_cosine(0.7), [1, 2, 3]))
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 1))
+
+    def test_vectors_are_normalized(self):
+        self.assertIsNotNone(self.cache.lookup(10 * at_cosine(0.9), [1, 2, 3]))
+        self.assertIsNone(self.cache.lookup(vector(), [1, 2, 3]))
+
+    def test_near_vector_with_other_chunks_is_rejected(self):
+        # Jaccard {1, 2, 3} vs {1, 4, 5} = 1/5
+        self.assertIsNone(self.cache.lookup(vector(1), [1, 4, 5]))
+        self.assertEqual(self.cache.overlap_rejections, 1)
+        # {1, 2, 3} vs {1, 2, 3, 4} = 3/4 passes
+        self.assertIsNotNone(self.cache.lookup(vector(1), [1, 2, 3, 4]))
+
+    def test_falls_through_to_a_farther_neighbour_with_matching_chunks(self):
+        self.cache.add(at_cosine(0.95), "Speed limit on highways?", "Posted limit", [7, 8])
+        hit = self.cache.lookup(vector(1), [7, 8])
+        self.assertEqual(hit["answer"], "Posted limit")
+        self.assertEqual(self.cache.overlap_rejections, 1)
+
+    def test_expired_entries_are_skipped(self):
+        with mock.patch("query_cache.time.monotonic", return_value=1e9):
+            self.assertIsNone(self.cache.lookup(vector(1), [1, 2, 3]))
+
+    def test_oldest_slot_is_overwritten_at_capacity(self):
+        for i in range(1, 5):
+            self.cache.add(vector(0, 0, 0, 0, i, 1), f"question {i}", f"answer {i}", [i])
+        self.assertEqual(self.cache.stats()["entries"], 4)
+        self.assertIsNone(self.cache.lookup(vector(1), [1, 2, 3]))
+        self.assertEqual(self.cache.lookup(vector(0, 0, 0, 0, 4, 1), [4])["answer"], "answer 4")
+
+    def test_should_audit_follows_the_rate(self):
+        self.assertFalse(any(self.cache.should_audit() for _ in range(100)))
+        self.cache.audit_rate = 1.0
+        self.assertTrue(all(self.cache.should_audit() for _ in range(100)))
+
+    def test_record_audit_counts_false_hits(self):
+        self.assertFalse(self.cache.record_audit("The limit is 100 km/h", "the limit is 100 KM/H"))
+        self.assertTrue(self.cache.record_audit("The limit is 100 km/h", "Carry your licence at all times"))
+        stats = self.cache.stats()
+        self.assertEqual((stats["audits"], stats["false_hits"], stats["false_hit_rate"]), (2, 1, 0.5))
+
+
+class SemanticCacheEngineTest(unittest.TestCase):
+    QUESTION = "What is the speed limit on highways in Ontario?"
+    PARAPHRASE = "what is the speed limit on highways in ontario"
+
+    @classmethod
+    def setUpClass(cls):
+        cls.environ = mock.patch.dict(os.environ, ENGINE_ENV)
+        cls.environ.start()
+        with contextlib.redirect_stdout(io.StringIO()):
+            cls.rag = OptimizedEnhancedRAG(data_dir=str(ROOT / "data"))
+            cls.rag.setup()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.environ.stop()
+
+    def setUp(self):
+        self.rag.query_cache.clear()
+        self.rag.semantic_cache.clear()
+        self.rag.semantic_cache.audit_rate = 0.0
+
+    def query(self, question):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return self.rag.optimized_query(question)
+
+    def test_paraphrase_reuses_the_answer(self):
+        first = self.query(self.QUESTION)
+        second = self.query(self.PARAPHRASE)
+        self.assertFalse(second["cache_hit"])
+        self.assertEqual(second["semantic_cache_hit"]["question"], self.QUESTION)
+        self.assertEqual(second["answer"], first["answer"])
+
+    def test_audited_hit_is_regenerated_and_scored(self):
+        first = self.query(self.QUESTION)
+        self.rag.semantic_cache.audit_rate = 1.0
+        second = self.query(self.PARAPHRASE)
+
+        self.assertIsNone(second["semantic_cache_hit"])
+        # The prompt carries the question, so the fake answer is fresh
+        self.assertNotEqual(second["answer"], first["answer"])
+        stats = self.rag.semantic_cache.stats()
+        self.assertEqual((stats["hits"], stats["audits"], stats["false_hits"]), (1, 1, 0))
+        # An audit scores the hit; it does not add the paraphrase
+        self.assertEqual(stats["entries"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
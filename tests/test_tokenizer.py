@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+TokenTfidf against sklearn's TfidfVectorizer with the engine's parameters
+
+fit_transform must give the same features, idf and matrix bit for bit;
+transform the same rows for queries, including empty strings, unseen
+words and n-grams, and batches large enough that (row, feature) cells
+need 64 bits.
+
+    python -m pytest tests/test_tokenizer.py
+"""
+
+import io
+import sys
+import json
+import unittest
+import contextlib
+from pathlib import Path
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+with contextlib.redirect_stdout(io.StringIO()):
+    from rag_engine import STOP_WORDS, TFIDF_PARAMS
+    from tokenizer import TokenVocabulary, TokenTfidf
+
+QUERIES = [
+    "What is the speed limit on highways in Ontario?",
+    "What documents do I need for a G1 test?",
+    "speed limit",
+    "",
+    "   ",
+    "zzqx frobnicated quuxly",
+    "limit speed highways ontario",
+    "the and of",
+    "G1 G2 G1 G2 G1",
+]
+
+
+def encode(vocabulary, texts):
+    return [vocabulary.encode_query(text)[1] for text in texts]
+
+
+class TokenTfidfTest(unittest.TestCase):
+    def assertSameMatrix(self, actual, expected):
+        self.assertEqual(actual.shape, expected.shape)
+        for name in ("data", "indices", "indptr"):
+            self.assertTrue(np.array_equal(getattr(actual, name), getattr(expected, name)), name)
+
+    def assertSameRows(self, actual, expected):
+        """Equal as matrices; entries within a row may be in any order."""
+        actual, expected = actual.tocsr().copy(), expected.tocsr().copy()
+        actual.sort_indices()
+        expected.sort_indices()
+        self.assertEqual(actual.shape, expected.shape)
+        self.assertTrue(np.array_equal(actual.indices, expected.indices))
+        self.assertTrue(np.array_equal(actual.indptr, expected.indptr))
+        np.testing.assert_allclose(actual.data, expected.data, rtol=1e-12, atol=0)
+
+    def fit(self, texts):
+        sklearn_tfidf = TfidfVectorizer(stop_words=STOP_WORDS, **TFIDF_PARAMS)
+        expected = sklearn_tfidf.fit_transform(texts)
+
+        vocabulary = TokenVocabulary(STOP_WORDS)
+        docs = [vocabulary.encode(text) for text in texts]
+        tfidf = TokenTfidf(vocabulary, **TFIDF_PARAMS)
+        actual = tfidf.fit_transform(vocabulary.doc_words(docs))
+        return sklearn_tfidf, expected, vocabulary, tfidf, actual
+
+    @classmethod
+    def setUpClass(cls):
+        with open(ROOT / "data" / "knowledge_base.json", "r") as f:
+            cls.texts = [chunk["content"] for chunk in json.load(f)]
+
+    def test_fit_transform_matches_knowledge_base(self):
+        sklearn_tfidf, expected, _, tfidf, actual = self.fit(self.texts)
+        self.assertEqual(tfidf.feature_names(), list(sklearn_tfidf.get_feature_names_out()))
+        self.assertTrue(np.array_equal(tfidf.idf, sklearn_tfidf.idf_))
+        self.assertSameMatrix(actual, expected)
+
+    def test_fit_transform_with_empty_documents(self):
+        texts = self.texts[:50] + ["", "   ", "the and of"] + self.texts[50:100]
+        sklearn_tfidf, expected, _, tfidf, actual = self.fit(texts)
+        self.assertEqual(tfidf.feature_names(), list(sklearn_tfidf.get_feature_names_out()))
+        self.assertSameMatrix(actual, expected)
+        self.assertEqual(actual[50:53].nnz, 0)
+
+    def test_transform_matches_queries(self):
+        sklearn_tfidf, _, vocabulary, tfidf, _ = self.fit(self.texts)
+        self.assertSameRows(tfidf.transform(encode(vocabulary, QUERIES)), sklearn_tfidf.transform(QUERIES))
+
+    def test_transform_single_query(self):
+        sklearn_tfidf, _, vocabulary, tfidf, _ = self.fit(self.texts)
+        for query in QUERIES:
+            with self.subTest(query=query):
+                self.assertSameRows(tfidf.transform(encode(vocabulary, [query])), sklearn_tfidf.transform([query]))
+
+    def test_transform_unseen_words_and_ngrams(self):
+        _, _, vocabulary, tfidf, _ = self.fit(self.texts)
+        unseen = tfidf.transform(encode(vocabulary, ["zzqx frobnicated quuxly", "", "ontario speed"]))
+        self.assertEqual(unseen[0].nnz, 0)
+        self.assertEqual(unseen[1].nnz, 0)
+        # Known words in an order no chunk uses: unigrams only
+        self.assertTrue(all(" " not in tfidf.feature_names()[column] for column in unseen[2].indices))
+
+    def test_transform_cells_past_32_bits(self):
+        _, _, vocabulary, tfidf, _ = self.fit(self.texts)
+        words = encode(vocabulary, [QUERIES[0]])[0]
+        rows = (1 << 31) // tfidf.num_features + 2
+        batch = tfidf.transform([words[:0]] * (rows - 1) + [words])
+        self.assertEqual(batch.shape[0], rows)
+        self.assertEqual(batch[:rows - 1].nnz, 0)
+        self.assertSameRows(batch[rows - 1], tfidf.transform([words]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""
+Shared tokenizer - one interned vocabulary of integer token ids for BM25 and TF-IDF
+
+A text is lowercased and split on whitespace once; every token is interned
+as an integer id. What each index needs is derived once per distinct token
+instead of once per occurrence:
+
+    BM25    the token itself, if it is longer than two characters
+    TF-IDF  the words TfidfVectorizer's token pattern finds in the token,
+            minus stop words; words are ids in the same vocabulary
+
+The token pattern can't match whitespace, so the words of a text are the
+words of its tokens in order, exactly what TfidfVectorizer's analyzer sees.
+TokenTfidf builds n-grams over those word ids as packed integer keys and
+reproduces TfidfVectorizer(**params).fit_transform bit for bit: the same
+features in the same (alphabetical) columns, the same max_df/min_df/
+max_features pruning and tie-breaking, the same idf and the same entry
+order within rows, which decides how the L2 norm is summed.
+
+Queries are encoded without growing the vocabulary; unknown tokens and
+words are -1 and never match.
+"""
+
+import re
+from numbers import Integral
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+from sklearn.utils.sparsefuncs_fast import inplace_csr_row_normalize_l2
+
+from chunk_store import Column
+from incremental_index import first_seen_order
+
+# TfidfVectorizer's default token pattern
+TOKEN_PATTERN = r"(?u)\b\w\w+\b"
+
+# Bits per word id in packed n-gram keys (3-grams fill 63 bits)
+KEY_BITS = 21
+
+
+def _gather(starts: np.ndarray, counts: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """values[starts[i]:starts[i] + counts[i]] for every i, concatenated."""
+    total = int(counts.sum())
+    if not total:
+        return np.zeros(0, dtype=values.dtype)
+    offsets = np.repeat(starts - np.cumsum(counts) + counts, counts)
+    return values[offsets + np.arange(total)]
+
+
+class TokenVocabulary:
+    def __init__(self, stop_words: Union[str, Iterable[str], None] = "english", token_pattern: str = TOKEN_PATTERN):
+        """An empty vocabulary; stop_words and token_pattern as for TfidfVectorizer."""
+        self.stop_words = stop_words
+        self.token_pattern = token_pattern
+        self._stop = frozenset(ENGLISH_STOP_WORDS if stop_words == "english" else stop_words or ())
+        self._find_words = re.compile(token_pattern).findall
+
+        self.terms: List[str] = []
+        self.ids: Dict[str, int] = {}
+        self._bm25 = Column(np.bool_)
+        self._word_start = Column(np.int64)
+        self._word_count = Column(np.int32)
+        self._words = Column(np.int32)
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    @classmethod
+    def from_terms(cls, terms: List[str], **params) -> "TokenVocabulary":
+        """A vocabulary with the given terms as ids 0..n-1 (as saved by a snapshot)."""
+        vocabulary = cls(**params)
+        vocabulary.terms = list(terms)
+        vocabulary.ids = {term: i for i, term in enumerate(vocabulary.terms)}
+        for term in vocabulary.terms:
+            vocabulary._add_row(term, [vocabulary.ids[word] for word in vocabulary._term_words(term)])
+        return vocabulary
+
+    def _term_words(self, term: str) -> List[str]:
+        return [word for word in self._find_words(term) if word not in self._stop]
+
+    def _add_row(self, term: str, word_ids: List[int]):
+        self._bm25.append(len(term) > 2)
+        self._word_start.append(len(self._words))
+        self._word_count.append(len(word_ids))
+        for word_id in word_ids:
+            self._words.append(word_id)
+
+    def _intern(self, term: str) -> int:
+        """Add a term, then any of its words not seen before; returns the term's id."""
+        term_id = len(self.terms)
+        self.terms.append(term)
+        self.ids[term] = term_id
+        self._add_row(term, [])
+
+        word_ids = [self.ids[word] if word in self.ids else self._intern(word) for word in self._term_words(term)]
+        if word_ids:
+            self._word_start.values[term_id] = len(self._words)
+            self._word_count.values[term_id] = len(word_ids)
+            for word_id in word_ids:
+                self._words.append(word_id)
+        return term_id
+
+    def encode(self, text: str) -> np.ndarray:
+        """Token ids of a document, interning new tokens."""
+        ids = self.ids
+        tokens = text.lower().split()
+        try:
+            return np.fromiter(map(ids.__getitem__, tokens), dtype=np.int32, count=len(tokens))
+        except KeyError:
+            return np.array([ids[token] if token in ids else self._intern(token) for token in tokens], dtype=np.int32)
+
+    def encode_query(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        """(token ids, TF-IDF word ids) of a query; unknown ones are -1."""
+        ids = self.ids
+        tokens = text.lower().split()
+        token_ids = np.array([ids.get(token, -1) for token in tokens], dtype=np.int32)
+        if (token_ids >= 0).all():
+            return token_ids, self.words(token_ids)
+
+        words = []
+        for token, token_id in zip(tokens, token_ids):
+            if token_id >= 0:
+                words.extend(self.words(np.array([token_id])).tolist())
+            else:
+                words.extend(ids.get(word, -1) for word in self._term_words(token))
+        return token_ids, np.array(words, dtype=np.int32)
+
+    def bm25_terms(self, token_ids: np.ndarray) -> np.ndarray:
+        """The known tokens BM25 indexes: those longer than two characters."""
+        token_ids = token_ids[token_ids >= 0]
+        return token_ids[self._bm25.values[token_ids]]
+
+    def words(self, token_ids: np.ndarray) -> np.ndarray:
+        """TF-IDF word ids of known tokens, in order."""
+        return _gather(self._word_start.values[token_ids], self._word_count.values[token_ids], self._words.values)
+
+    def doc_words(self, docs: Sequence[np.ndarray]) -> List[np.ndarray]:
+        """words() of many token id arrays, in one gather."""
+        if not len(docs):
+            return []
+        tokens = np.concatenate(docs)
+        word_ends = np.zeros(len(tokens) + 1, dtype=np.int64)
+        np.cumsum(self._word_count.values[tokens], out=word_ends[1:])
+        return np.split(self.words(tokens), word_ends[np.cumsum([len(doc) for doc in docs])][:-1])
+
+    def compact(self, docs: Sequence[np.ndarray]) -> Tuple["TokenVocabulary", List[np.ndarray]]:
+        """The vocabulary of `docs` alone, renumbered, and the docs in the new ids.
+
+        Ids follow first appearance, each token before its words, as
+        encoding the same texts into a fresh vocabulary would number them.
+        """
+        tokens = np.concatenate(docs) if len(docs) else np.zeros(0, dtype=np.int32)
+        counts = self._word_count.values[tokens]
+        sequence = np.empty(len(tokens) + int(counts.sum()), dtype=np.int64)
+        token_slots = np.cumsum(counts + 1) - counts - 1
+        is_token = np.zeros(len(sequence), dtype=bool)
+        is_token[token_slots] = True
+        sequence[token_slots] = tokens
+        sequence[~is_token] = self.words(tokens)
+        mapping, old_ids = first_seen_order(sequence, len(self.terms))
+
+        vocabulary = TokenVocabulary(self.stop_words, self.token_pattern)
+        vocabulary.terms = [self.terms[i] for i in old_ids]
+        vocabulary.ids = {term: i for i, term in enumerate(vocabulary.terms)}
+        word_counts = self._word_count.values[old_ids]
+        vocabulary._bm25 = Column(np.bool_, self._bm25.values[old_ids])
+        vocabulary._word_count = Column(np.int32, word_counts)
+        vocabulary._word_start = Column(np.int64, np.cumsum(word_counts) - word_counts)
+        vocabulary._words = Column(np.int32, mapping[self.words(old_ids)])
+        return vocabulary, [mapping[doc].astype(np.int32) for doc in docs]
+
+
+class TokenTfidf:
+    def __init__(self, vocabulary: TokenVocabulary, ngram_range: Tuple[int, int] = (1, 1),
+                 max_df: Union[int, float] = 1.0, min_df: Union[int, float] = 1,
+                 max_features: Optional[int] = None, sublinear_tf: bool = False):
+        """TF-IDF over TokenVocabulary word ids (smooth idf, L2-normalized rows)."""
+        self.vocabulary = vocabulary
+        self.ngram_range = ngram_range
+        self.max_df = max_df
+        self.min_df = min_df
+        self.max_features = max_features
+        self.sublinear_tf = sublinear_tf
+
+        # Word ids of each feature column (-1 padded) and their idf
+        self.features = np.zeros((0, ngram_range[1]), dtype=np.int32)
+        self.idf = np.zeros(0)
+        self._lookup: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+
+    @property
+    def num_features(self) -> int:
+        return len(self.features)
+
+    @classmethod
+    def from_features(cls, vocabulary: TokenVocabulary, features: np.ndarray, idf: np.ndarray,
+                      **params) -> "TokenTfidf":
+        """A fitted model from saved feature word ids and idf weights."""
+        tfidf = cls(vocabulary, **params)
+        tfidf.features = np.asarray(features, dtype=np.int32)
+        tfidf.idf = np.asarray(idf)
+        tfidf._build_lookup()
+        return tfidf
+
+    def feature_names(self) -> List[str]:
+        """Feature strings by column, as TfidfVectorizer's vocabulary_ keys."""
+        terms = self.vocabulary.terms
+        return [" ".join(terms[word] for word in row if word >= 0) for row in self.features.tolist()]
+
+    def _ngrams(self, sequences: Sequence[np.ndarray]):
+        """(n, row, key) arrays of every n-gram of known words, rows then positions in order."""
+        if len(self.vocabulary) >= 1 << KEY_BITS:
+            raise ValueError(f"Vocabulary too large for {KEY_BITS}-bit n-gram keys ({len(self.vocabulary)} terms)")
+        lengths = np.array([len(words) for words in sequences], dtype=np.int64)
+        words = np.concatenate(sequences).astype(np.int64) if len(sequences) else np.zeros(0, dtype=np.int64)
+        rows = np.repeat(np.arange(len(sequences), dtype=np.int32), lengths)
+
+        low, high = self.ngram_range
+        for n in range(low, high + 1):
+            count = len(words) - n + 1
+            if count <= 0:
+                continue
+            keys = words[:count].copy()
+            # An n-gram must start and end in the same document
+            valid = (rows[:count] == rows[n - 1:]) & (keys >= 0)
+            for j in range(1, n):
+                following = words[j:j + count]
+                keys = (keys << KEY_BITS) | np.maximum(following, 0)
+                valid &= following >= 0
+            yield n, rows[:count][valid], keys[valid]
+
+    def _build_lookup(self):
+        """Per n, the sorted n-gram keys of the features and their columns."""
+        lengths = (self.features >= 0).sum(axis=1)
+        keys = np.zeros(len(self.features), dtype=np.int64)
+        for j in range(self.features.shape[1]):
+            present = lengths > j
+            keys[present] = (keys[present] << KEY_BITS) | self.features[present, j]
+        self._lookup = {}
+        for n in np.unique(lengths).tolist():
+            columns = np.flatnonzero(lengths == n)
+            order = np.argsort(keys[columns])
+            self._lookup[n] = (keys[columns][order], columns[order])
+
+    def _weigh(self, counts: sparse.csr_matrix) -> sparse.csr_matrix:
+        """TfidfTransformer.transform: sublinear tf, idf, L2 rows (in place)."""
+        if self.sublinear_tf:
+            np.log(counts.data, counts.data)
+            counts.data += 1.0
+        counts.data *= self.idf[counts.indices]
+        inplace_csr_row_normalize_l2(counts)
+        return counts
+
+    def fit_transform(self, sequences: Sequence[np.ndarray]) -> sparse.csr_matrix:
+        """Fit on documents' word ids; returns their TF-IDF matrix."""
+        n_docs = len(sequences)
+
+        # Candidate features: distinct (n, key), numbered n by n, and their
+        # (document, feature) counts; one n at a time to bound peak memory
+        candidate_keys, sizes, first_doc, first_n, first_index = [], [], [], [], []
+        pair_docs, pair_ids, pair_counts = [], [], []
+        offset = 0
+        for n, rows, keys in self._ngrams(sequences):
+            unique, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+            del keys
+            candidate_keys.append(unique)
+            sizes.append(n)
+            first_doc.append(rows[first])
+            first_n.append(np.full(len(unique), n))
+            first_index.append(first)
+            pairs, counts = np.unique(rows.astype(np.int64) * len(unique) + inverse.ravel(), return_counts=True)
+            del rows, inverse
+            pair_docs.append((pairs // len(unique)).astype(np.int32))
+            pair_ids.append((pairs % len(unique) + offset).astype(np.int32))
+            pair_counts.append(counts.astype(np.int32))
+            del pairs, counts
+            offset += len(unique)
+        if not offset:
+            raise ValueError("empty vocabulary; perhaps the documents only contain stop words")
+
+        # The analyzer emits a document's 1-grams, then 2-grams, ...: first-seen order
+        first_seen = np.lexsort((np.concatenate(first_index), np.concatenate(first_n), np.concatenate(first_doc)))
+        seen_rank = np.empty(offset, dtype=np.int64)
+        seen_rank[first_seen] = np.arange(offset)
+
+        pair_docs, pair_ids, pair_counts = np.concatenate(pair_docs), np.concatenate(pair_ids), np.concatenate(pair_counts)
+        dfs = np.bincount(pair_ids, minlength=offset)
+        tfs = np.bincount(pair_ids, weights=pair_counts, minlength=offset)
+
+        # CountVectorizer sorts features by name, then prunes
+        words = np.full((offset, self.ngram_range[1]), -1, dtype=np.int32)
+        start = 0
+        for n, keys in zip(sizes, candidate_keys):
+            for j in range(n):
+                words[start:start + len(keys), j] = (keys >> (KEY_BITS * (n - 1 - j))) & ((1 << KEY_BITS) - 1)
+            start += len(keys)
+        terms = self.vocabulary.terms
+        names = [" ".join(terms[word] for word in row if word >= 0) for row in words.tolist()]
+        alphabetical = np.array(sorted(range(offset), key=names.__getitem__), dtype=np.int64)
+
+        max_doc_count = self.max_df if isinstance(self.max_df, Integral) else self.max_df * n_docs
+        min_doc_count = self.min_df if isinstance(self.min_df, Integral) else self.min_df * n_docs
+        if max_doc_count < min_doc_count:
+            raise ValueError("max_df corresponds to < documents than min_df")
+        mask = (dfs[alphabetical] <= max_doc_count) & (dfs[alphabetical] >= min_doc_count)
+        if self.max_features is not None and mask.sum() > self.max_features:
+            # Same unstable argsort over the same values as _limit_features
+            mask_inds = (-tfs[alphabetical][mask]).argsort()[:self.max_features]
+            new_mask = np.zeros(offset, dtype=bool)
+            new_mask[np.where(mask)[0][mask_inds]] = True
+            mask = new_mask
+        kept = alphabetical[mask]
+        if not len(kept):
+            raise ValueError("After pruning, no terms remain. Try a lower min_df or a higher max_df.")
+
+        column_of = np.full(offset, -1, dtype=np.int64)
+        column_of[kept] = np.arange(len(kept))
+        self.features = words[kept]
+        self._build_lookup()
+
+        # Counts with each row's entries in first-seen order, as sklearn leaves them
+        keep = column_of[pair_ids] >= 0
+        pair_docs, pair_ids, pair_counts = pair_docs[keep], pair_ids[keep], pair_counts[keep]
+        order = np.lexsort((seen_rank[pair_ids], pair_docs))
+        indptr = np.zeros(n_docs + 1, dtype=np.int32)
+        np.cumsum(np.bincount(pair_docs, minlength=n_docs), out=indptr[1:])
+        counts = sparse.csr_matrix(
+            (pair_counts[order].astype(np.float64), column_of[pair_ids[order]].astype(np.int32), indptr),
+            shape=(n_docs, len(kept))
+        )
+
+        # Smooth idf, as TfidfTransformer.fit
+        df = np.bincount(counts.indices, minlength=len(kept)).astype(np.float64)
+        df += 1.0
+        self.idf = np.full_like(df, fill_value=n_docs + 1, dtype=np.float64)
+        self.idf /= df
+        np.log(self.idf, out=self.idf)
+        self.idf += 1.0
+
+        return self._weigh(counts)
+
+    def transform(self, sequences: Sequence[np.ndarray]) -> sparse.csr_matrix:
+        """TF-IDF rows of word id sequences (documents or queries) for the fitted features."""
+        rows, columns = [], []
+        for n, ngram_rows, keys in self._ngrams(sequences):
+            if n not in self._lookup:
+                continue
+            feature_keys, feature_columns = self._lookup[n]
+            slots = np.minimum(np.searchsorted(feature_keys, keys), len(feature_keys) - 1)
+            found = feature_keys[slots] == keys
+            rows.append(ngram_rows[found])
+            columns.append(feature_columns[slots[found]])
+
+        # int64 cells: rows x features overflows int32 on large batches
+        cells, cell_counts = np.unique(
+            np.concatenate(rows).astype(np.int64) * self.num_features + np.concatenate(columns)
+            if rows else np.zeros(0, dtype=np.int64),
+            return_counts=True
+        )
+        indptr = np.zeros(len(sequences) + 1, dtype=np.int32)
+        np.cumsum(np.bincount(cells // self.num_features, minlength=len(sequences)), out=indptr[1:])
+        counts = sparse.csr_matrix(
+            (cell_counts.astype(np.float64), (cells % self.num_features).astype(np.int32), indptr),
+            shape=(len(sequences), self.num_features)
+        )
+        return self._weigh(counts)